@@ -10,4 +10,4 @@ app = Flask(__name__)
 app.config.from_object(Config)
 
 
-from app import routes
+from app import routes, api, metrics
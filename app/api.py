@@ -0,0 +1,250 @@
+"""
+A JSON api and a server-sent event stream for tournament displays.
+"""
+import json
+import math
+from contextlib import contextmanager
+
+from flask import Response, abort, jsonify, request
+
+from app import app
+from app.cache import LRUCache
+from app.events import CHANGES
+from app.routes import STORE
+from app.state import UnknownTournament
+
+# {(tournament_name, version): state}, see _get_state
+STATE_CACHE = LRUCache(app.config["RENDER_CACHE_SIZE"])
+
+
+# ------------------ Helpers
+
+
+def _jsonable(value):
+    """ return a value which json can encode, NaN becomes None """
+    if hasattr(value, "item"):  # numpy scalars
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _jsonable_matchups(matchups):
+    """ return matchups with player ids json can encode """
+    return [[_jsonable(x) for x in heat] for heat in matchups]
+
+
+@contextmanager
+def _reading(name):
+    """ hold a tournament for reading, abort with 404 if there is none """
+    try:
+        with STORE.read(name) as tour:
+            yield tour
+    except UnknownTournament:
+        abort(404)
+
+
+@contextmanager
+def _writing(name):
+    """ hold a tournament for writing, abort with 404 if there is none """
+    try:
+        with STORE.write(name) as tour:
+            yield tour
+    except UnknownTournament:
+        abort(404)
+
+
+def _get_state(name, tour) -> dict:
+    """
+    return the matchups, standings and progress of a tournament.
+
+    The state is cached by version so it is built once per change no matter
+    how many displays ask for it.
+    """
+    key = (name, tour.version)
+    state = STATE_CACHE.get(key)
+    if state is None:
+        ratings = tour.get_ratings()
+        standings = [
+            dict(player=_jsonable(player), **{k: _jsonable(v) for k, v in row.items()})
+            for player, row in zip(ratings.index, ratings.to_dict("records"))
+        ]
+        next_n = app.config["API_MATCHUPS"]
+        state = dict(
+            name=name,
+            version=tour.version,
+            heats=tour.get_next_heats(next_n),
+            matchups=_jsonable_matchups(tour.get_next_matchups(next_n)),
+            standings=standings,
+            progress=dict(
+                heat=tour.heat,
+                total_heats=tour.total_heats,
+                completed_heats=tour.completed_heats,
+            ),
+        )
+        STATE_CACHE.put(key, state)
+    return state
+
+
+def _get_delta(old: dict, new: dict) -> dict:
+    """
+    return the parts of the state which changed.
+
+    Standings are reduced to the rows which changed and the players removed.
+    """
+    delta = dict(version=new["version"])
+    for key in ("heats", "matchups", "progress"):
+        if old[key] != new[key]:
+            delta[key] = new[key]
+    old_rows = {x["player"]: x for x in old["standings"]}
+    new_rows = {x["player"]: x for x in new["standings"]}
+    changed = [x for x in new["standings"] if old_rows.get(x["player"]) != x]
+    removed = [x for x in old_rows if x not in new_rows]
+    if changed or removed:
+        delta["standings"] = dict(changed=changed, removed=removed)
+    return delta
+
+
+def _format_event(event: str, data: dict, event_id=None) -> str:
+    """ return a server-sent event """
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+# ------------------ Routes
+
+
+@app.route("/api/tournament/<name>/matchups")
+def api_matchups(name):
+    """ return the next n matchups and their heat numbers, n defaults to 2 """
+    next_n = request.args.get("n", type=int)
+    with _reading(name) as tour:
+        if next_n is None:
+            state = _get_state(name, tour)
+            heats, matchups = state["heats"], state["matchups"]
+        else:
+            heats = tour.get_next_heats(next_n)
+            matchups = _jsonable_matchups(tour.get_next_matchups(next_n))
+        version = tour.version
+    return jsonify(name=name, version=version, heats=heats, matchups=matchups)
+
+
+@app.route("/api/tournament/<name>/heats/<int:heat>")
+def api_heat(name, heat):
+    """ return the players of a heat and their times, None if not entered """
+    with _reading(name) as tour:
+        try:
+            entries = tour.get_heat(heat)
+        except ValueError as e:
+            return jsonify(error=str(e)), 404
+        version = tour.version
+    return jsonify(
+        name=name,
+        version=version,
+        heat=heat,
+        players=[_jsonable(x) for x, _ in entries],
+        times=[_jsonable(x) for _, x in entries],
+    )
+
+
+@app.route("/api/tournament/<name>/heats/<int:heat>", methods=["POST"])
+def api_enter_heat(name, heat):
+    """
+    Enter the times of a heat, posted as json {"times": [...]} in the order
+    of the heat's matchup, without rendering any page.
+
+    Posting the times of a heat already entered with the same times changes
+    nothing, so a retried request can't enter a heat twice, and different
+    times are refused with 409. Only json is accepted, which browsers won't
+    send to another site without asking, so no CSRF token is needed.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get("times"), list):
+        return jsonify(error='expected json {"times": [...]}'), 400
+    times = data["times"]
+    with _writing(name) as tour:
+        try:
+            entered = [x for _, x in tour.get_heat(heat)]
+        except ValueError as e:
+            return jsonify(error=str(e)), 404
+        try:
+            values = [float(x) for x in times]
+        except (TypeError, ValueError):
+            return jsonify(error="times must be numbers"), 400
+        if not any(math.isnan(x) for x in entered):
+            # times may be stored in single precision
+            same = len(values) == len(entered) and all(
+                math.isclose(x, y, rel_tol=1e-6) for x, y in zip(values, entered)
+            )
+            if not same:
+                msg = f"heat {heat} was already entered with other times"
+                return jsonify(error=msg, times=entered), 409
+            return jsonify(name=name, version=tour.version, heat=heat, entered=False)
+        try:
+            tour.set_times(values, heat=heat)
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        version = tour.version
+    CHANGES.notify()
+    return jsonify(name=name, version=version, heat=heat, entered=True)
+
+
+@app.route("/api/tournament/<name>/standings")
+def api_standings(name):
+    """ return the rank and statistics of each player """
+    with _reading(name) as tour:
+        state = _get_state(name, tour)
+    return jsonify(name=name, version=state["version"], standings=state["standings"])
+
+
+@app.route("/api/tournament/<name>/progress")
+def api_progress(name):
+    """ return the current heat, total heats and completed heats """
+    with _reading(name) as tour:
+        state = _get_state(name, tour)
+    return jsonify(name=name, version=state["version"], **state["progress"])
+
+
+@app.route("/api/store")
+def api_store():
+    """ return the size, hits, misses and evictions of the tournament store """
+    return jsonify(**STORE.stats())
+
+
+@app.route("/api/tournament/<name>/events")
+def api_events(name):
+    """
+    Stream changes to a tournament as server-sent events.
+
+    The first event, "state", holds the full state. Each later "update"
+    event holds only the parts which changed, and comments are sent as
+    heartbeats while nothing changes.
+    """
+    with _reading(name):
+        pass
+    heartbeat = app.config["EVENT_HEARTBEAT"]
+
+    def stream():
+        state = None
+        while True:
+            generation = CHANGES.generation
+            try:
+                with STORE.read(name) as tour:
+                    new_state = _get_state(name, tour)
+            except UnknownTournament:  # the tournament was deleted
+                return
+            version = new_state["version"]
+            if state is None:
+                yield _format_event("state", new_state, version)
+            elif version != state["version"]:
+                yield _format_event("update", _get_delta(state, new_state), version)
+            state = new_state
+            # changes made by other processes are found after each heartbeat
+            if CHANGES.wait(generation, heartbeat) == generation:
+                yield ": heartbeat\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream(), mimetype="text/event-stream", headers=headers)
@@ -0,0 +1,57 @@
+"""
+Caches for the pynewood flask app.
+"""
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    A dict-like cache which discards the least recently used item when full.
+
+    It is safe to share between threads, such as those of a threaded server.
+
+    Parameters
+    ----------
+    maxsize
+        The most items to keep.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        assert maxsize > 0
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        """ return the item for key, marking it recently used """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """ Add an item, discarding the least recently used if full. """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """ Remove all items. """
+        with self._lock:
+            self._data.clear()
@@ -8,3 +8,24 @@ import os
 
 class Config(object):
     SECRET_KEY = os.environ.get("SECRET_KEY") or "secret secret, Ive got a"
+    # journal each heat rather than saving the whole tournament, see
+    # pynewood.Tournament.use_journal
+    JOURNAL_TOURNAMENTS = True
+    JOURNAL_FSYNC_EVERY = 1
+    JOURNAL_SNAPSHOT_EVERY = 50
+    # where running tournaments are kept, see app.state. "memory" suits a
+    # single worker process, "shared" lets several workers share them
+    STATE_BACKEND = os.environ.get("PYNEWOOD_STATE_BACKEND") or "memory"
+    # the directory tournaments are saved in, None uses the default
+    STATE_PATH = os.environ.get("PYNEWOOD_STATE_PATH")
+    # the most tournaments kept in memory, idle ones are flushed to disk and
+    # reloaded when used again
+    STATE_MAX_TOURNAMENTS = 16
+    # the number of rendered tournament pages to cache
+    RENDER_CACHE_SIZE = 64
+    # the number of matchups returned by the api
+    API_MATCHUPS = 2
+    # seconds between heartbeats of idle event streams
+    EVENT_HEARTBEAT = 15
+    # record latency metrics and serve them at /metrics, see pynewood.metrics
+    METRICS_ENABLED = bool(os.environ.get("PYNEWOOD_METRICS"))
@@ -0,0 +1,36 @@
+"""
+Notification of changes to running tournaments.
+"""
+import threading
+
+
+class ChangeNotifier:
+    """
+    Wakes event streams when a tournament may have changed.
+
+    Each notification increments generation, so a stream which reads the
+    generation before checking for changes can't miss a notification sent
+    before it starts waiting.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self.generation = 0
+
+    def notify(self):
+        """ Wake all waiting streams. """
+        with self._condition:
+            self.generation += 1
+            self._condition.notify_all()
+
+    def wait(self, generation: int, timeout: float) -> int:
+        """
+        Wait until notified after generation or timeout seconds have passed,
+        return the current generation.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.generation != generation, timeout)
+            return self.generation
+
+
+CHANGES = ChangeNotifier()
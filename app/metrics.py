@@ -0,0 +1,76 @@
+"""
+Request and rendering metrics of the web app, and the /metrics endpoint.
+
+Metrics are recorded in pynewood.metrics.METRICS, with the tournament
+operations, when METRICS_ENABLED is set in the config.
+"""
+import time
+
+from flask import Response, abort, before_render_template, g, request
+from flask import template_rendered
+
+from app import app
+from app.api import STATE_CACHE
+from app.routes import RENDER_CACHE, STORE
+from pynewood.metrics import METRICS
+
+if app.config["METRICS_ENABLED"]:
+    METRICS.enable()
+
+METRICS.describe("pynewood_request_seconds", "Latency of web requests in seconds.")
+METRICS.describe("pynewood_render_seconds", "Time spent rendering templates.")
+
+
+@app.before_request
+def _start_request():
+    if METRICS.enabled:
+        g.metrics_start = time.perf_counter()
+
+
+@app.after_request
+def _record_request(response):
+    start = g.pop("metrics_start", None)
+    if start is not None and METRICS.enabled:
+        labels = (
+            ("endpoint", request.endpoint or "unknown"),
+            ("method", request.method),
+            ("status", str(response.status_code)),
+        )
+        seconds = time.perf_counter() - start
+        METRICS.observe("pynewood_request_seconds", seconds, labels)
+    return response
+
+
+@before_render_template.connect_via(app)
+def _start_render(sender, template, context, **extra):
+    if METRICS.enabled:
+        g.render_start = time.perf_counter()
+
+
+@template_rendered.connect_via(app)
+def _record_render(sender, template, context, **extra):
+    start = g.pop("render_start", None)
+    if start is not None and METRICS.enabled:
+        labels = (("template", template.name),)
+        seconds = time.perf_counter() - start
+        METRICS.observe("pynewood_render_seconds", seconds, labels)
+
+
+def _gauges() -> dict:
+    """ return the state of the tournament store and caches """
+    stats = STORE.stats()
+    gauges = {f"pynewood_store_{k}": v for k, v in stats.items() if v is not None}
+    for name, cache in (("render", RENDER_CACHE), ("state", STATE_CACHE)):
+        gauges[f"pynewood_{name}_cache_size"] = len(cache)
+        gauges[f"pynewood_{name}_cache_hits"] = cache.hits
+        gauges[f"pynewood_{name}_cache_misses"] = cache.misses
+    return gauges
+
+
+@app.route("/metrics")
+def metrics():
+    """ return the metrics in the Prometheus text format """
+    if not METRICS.enabled:
+        abort(404)
+    text = METRICS.to_prometheus(_gauges())
+    return Response(text, mimetype="text/plain; version=0.0.4")
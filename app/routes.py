@@ -2,56 +2,144 @@
 Routes for running pynewood as a flask app
 """
 
+import time
+import uuid
 from pathlib import Path
 
 import wtforms
-from flask import render_template, redirect, flash, url_for, request
+from flask import render_template, redirect, flash, url_for, request, session
 from flask_wtf import FlaskForm
 from wtforms.validators import DataRequired, NumberRange
 
 import pynewood as pn
 from app import app
+from app.cache import LRUCache
+from app.events import CHANGES
+from app.state import UnknownTournament, make_store
 from app.utils import _make_kwargs
-from pynewood.utils import get_saved_tournament_names, load_tournament
-
-TOURNAMENT = {}  # {tournament_name: tournament}
-TOUR_TYPE = {}  # {tournament_name: tournament_type}
+from pynewood.constants import AGGS, SCHEDULE_STRATEGIES, STORAGE_ENGINES
+from pynewood.metrics import METRICS
+from pynewood.utils import list_saved_tournaments
+
+# the running tournaments
+STORE = make_store(
+    app.config["STATE_BACKEND"],
+    app.config["STATE_PATH"],
+    app.config["STATE_MAX_TOURNAMENTS"],
+)
+# {(tournament_name, version): (matchups, standings html)}
+RENDER_CACHE = LRUCache(app.config["RENDER_CACHE_SIZE"])
+# tournament versions restart with the process, so etags include this id
+_PROCESS_ID = uuid.uuid4().hex[:8]
 DEFAULT_PLAYER_PATH = Path(__file__).parent.parent / "default_players.txt"
+# {(modification time, size): players} of the default players file
+_DEFAULT_PLAYERS = {}
+# {number of lanes: form class}, see _up_now_form_class
+_UP_NOW_FORMS = {}
+
+
+def get_default_players():
+    """ return the default players, reading the file again if it changed """
+    try:
+        stat = DEFAULT_PLAYER_PATH.stat()
+    except FileNotFoundError:
+        return []
+    key = (stat.st_mtime_ns, stat.st_size)
+    if key not in _DEFAULT_PLAYERS:
+        with DEFAULT_PLAYER_PATH.open() as fi:
+            players = fi.read().split("\n")
+        _DEFAULT_PLAYERS.clear()
+        _DEFAULT_PLAYERS[key] = players
+    return _DEFAULT_PLAYERS[key]
 
-DEFAULT_PLAYER_LIST = open(DEFAULT_PLAYER_PATH).read().split("\n")
-here = Path(".")
-tournament_path = here / "tournaments"
 
-# map tournament name to file
-SAVED_TOURNAMENTS = {x.name.split(".")[0]: str(x) for x in tournament_path.glob("*pkl")}
+# ------------------ Form factories
 
 
-# ------------------ Form factories
+def _describe_saved(entry):
+    """ return a label for a saved tournament from its catalog entry """
+    progress = entry.get("progress")
+    if not progress:
+        return entry["name"]
+    return f"{entry['name']} ({progress['heat']} / {progress['total_heats']})"
 
 
-def make_up_first_form(current_players):
-    """ return a form for entering times of those who are up """
+def _up_now_form_class(lanes: int):
+    """ return the form class for entering the times of a heat of lanes """
+    if lanes not in _UP_NOW_FORMS:
+
+        class UpNowForm(FlaskForm):
+            # the heat the form is for, so a repeated post can't enter the
+            # next heat
+            heat = wtforms.HiddenField()
+            submit = wtforms.SubmitField(label="Submit")
 
-    class UpNowForm(FlaskForm):
-        submit = wtforms.SubmitField(label="Submit")
+        for num in range(lanes):
+            field = wtforms.DecimalField(
+                validators=[NumberRange(min=0), DataRequired()]
+            )
+            setattr(UpNowForm, f"player{num}", field)
+        _UP_NOW_FORMS[lanes] = UpNowForm
+    return _UP_NOW_FORMS[lanes]
 
+
+def make_up_first_form(current_players, heat=None):
+    """ return a form for entering times of those who are up """
+    form = _up_now_form_class(len(current_players))()
     for num, player in enumerate(current_players):
-        name = f"player{num}"
-        num = wtforms.DecimalField(
-            label=player, validators=[NumberRange(min=0), DataRequired()]
-        )
-        setattr(UpNowForm, name, num)
+        field = form[f"player{num}"]
+        field.label = wtforms.Label(field.id, player)
+    if heat is not None and not form.heat.data:
+        form.heat.data = str(heat)
+    return form
+
+
+# ------------------ Page helpers
 
-    return UpNowForm()
+
+def _render_state(name, tour):
+    """ return the next matchups and the standings table html of a tournament """
+    key = (name, tour.version)
+    state = RENDER_CACHE.get(key)
+    if state is None:
+        matches = tour.get_next_matchups(2)
+        df = tour.get_ratings().round(decimals=3)
+        with METRICS.timer("pynewood_render", template="standings_table"):
+            table = df.to_html(classes="aTable")
+        state = (matches, table)
+        RENDER_CACHE.put(key, state)
+    return state
+
+
+def _page_etag(name, tour):
+    """
+    return the etag of a tournament page.
+
+    The page holds a CSRF token, so the etag also changes every half token
+    lifetime to keep browsers from reusing a page with an expired token.
+    """
+    etag = f"{_PROCESS_ID}-{name}-{tour.version}"
+    time_limit = app.config.get("WTF_CSRF_TIME_LIMIT", 3600)
+    if app.config.get("WTF_CSRF_ENABLED", True) and time_limit:
+        etag += f"-{int(time.time() // (time_limit / 2))}"
+    return etag
+
+
+def _with_etag(response, etag):
+    """ Set the etag of a response and ask browsers to revalidate it. """
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
 
 
 # --------------------- Forms
 
 
 class UndoEntry(FlaskForm):
-    """ A form for undoing. """
+    """ A form for undoing and redoing. """
 
     undo = wtforms.SubmitField(label="Undo")
+    redo = wtforms.SubmitField(label="Redo")
 
 
 class NewTournamentForm(FlaskForm):
@@ -60,30 +148,46 @@ class NewTournamentForm(FlaskForm):
     name = wtforms.StringField(
         label="Name", default="pine", validators=[DataRequired()]
     )
-    # get a list of tuples (name, name) for each tournament type
-    tour_choices = [(x, x) for x in pn.get_tournament_types()]
-    tour_type = wtforms.SelectField(label="type", choices=tour_choices)
+    tour_type = wtforms.SelectField(label="type", choices=[])
     # submit button
     new_tournament = wtforms.SubmitField(label="Create New Tournament")
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # the tournament types are imported when first needed
+        self.tour_type.choices = [(x, x) for x in pn.get_tournament_types()]
+
 
 class LoadTournamentForm(FlaskForm):
-    """ A form for creating a new tournament """
+    """ A form for loading a saved tournament """
 
-    choices = [(x, x) for x in get_saved_tournament_names()]
-    name = wtforms.SelectField(label="Saved Tournaments", choices=choices)
+    name = wtforms.SelectField(label="Saved Tournaments", choices=[])
     load_tournament = wtforms.SubmitField(label="Load Tournament")
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # read the catalog of saved tournaments for each new form
+        self.name.choices = [
+            (x["name"], _describe_saved(x)) for x in list_saved_tournaments()
+        ]
+
 
 class CreateTournament(FlaskForm):
     """ a simple form for text area input of the team """
 
-    _default_players = "\n".join(DEFAULT_PLAYER_LIST)
-    players = wtforms.TextAreaField(label="player list", default=_default_players)
+    players = wtforms.TextAreaField(
+        label="player list", default=lambda: "\n".join(get_default_players())
+    )
     players_per_round = wtforms.IntegerField(default=4)
     number_of_plays = wtforms.IntegerField(default=2)
-    _agg_options = [(x, x) for x in pn.core.AGGS]
+    _agg_options = [(x, x) for x in AGGS]
     rank_stat = wtforms.SelectField(choices=_agg_options, default="min")
+    _strategy_options = [(x, x) for x in SCHEDULE_STRATEGIES]
+    schedule_strategy = wtforms.SelectField(
+        choices=_strategy_options, default=SCHEDULE_STRATEGIES[0]
+    )
+    _storage_options = [(x, x) for x in STORAGE_ENGINES]
+    storage = wtforms.SelectField(choices=_storage_options, default=STORAGE_ENGINES[0])
     create_tournament = wtforms.SubmitField(label="Create Tournament")
 
 
@@ -93,47 +197,38 @@ class CreateTournament(FlaskForm):
 @app.route("/tournament_<name>", methods=["GET", "POST"])
 def run_tournament(name):
     """ page for running the tournament """
-
-    # if tournament is not loaded decide to load or create
-    if name in TOURNAMENT:
-        tour = TOURNAMENT[name]
-    elif name in get_saved_tournament_names():
-        return redirect(url_for("load_tournament", name=name))
-    else:
+    if name not in STORE:
+        return redirect(url_for("index"))
+    # posts may change the tournament, so hold it for writing
+    access = STORE.write if request.method == "POST" else STORE.read
+    try:
+        with access(name) as tour:
+            return _run_tournament(name, tour)
+    except UnknownTournament:  # deleted since it was checked
         return redirect(url_for("index"))
 
-    kwargs = dict(name=name)
-    matches = tour.get_next_matchups(2)
+
+def _run_tournament(name, tour):
+    """ show or update a tournament which is held by the store """
+    if request.method == "POST":
+        response = _post_run_tournament(name, tour)
+        if response is not None:
+            return response
+    # unchanged pages aren't sent again, unless there are messages to show
+    etag = None
+    if request.method == "GET" and not session.get("_flashes"):
+        etag = _page_etag(name, tour)
+        if request.if_none_match.contains_weak(etag):
+            return _with_etag(app.make_response(("", 304)), etag)
+    matches, car_table = _render_state(name, tour)
+    heats = tour.get_next_heats(1)
 
     # create form
-    form = make_up_first_form(matches[0] if len(matches) else [])
+    form = make_up_first_form(
+        matches[0] if len(matches) else [], heats[0] if heats else None
+    )
     undo_form = UndoEntry()
 
-    # undo was clicked
-    if undo_form.undo.data:
-        tour.undo()
-        return redirect(url_for("run_tournament", **kwargs))
-
-    # data is being submitted
-    if request.method == "POST":
-        if form.validate_on_submit():
-            # set values
-            if len(matches):
-                for num, player in enumerate(matches[0]):
-                    player_name = f"player{num}"
-                    val = float(getattr(form, player_name).data)
-                    tour.set_time(player, val)
-                # redirect to input to clear form state
-                tour.save()
-                return redirect(url_for("run_tournament", **kwargs))
-            else:
-                flash("Tournament complete!")
-        else:
-            flash("All fields must be numbers greater than 0")
-
-    # get table to display
-    df = tour.get_ratings().round(decimals=3)
-    car_table = df.to_html(classes="aTable")
     progress_string = f"{tour.heat} / {tour.total_heats}"
     kwargs = dict(
         matches=matches,
@@ -143,7 +238,46 @@ def run_tournament(name):
         undo_form=undo_form,
         progress_string=progress_string,
     )
-    return render_template("run_tournament.html", **kwargs)
+    response = app.make_response(render_template("run_tournament.html", **kwargs))
+    return response if etag is None else _with_etag(response, etag)
+
+
+def _post_run_tournament(name, tour):
+    """
+    Handle a post to a tournament page without rendering it.
+
+    Returns a redirect, or None if the page should be shown with the
+    messages flashed.
+    """
+    redirect_to_page = redirect(url_for("run_tournament", name=name))
+    undo_form = UndoEntry()
+    # undo or redo was clicked
+    if undo_form.undo.data or undo_form.redo.data:
+        if undo_form.undo.data:
+            tour.undo()
+        else:
+            tour.redo()
+        CHANGES.notify()
+        return redirect_to_page
+    heats = tour.get_next_heats(1)
+    if not heats:
+        flash("Tournament complete!")
+        return None
+    heat = heats[0]
+    players = [x for x, _ in tour.get_heat(heat)]
+    form = make_up_first_form(players)
+    if not form.validate_on_submit():
+        flash("All fields must be numbers greater than 0")
+        return None
+    # a form posted twice, or for a heat someone else entered, is ignored
+    if form.heat.data and form.heat.data != str(heat):
+        flash(f"Heat {form.heat.data} was already entered")
+        return redirect_to_page
+    times = [float(form[f"player{num}"].data) for num in range(len(players))]
+    tour.set_times(times, heat=heat)
+    CHANGES.notify()
+    # redirect to input to clear form state
+    return redirect_to_page
 
 
 @app.route("/create_tournament_<tour_type>_<name>", methods=["GET", "POST"])
@@ -156,14 +290,20 @@ def create_tournament(tour_type, name):
         # get players from form
         data["players"] = form.players.data.splitlines()
         data["name"] = name
-        # cache tour type
-        TOUR_TYPE[name] = tour_type
-        # create tournament, stash, and save
-        cls = pn.get_tournament_types()[TOUR_TYPE[name]]
+        # create tournament, save, and stash
+        cls = pn.get_tournament_types()[tour_type]
         kwargs = _make_kwargs(cls, data)
         tour = cls(**kwargs)
-        TOURNAMENT[name] = tour
-        tour.save()
+        if app.config["JOURNAL_TOURNAMENTS"]:
+            tour.use_journal(
+                STORE.path,
+                fsync_every=app.config["JOURNAL_FSYNC_EVERY"],
+                snapshot_every=app.config["JOURNAL_SNAPSHOT_EVERY"],
+            )
+        else:
+            tour.save(STORE.path)
+        STORE.add(tour)
+        CHANGES.notify()
 
         return redirect(url_for("run_tournament", name=name))
 
@@ -173,10 +313,8 @@ def create_tournament(tour_type, name):
 
 
 @app.route("/load_tournament/<name>")
-def load_tournament(name):
-    """ load the tournament, head over to run_tournament """
-    if name not in TOURNAMENT:
-        TOURNAMENT[name] = load_tournament(name)
+def open_tournament(name):
+    """ head over to run_tournament, the store loads tournaments when used """
     return redirect(url_for("run_tournament", name=name))
 
 
@@ -197,6 +335,6 @@ def index():
         if load_form.load_tournament.data:
             name = load_form.name.data
             # flash(f"loading tournament: {name}")
-            return redirect(url_for("load_tournament", name=name))
+            return redirect(url_for("open_tournament", name=name))
 
     return render_template("index.html", new_form=new_form, load_form=load_form)
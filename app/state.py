@@ -0,0 +1,314 @@
+"""
+Stores of the tournaments run by the web app.
+
+Requests read and change tournaments through a store, which locks the
+tournament while it is used so concurrent requests can't interleave their
+changes. MemoryStore keeps tournaments in this process, which is enough for
+a single worker. SharedStore lets several worker processes run the same
+tournaments: each one is locked with a file lock in the save directory, and
+brought up to date with the changes other workers made, by replaying its
+journal or reloading it, before it is used.
+
+Stores keep at most max_tournaments tournaments in memory. When full, the
+least recently used tournament which isn't locked is flushed to disk and
+dropped, and loaded again the next time it is used.
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # not available on windows
+    fcntl = None
+
+import pynewood.constants
+from pynewood.utils import (
+    _find_saved_tournament,
+    get_saved_tournament_names,
+    load_tournament,
+    replay_journal,
+)
+
+
+class UnknownTournament(KeyError):
+    """ Raised when a store has no tournament of the requested name. """
+
+
+class TournamentStore:
+    """
+    Base class for stores of running tournaments.
+
+    Parameters
+    ----------
+    path
+        The directory tournaments are saved in.
+    max_tournaments
+        The most tournaments to keep in memory, None for no limit.
+    """
+
+    def __init__(self, path=None, max_tournaments=None):
+        assert max_tournaments is None or max_tournaments > 0
+        self.path = Path(path or pynewood.constants.DEFAULT_SAVE_PATH)
+        self.max_tournaments = max_tournaments
+        self.hits = 0  # tournaments used from memory
+        self.misses = 0  # tournaments loaded from disk
+        self.evictions = 0  # tournaments dropped from memory
+        # {tournament_name: tournament}, least recently used first
+        self._tournaments = OrderedDict()
+        self._locks = {}  # {tournament_name: lock}
+        self._users = {}  # {tournament_name: number of holders}
+        self._lock = threading.Lock()  # guards the dicts above
+
+    def __contains__(self, name):
+        if name in self._tournaments:
+            return True
+        return name in get_saved_tournament_names(self.path)
+
+    def __len__(self):
+        return len(self._tournaments)
+
+    def stats(self) -> dict:
+        """ return the size, limit, hits, misses and evictions of the store """
+        return dict(
+            size=len(self),
+            max_tournaments=self.max_tournaments,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+    def add(self, tournament):
+        """
+        Add a new tournament, replacing any of the same name.
+
+        The tournament should already be saved or journaled.
+        """
+        with self._use(tournament.name, exclusive=True):
+            self._keep(tournament.name, tournament)
+            self._after_write(tournament.name)
+
+    def discard(self, name):
+        """
+        Drop a tournament from memory without saving it, as when its files
+        are deleted, so it isn't saved again when evicted.
+        """
+        with self._use(name, exclusive=True):
+            with self._lock:
+                tournament = self._tournaments.pop(name, None)
+            if tournament is not None and tournament.journal is not None:
+                tournament.journal.close()
+
+    @contextmanager
+    def read(self, name):
+        """ Lock a tournament and yield it for reading. """
+        with self._use(name, exclusive=False):
+            yield self._get(name, exclusive=False)
+
+    @contextmanager
+    def write(self, name):
+        """
+        Lock a tournament and yield it for changing.
+
+        Tournaments which aren't journaled are saved after they change.
+        """
+        with self._use(name, exclusive=True):
+            tournament = self._get(name, exclusive=True)
+            version = tournament.version
+            yield tournament
+            if tournament.version != version:
+                if tournament.journal is None:
+                    tournament.save(self.path)
+                self._after_write(name)
+
+    # --- memory management
+
+    def _cached(self, name):
+        """ return a tournament kept in memory, or None """
+        with self._lock:
+            tournament = self._tournaments.get(name)
+            if tournament is not None:
+                self._tournaments.move_to_end(name)
+            return tournament
+
+    def _keep(self, name, tournament):
+        """ Keep a tournament in memory, evicting others if full. """
+        with self._lock:
+            replaced = self._tournaments.get(name)
+            self._tournaments[name] = tournament
+            self._tournaments.move_to_end(name)
+            candidates = list(self._tournaments)[:-1]
+        if replaced is not None and replaced is not tournament:
+            if replaced.journal is not None:
+                replaced.journal.close()
+        if self.max_tournaments is None:
+            return
+        for other in candidates:
+            if len(self._tournaments) <= self.max_tournaments:
+                break
+            self._evict(other)
+
+    @contextmanager
+    def _use(self, name, exclusive: bool):
+        """ Hold the lock on a tournament, counting it as in use. """
+        with self._lock:
+            self._users[name] = self._users.get(name, 0) + 1
+        try:
+            with self._hold(name, exclusive):
+                yield
+        finally:
+            with self._lock:
+                self._users[name] -= 1
+
+    def _evict(self, name):
+        """ Flush and drop a tournament, unless it is in use. """
+        lock = self._thread_lock(name)
+        if not lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                if self._users.get(name):  # held by this thread
+                    return
+                tournament = self._tournaments.pop(name, None)
+            if tournament is not None:
+                self._flush(tournament)
+                self.evictions += 1
+        finally:
+            lock.release()
+
+    # --- hooks for subclasses
+
+    def _thread_lock(self, name) -> threading.RLock:
+        with self._lock:
+            if name not in self._locks:
+                self._locks[name] = threading.RLock()
+            return self._locks[name]
+
+    @contextmanager
+    def _hold(self, name, exclusive: bool):
+        """ Hold the lock on a tournament. """
+        with self._thread_lock(name):
+            yield
+
+    def _get(self, name, exclusive: bool):
+        """
+        return a locked tournament, raise UnknownTournament if none.
+        exclusive is True if the lock is held for writing.
+        """
+        raise NotImplementedError
+
+    def _after_write(self, name):
+        """ Called, still holding the lock, after a tournament changed. """
+
+    def _flush(self, tournament):
+        """
+        Make sure all of a tournament's changes are on disk before it is
+        dropped from memory. Tournaments which aren't journaled are saved
+        after each change, journaled ones are saved so they load without
+        replaying the journal.
+        """
+        journal = tournament.journal
+        if journal is not None:
+            if journal.pending:
+                tournament.save(journal.path.parent)
+            journal.close()
+
+
+class MemoryStore(TournamentStore):
+    """
+    Keeps tournaments in this process, loading saved ones when first used.
+    """
+
+    def _get(self, name, exclusive: bool):
+        tournament = self._cached(name)
+        if tournament is not None:
+            self.hits += 1
+            return tournament
+        try:
+            tournament = load_tournament(name, self.path)
+        except FileNotFoundError:
+            raise UnknownTournament(name)
+        self.misses += 1
+        self._keep(name, tournament)
+        return tournament
+
+
+class SharedStore(TournamentStore):
+    """
+    Shares tournaments saved in a directory between processes.
+
+    The lock on a tournament is an flock of {name}.lock in the save
+    directory, shared for reads and exclusive for writes. Each process
+    remembers the size and modification time of the saved tournament it
+    last read or wrote; if the file changed another process saved it and it
+    is reloaded, otherwise only the journal records it is missing are
+    replayed.
+    """
+
+    def __init__(self, path=None, max_tournaments=None):
+        if fcntl is None:
+            raise RuntimeError("SharedStore requires fcntl, which is unavailable")
+        super().__init__(path, max_tournaments)
+        self._signatures = {}  # {tournament_name: signature of saved file}
+
+    def _signature(self, name):
+        """ return the file name, mtime and size of a saved tournament """
+        try:
+            path = _find_saved_tournament(name, self.path)
+        except FileNotFoundError:
+            return None
+        stat = path.stat()
+        return (path.name, stat.st_mtime_ns, stat.st_size)
+
+    @contextmanager
+    def _hold(self, name, exclusive: bool):
+        lock_path = self.path / f"{name}.lock"
+        self.path.mkdir(parents=True, exist_ok=True)
+        with self._thread_lock(name), lock_path.open("a") as fi:
+            fcntl.flock(fi, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(fi, fcntl.LOCK_UN)
+
+    def _get(self, name, exclusive: bool):
+        signature = self._signature(name)
+        if signature is None:  # deleted, or never saved
+            with self._lock:
+                tournament = self._tournaments.pop(name, None)
+            if tournament is not None and tournament.journal is not None:
+                tournament.journal.close()
+            raise UnknownTournament(name)
+        tournament = self._cached(name)
+        if tournament is None or signature != self._signatures.get(name):
+            # only cut off a torn journal record while no one else can read
+            tournament = load_tournament(name, self.path, recover=exclusive)
+            self.misses += 1
+            self._signatures[name] = signature
+            self._keep(name, tournament)
+            return tournament
+        self.hits += 1
+        if tournament.journal is not None:
+            replay_journal(tournament, recover=exclusive)
+        return tournament
+
+    def _after_write(self, name):
+        # the tournament may have been saved
+        self._signatures[name] = self._signature(name)
+
+    def _flush(self, tournament):
+        # every change is already on disk, and saving without holding the
+        # file lock could overwrite changes made by other processes
+        if tournament.journal is not None:
+            tournament.journal.close()
+
+
+STORES = {"memory": MemoryStore, "shared": SharedStore}
+
+
+def make_store(
+    backend: str = "memory", path=None, max_tournaments=None
+) -> TournamentStore:
+    """ Create a store of one of the STORES backends. """
+    return STORES[backend](path, max_tournaments)
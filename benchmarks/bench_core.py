@@ -0,0 +1,269 @@
+"""
+Benchmarks for the hot paths of LimitedRound.
+
+Each benchmark is run over a grid of players, players_at_once,
+number_of_plays and storage engines and the timings are written to a json
+file, which can be compared to the results of another commit. From the
+repository root::
+
+    python -m benchmarks.bench_core --output new.json
+    python -m benchmarks.bench_core --output new.json --compare old.json
+"""
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import pynewood
+from pynewood import LimitedRound
+from pynewood.simulate import Simulator
+from pynewood.utils import load_tournament
+
+PLAYERS = (10, 100, 1000, 5000)
+PLAYERS_AT_ONCE = (4, 6)
+NUMBER_OF_PLAYS = (2, 6)
+STORAGE = ("frame", "array")
+
+random_state = np.random.RandomState(13)
+
+
+def _time_calls(func, setup=None, repeat=5):
+    """
+    Time func repeat times, calling setup before each, and return the
+    median and min seconds per call.
+    """
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return dict(seconds=statistics.median(times), min=min(times))
+
+
+def _make(players, players_at_once, number_of_plays, storage):
+    names = [f"racer_{x}" for x in range(players)]
+    return LimitedRound(
+        names,
+        name=f"bench_{players}",
+        players_at_once=players_at_once,
+        number_of_plays=number_of_plays,
+        storage=storage,
+        seed=0,
+    )
+
+
+def _fill(tour, fraction):
+    """ enter random times for a fraction of the heats """
+    heats = int(tour.total_heats * fraction)
+    for matchup in tour.get_next_matchups(heats):
+        tour.set_times({x: random_state.rand() + 4.0 for x in matchup})
+    return tour
+
+
+def bench_init(make, repeat):
+    return _time_calls(make, repeat=repeat)
+
+
+def bench_set_time(make, repeat):
+    def setup():
+        tour = make()
+        return tour, tour.get_next_matchups(1)[0][0]
+
+    return _time_calls(lambda tour, player: tour.set_time(player, 4.2), setup, repeat)
+
+
+def bench_set_times(make, repeat):
+    def setup():
+        tour = make()
+        return tour, dict.fromkeys(tour.get_next_matchups(1)[0], 4.2)
+
+    return _time_calls(lambda tour, times: tour.set_times(times), setup, repeat)
+
+
+def bench_get_next_matchups(make, repeat):
+    tour = _fill(make(), 0.5)
+    return _time_calls(lambda: tour.get_next_matchups(2), repeat=repeat)
+
+
+def bench_get_ratings(make, repeat):
+    tour = _fill(make(), 0.5)
+    return _time_calls(tour.get_ratings, repeat=repeat)
+
+
+def bench_undo(make, repeat):
+    tour = _fill(make(), 0.5)
+
+    def setup():
+        tour.set_times({x: 4.2 for x in tour.get_next_matchups(1)[0]})
+        return ()
+
+    return _time_calls(tour.undo, setup, repeat)
+
+
+def bench_heat(make, repeat):
+    tour = _fill(make(), 0.5)
+    return _time_calls(lambda: (tour.heat, tour.total_heats), repeat=repeat)
+
+
+def bench_save(make, repeat, format="pickle"):
+    tour = _fill(make(), 0.5)
+    with tempfile.TemporaryDirectory() as path:
+        return _time_calls(lambda: tour.save(path, format=format), repeat=repeat)
+
+
+def bench_load(make, repeat, format="pickle"):
+    tour = _fill(make(), 0.5)
+    with tempfile.TemporaryDirectory() as path:
+        tour.save(path, format=format)
+        return _time_calls(lambda: load_tournament(tour.name, path), repeat=repeat)
+
+
+def bench_simulate(make, repeat, trials=1000):
+    """ project the standings of a half finished tournament """
+    tour = _fill(make(), 0.5)
+    return _time_calls(lambda: Simulator(tour).run(trials), repeat=repeat)
+
+
+def bench_event(make, repeat):
+    """ run a whole event the way the web app does, one heat at a time """
+
+    def run():
+        tour = make()
+        while True:
+            matchups = tour.get_next_matchups(2)
+            tour.get_ratings()
+            _ = f"{tour.heat} / {tour.total_heats}"
+            if not matchups:
+                break
+            tour.set_times({x: random_state.rand() + 4.0 for x in matchups[0]})
+
+    return _time_calls(run, repeat=1)
+
+
+BENCHMARKS = {
+    "init": bench_init,
+    "set_time": bench_set_time,
+    "set_times": bench_set_times,
+    "get_next_matchups": bench_get_next_matchups,
+    "get_ratings": bench_get_ratings,
+    "undo": bench_undo,
+    "heat": bench_heat,
+    "save_pickle": bench_save,
+    "load_pickle": bench_load,
+    "save_npz": lambda make, repeat: bench_save(make, repeat, "npz"),
+    "load_npz": lambda make, repeat: bench_load(make, repeat, "npz"),
+    "simulate": bench_simulate,
+    "event": bench_event,
+}
+
+
+def run_benchmarks(
+    benchmarks=tuple(BENCHMARKS),
+    players=PLAYERS,
+    players_at_once=PLAYERS_AT_ONCE,
+    number_of_plays=NUMBER_OF_PLAYS,
+    storage=STORAGE,
+    repeat=5,
+    verbose=False,
+):
+    """ run the benchmarks over the grid of options, return the results """
+    results = []
+    grid = itertools.product(players, players_at_once, number_of_plays, storage)
+    for params in grid:
+        kwargs = dict(zip(["players", "players_at_once", "number_of_plays"], params))
+        kwargs["storage"] = params[-1]
+
+        def make():
+            return _make(*params)
+
+        for name in benchmarks:
+            timing = BENCHMARKS[name](make, repeat)
+            results.append(dict(benchmark=name, **kwargs, **timing))
+            if verbose:
+                print(f"{name:18} {params} {timing['seconds']:.6f}")
+    return results
+
+
+def _commit():
+    cmd = ["git", "rev-parse", "--short", "HEAD"]
+    try:
+        return subprocess.run(cmd, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(new, old, threshold=1.5):
+    """
+    Return a dataframe of new / old timings and whether each is a regression
+    (slower by more than threshold).
+    """
+    keys = ["benchmark", "players", "players_at_once", "number_of_plays", "storage"]
+    new_df = pd.DataFrame(new["results"]).set_index(keys)["seconds"]
+    old_df = pd.DataFrame(old["results"]).set_index(keys)["seconds"]
+    out = pd.DataFrame(dict(old=old_df, new=new_df)).dropna()
+    out["ratio"] = out["new"] / out["old"]
+    out["regression"] = out["ratio"] > threshold
+    return out
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="a results file to compare to")
+    parser.add_argument("--threshold", type=float, default=1.5)
+    parser.add_argument("--benchmarks", nargs="+", default=list(BENCHMARKS))
+    parser.add_argument("--players", nargs="+", type=int, default=PLAYERS)
+    parser.add_argument(
+        "--players-at-once", nargs="+", type=int, default=PLAYERS_AT_ONCE
+    )
+    parser.add_argument(
+        "--number-of-plays", nargs="+", type=int, default=NUMBER_OF_PLAYS
+    )
+    parser.add_argument("--storage", nargs="+", default=STORAGE)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(args)
+
+    results = run_benchmarks(
+        benchmarks=args.benchmarks,
+        players=args.players,
+        players_at_once=args.players_at_once,
+        number_of_plays=args.number_of_plays,
+        storage=args.storage,
+        repeat=args.repeat,
+        verbose=True,
+    )
+    output = dict(
+        meta=dict(
+            commit=_commit(),
+            created=time.time(),
+            python=platform.python_version(),
+            numpy=np.__version__,
+            pandas=pd.__version__,
+            pynewood=pynewood.__version__,
+        ),
+        results=results,
+    )
+    with open(args.output, "w") as fi:
+        json.dump(output, fi, indent=1)
+
+    if args.compare:
+        with open(args.compare) as fi:
+            old = json.load(fi)
+        comparison = compare(output, old, args.threshold)
+        print(comparison.to_string())
+        if comparison["regression"].any():
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
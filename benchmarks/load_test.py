@@ -0,0 +1,428 @@
+"""
+A load test of the web app with many operators and displays at once.
+
+Operators fetch the next heat of a tournament from the api and post its
+times through the tournament page, while displays poll the tournament pages
+the way browsers do. The throughput, latency percentiles and error rate of
+each kind of request are reported, and once the operators finish the
+standings are checked against the times they posted, so lost or duplicated
+times are caught. From the repository root::
+
+    python -m benchmarks.load_test --operators 4 --displays 16 --players 200
+
+Each operator runs its own tournament unless --tournaments is given. With
+fewer tournaments than operators, operators share them and race to enter
+the same next heat, and only the operator whose times were entered counts
+them as posted; the others' posts are reported as conflicts.
+
+Without --url the app is started in this process on a free port, with CSRF
+checks off, and the tournaments it creates are deleted afterwards. A server
+given by --url must have WTF_CSRF_ENABLED off for the operators' posts.
+"""
+import argparse
+import http.client
+import json
+import logging
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+# operators give up after this many failed requests in a row
+MAX_FAILURES = 10
+
+random_state = np.random.RandomState(11)
+
+
+class Recorder:
+    """ Collects the latency and success of each request, by kind. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}  # {kind: [(seconds, ok), ...]}
+
+    def add(self, kind: str, seconds: float, ok: bool):
+        with self._lock:
+            self.requests.setdefault(kind, []).append((seconds, ok))
+
+    def summary(self, elapsed: float) -> dict:
+        """ return the count, throughput, error rate and percentiles by kind """
+        out = {}
+        with self._lock:
+            requests = {k: list(v) for k, v in self.requests.items()}
+        for kind, records in sorted(requests.items()):
+            seconds = np.array([x[0] for x in records])
+            errors = sum(not x[1] for x in records)
+            stats = dict(
+                requests=len(records),
+                per_second=len(records) / elapsed if elapsed else float("nan"),
+                error_rate=errors / len(records),
+            )
+            for pct, value in zip(PERCENTILES, np.percentile(seconds, PERCENTILES)):
+                stats[f"p{pct}"] = float(value)
+            out[kind] = stats
+        return out
+
+
+class Client:
+    """
+    Makes requests to the app and records them.
+
+    Parameters
+    ----------
+    url
+        The root url of the app.
+    recorder
+        Where the requests are recorded.
+    """
+
+    def __init__(self, url: str, recorder: Recorder):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.recorder = recorder
+
+    def request(
+        self,
+        kind,
+        method,
+        path,
+        data=None,
+        headers=None,
+        ok=(200,),
+        body=None,
+        json_body=False,
+    ):
+        """
+        make a request, with data form encoded or a json body, return the
+        status, headers and body
+        """
+        headers = dict(headers or {})
+        if data is not None:
+            body = urlencode(data)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        elif json_body:
+            headers["Content-Type"] = "application/json"
+        start = time.perf_counter()
+        try:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                content = response.read()
+            finally:
+                connection.close()
+        except OSError:
+            self.recorder.add(kind, time.perf_counter() - start, False)
+            return None, {}, b""
+        status = response.status
+        self.recorder.add(kind, time.perf_counter() - start, status in ok)
+        return status, dict(response.getheaders()), content
+
+    def get_json(self, kind, path):
+        status, _, content = self.request(kind, "GET", path)
+        return json.loads(content) if status == 200 else None
+
+
+def create_tournament(client, name, players, players_at_once, number_of_plays):
+    """ Create a tournament through the create page. """
+    data = dict(
+        players="\n".join(f"racer_{x}" for x in range(players)),
+        players_per_round=players_at_once,
+        number_of_plays=number_of_plays,
+        rank_stat="mean",
+    )
+    path = f"/create_tournament_LimitedRound_{name}"
+    status, _, _ = client.request("create", "POST", path, data, ok=(302,))
+    if status != 302:
+        raise RuntimeError(f"could not create tournament {name}, status {status}")
+
+
+def _entered(client, name, heat, times) -> bool:
+    """ return True if a heat was entered with the given times """
+    state = client.get_json("verify", f"/api/tournament/{name}/heats/{heat}")
+    if state is None or None in state["times"]:
+        return False
+    return bool(np.allclose(state["times"], times, rtol=1e-6))
+
+
+def operator(client, name, posted, heats=None, lean=False, conflicts=None):
+    """
+    Enter the heats of a tournament one at a time, adding the times which
+    were accepted to posted, {player: [times]}. Times are posted through
+    the tournament page, or the json heat api if lean.
+
+    If conflicts is a list the tournament is shared with other operators.
+    Posts for a heat another operator entered first are then appended to it
+    rather than counted as posted, and since the tournament page redirects
+    either way, its posts are checked against the heat's times.
+    """
+    done = failures = 0
+    while heats is None or done < heats:
+        state = client.get_json("matchups", f"/api/tournament/{name}/matchups?n=1")
+        if state is None:
+            failures += 1
+            if failures >= MAX_FAILURES:
+                break
+            continue
+        if not state["matchups"]:
+            break
+        heat, players = state["heats"][0], state["matchups"][0]
+        times = np.round(4.0 + random_state.rand(len(players)), 3)
+        conflict = False
+        if lean:
+            path = f"/api/tournament/{name}/heats/{heat}"
+            body = json.dumps(dict(times=times.tolist()))
+            ok = (200, 409) if conflicts is not None else (200,)
+            status, _, content = client.request(
+                "post_heat", "POST", path, body=body, json_body=True, ok=ok
+            )
+            accepted = status == 200 and json.loads(content)["entered"]
+            conflict = status == 409
+        else:
+            data = {f"player{num}": f"{x:.3f}" for num, x in enumerate(times)}
+            data["heat"] = heat
+            path = f"/tournament_{name}"
+            if conflicts is None:
+                status, _, _ = client.request(
+                    "post_heat", "POST", path, data, ok=(302,)
+                )
+                accepted = status == 302  # redirected after the times were entered
+            else:
+                # the page also redirects if another operator entered the heat
+                # first, or shows the tournament complete if it was the last
+                status, _, _ = client.request(
+                    "post_heat", "POST", path, data, ok=(200, 302)
+                )
+                accepted = status in (200, 302) and _entered(client, name, heat, times)
+                conflict = status in (200, 302) and not accepted
+        if accepted:
+            for player, value in zip(players, times):
+                posted.setdefault(player, []).append(float(value))
+            done += 1
+            failures = 0
+        elif conflicts is not None and conflict:
+            conflicts.append(heat)
+        else:
+            failures += 1
+            if failures >= MAX_FAILURES:
+                break
+
+
+def display(client, name, stop, interval=0.0):
+    """ Poll a tournament page until stopped, revalidating like a browser """
+    etag = None
+    while not stop.is_set():
+        headers = {"If-None-Match": etag} if etag else {}
+        path = f"/tournament_{name}"
+        status, response_headers, _ = client.request(
+            "display", "GET", path, headers=headers, ok=(200, 304)
+        )
+        etag = response_headers.get("ETag", etag)
+        if interval:
+            stop.wait(interval)
+
+
+def check(client, name, posted) -> dict:
+    """
+    Compare a tournament's standings to the times posted, return the
+    number of players whose times were lost or duplicated.
+    """
+    standings = client.get_json("check", f"/api/tournament/{name}/standings")
+    rows = {x["player"]: x for x in standings["standings"]}
+    lost = duplicated = 0
+    for player in set(rows) | set(posted):
+        row, times = rows.get(player), posted.get(player, [])
+        races = row["races"] if row else 0
+        if races < len(times):
+            lost += 1
+        elif races > len(times):
+            duplicated += 1
+        elif races and not np.isclose(row["mean"], np.mean(times)):
+            lost += 1  # a time was replaced by another
+    return dict(lost=lost, duplicated=duplicated)
+
+
+def start_server(host="127.0.0.1"):
+    """ Start the app on a free port in a thread, return the server and url """
+    from werkzeug.serving import make_server
+
+    from app import app
+
+    app.config["WTF_CSRF_ENABLED"] = False
+    # the request log would swamp the report
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server(host, 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def run_load_test(
+    url=None,
+    operators=2,
+    displays=4,
+    players=100,
+    players_at_once=4,
+    number_of_plays=2,
+    heats=None,
+    display_interval=0.0,
+    lean=False,
+    tournaments=None,
+):
+    """
+    Run a load test and return its summary.
+
+    Parameters
+    ----------
+    url
+        The root url of a running app, if None one is started.
+    operators
+        The number of operators, spread over the tournaments.
+    displays
+        The number of displays, spread over the tournaments.
+    players
+        The number of players in each tournament.
+    players_at_once
+        The number of players in each heat.
+    number_of_plays
+        The number of times each player races.
+    heats
+        The most heats each operator enters, defaults to all of them.
+    display_interval
+        The seconds each display waits between requests.
+    lean
+        If True operators post times to the json heat api rather than the
+        tournament page.
+    tournaments
+        The number of tournaments, defaults to one per operator. With fewer,
+        operators share tournaments and race to enter the same heats.
+    """
+    server = None
+    if url is None:
+        server, url = start_server()
+    recorder = Recorder()
+    client = Client(url, recorder)
+    run_id = uuid.uuid4().hex[:8]
+    # underscores would split the create url in the wrong place
+    names = [f"load{run_id}n{x}" for x in range(tournaments or operators)]
+    shared = len(names) < operators
+    conflicts = [] if shared else None
+    try:
+        for name in names:
+            create_tournament(client, name, players, players_at_once, number_of_plays)
+        posted = {name: {} for name in names}
+        stop = threading.Event()
+        display_threads = [
+            threading.Thread(
+                target=display,
+                args=(client, names[x % len(names)], stop, display_interval),
+            )
+            for x in range(displays)
+        ]
+        operator_names = [names[x % len(names)] for x in range(operators)]
+        operator_threads = [
+            threading.Thread(
+                target=operator,
+                args=(client, x, posted[x], heats, lean, conflicts),
+            )
+            for x in operator_names
+        ]
+        start = time.perf_counter()
+        for thread in display_threads + operator_threads:
+            thread.start()
+        for thread in operator_threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        for thread in display_threads:
+            thread.join()
+        checks = [check(client, name, posted[name]) for name in names]
+    finally:
+        if server is not None:
+            _cleanup(server, names)
+    return dict(
+        url=url,
+        seconds=elapsed,
+        requests=recorder.summary(elapsed),
+        lost=sum(x["lost"] for x in checks),
+        duplicated=sum(x["duplicated"] for x in checks),
+        conflicts=len(conflicts or ()),
+    )
+
+
+def _cleanup(server, names):
+    """ Stop a local server and delete the tournaments it created """
+    from app.routes import STORE
+    from pynewood.utils import delete_tournament
+
+    server.shutdown()
+    for name in names:
+        STORE.discard(name)
+        delete_tournament(name, STORE.path)
+
+
+def _format(summary) -> str:
+    """ return a table of the summary """
+    lines = [
+        f"{'request':12}{'count':>8}{'per sec':>10}{'errors':>8}"
+        + "".join(f"{f'p{x} ms':>10}" for x in PERCENTILES)
+    ]
+    for kind, stats in summary["requests"].items():
+        line = f"{kind:12}{stats['requests']:>8}{stats['per_second']:>10.1f}"
+        line += f"{stats['error_rate']:>8.1%}"
+        line += "".join(f"{stats[f'p{x}'] * 1000:>10.2f}" for x in PERCENTILES)
+        lines.append(line)
+    lines.append(
+        f"{summary['seconds']:.2f} seconds, {summary['lost']} players with lost "
+        f"times, {summary['duplicated']} with duplicated times, "
+        f"{summary['conflicts']} posts for heats already entered"
+    )
+    return "\n".join(lines)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--url", help="the root url of a running app")
+    parser.add_argument("--operators", type=int, default=2)
+    parser.add_argument("--displays", type=int, default=4)
+    parser.add_argument("--players", type=int, default=100)
+    parser.add_argument("--players-at-once", type=int, default=4)
+    parser.add_argument("--number-of-plays", type=int, default=2)
+    parser.add_argument("--heats", type=int, help="the most heats per operator")
+    parser.add_argument("--display-interval", type=float, default=0.0)
+    parser.add_argument(
+        "--tournaments",
+        type=int,
+        help="the number of tournaments, operators share them if fewer",
+    )
+    parser.add_argument(
+        "--lean", action="store_true", help="post times to the json heat api"
+    )
+    parser.add_argument("--output", help="a json file to write the summary to")
+    args = parser.parse_args(args)
+
+    summary = run_load_test(
+        url=args.url,
+        operators=args.operators,
+        displays=args.displays,
+        players=args.players,
+        players_at_once=args.players_at_once,
+        number_of_plays=args.number_of_plays,
+        heats=args.heats,
+        display_interval=args.display_interval,
+        lean=args.lean,
+        tournaments=args.tournaments,
+    )
+    print(_format(summary))
+    if args.output:
+        with open(args.output, "w") as fi:
+            json.dump(summary, fi, indent=1)
+    return int(bool(summary["lost"] or summary["duplicated"]))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,26 @@
 """
 The models for running pynewood durby tournaments
 """
+import importlib
 
-from .core import LimitedRound, get_tournament_types, Tournament
 from pynewood.utils import TournamentOption
 
 from pynewood.version import __version__
+
+# the tournament classes need pandas, which is slow to import, so they are
+# imported when first used
+_LAZY_ATTRIBUTES = {
+    "LimitedRound": "pynewood.core",
+    "Tournament": "pynewood.core",
+    "get_tournament_types": "pynewood.core",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
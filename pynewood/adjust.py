@@ -0,0 +1,146 @@
+"""
+Lane and track condition corrections for the times of a tournament.
+
+Some lanes are faster than others and a track may speed up or slow down as
+an event goes on, so a player's raw times depend on the lanes and heats they
+drew. LaneModel fits each time as
+
+    time = player effect + lane effect + trend * heat
+
+by least squares. Only sums over the entries, which change by one entry at
+a time, are kept. The player effects are eliminated from the normal
+equations, leaving a system with one unknown per lane (plus the trend)
+however many players there are, so the fit is cheap to update and solve
+after each heat.
+"""
+from typing import Hashable, Sequence
+
+import numpy as np
+import pandas as pd
+
+from pynewood.standings import Standings
+
+
+class LaneModel:
+    """
+    Running least squares fit of player, lane and trend effects.
+
+    The lane effects are relative to the average lane and the trend to the
+    middle heat, so adjusted times are the times expected in an average
+    lane halfway through the event.
+
+    Parameters
+    ----------
+    names
+        The table of player ids, player codes index into it.
+    lanes
+        The number of lanes.
+    total_heats
+        The number of heats, used to center and scale the trend.
+    """
+
+    def __init__(self, names: Sequence[Hashable], lanes: int, total_heats: int):
+        self.names = tuple(names)
+        self.lanes = lanes
+        self.total_heats = total_heats
+        # the features are one column per lane but the first, then the trend
+        size = lanes
+        self.count = np.zeros(len(self.names))
+        self.total = np.zeros(len(self.names))
+        self.player_features = np.zeros((len(self.names), size))
+        self.feature_products = np.zeros((size, size))
+        self.feature_totals = np.zeros(size)
+
+    @classmethod
+    def from_times(cls, names, lanes, total_heats, codes, lane, heats, times):
+        """ Create a model from the code, lane, heat and time of each entry """
+        out = cls(names, lanes, total_heats)
+        out.update(codes, lane, heats, np.full(len(times), np.nan), times)
+        return out
+
+    def _features(self, lane, heats) -> np.ndarray:
+        """ return the (entries, lanes) features of the given entries """
+        lane, heats = np.asarray(lane, dtype=np.int64), np.asarray(heats)
+        features = np.zeros((len(lane), self.lanes))
+        rows = np.flatnonzero(lane > 0)
+        features[rows, lane[rows] - 1] = 1.0
+        # heats scaled to -0.5 to 0.5, so the trend is the change over the event
+        middle = (self.total_heats - 1) / 2
+        features[:, -1] = (heats - middle) / max(self.total_heats, 1)
+        return features
+
+    def update(self, codes, lane, heats, old, new):
+        """ replace the old times of entries with the new, NaN is no time """
+        codes = np.asarray(codes, dtype=np.int64)
+        old, new = np.asarray(old, dtype=float), np.asarray(new, dtype=float)
+        features = self._features(lane, heats)
+        for times, sign in ((old, -1.0), (new, 1.0)):
+            entered = ~np.isnan(times)
+            if not entered.any():
+                continue
+            codes_, times_ = codes[entered], times[entered]
+            features_ = features[entered] * sign
+            size = len(self.names)
+            self.count += sign * np.bincount(codes_, minlength=size)
+            self.total += sign * np.bincount(codes_, weights=times_, minlength=size)
+            np.add.at(self.player_features, codes_, features_)
+            self.feature_products += features_.T @ features[entered]
+            self.feature_totals += features_.T @ times_
+
+    def fit(self, trend: bool = False):
+        """
+        Solve for the effects.
+
+        Returns the player effects, NaN for players without times, the lane
+        effects, and the trend over the whole event (0 if trend is False).
+        Effects the entered times can't separate take the smallest values
+        which fit.
+        """
+        kept = np.arange(self.lanes if trend else self.lanes - 1)
+        count, total = self.count, self.total
+        features = self.player_features[:, kept]
+        raced = count > 0
+        # the normal equations with the player effects eliminated
+        scaled = features[raced] / count[raced, None]
+        matrix = self.feature_products[np.ix_(kept, kept)] - scaled.T @ features[raced]
+        vector = self.feature_totals[kept] - scaled.T @ total[raced]
+        solution = np.zeros(len(kept))
+        if len(kept) and raced.any():
+            solution = np.linalg.lstsq(matrix, vector, rcond=1e-9)[0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            players = (total - features @ solution) / count
+        lane_effects = np.concatenate([[0.0], solution[: self.lanes - 1]])
+        shift = lane_effects.mean()
+        return (
+            players + shift,
+            lane_effects - shift,
+            float(solution[-1]) if trend else 0.0,
+        )
+
+    def _adjust(self, effects, lane, heats, times) -> np.ndarray:
+        """ return times with the lane and trend of a fit removed """
+        _, lane_effects, slope = effects
+        trend = self._features(lane, heats)[:, -1]
+        lane = np.asarray(lane, dtype=np.int64)
+        return np.asarray(times, dtype=float) - lane_effects[lane] - slope * trend
+
+    def adjust(self, lane, heats, times, trend: bool = False) -> np.ndarray:
+        """ return times with the fitted lane and trend effects removed """
+        return self._adjust(self.fit(trend), lane, heats, times)
+
+    def lane_effects(self, trend: bool = False) -> pd.Series:
+        """ return how much slower each lane is than the average lane """
+        index = pd.RangeIndex(self.lanes, name="lane")
+        return pd.Series(self.fit(trend)[1], index=index, name="lane_effect")
+
+    def table(self, codes, lane, heats, times, rank_stat="min", trend=False):
+        """
+        return a table of each player's rank and statistics of their
+        adjusted times, and their fitted player effect.
+        """
+        effects = self.fit(trend)
+        adjusted = self._adjust(effects, lane, heats, times)
+        table = Standings.from_times(self.names, codes, adjusted, rank_stat).table()
+        players = pd.Series(effects[0], index=pd.Index(self.names, dtype=object))
+        table["effect"] = players.loc[table.index].to_numpy()
+        return table
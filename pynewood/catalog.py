@@ -0,0 +1,234 @@
+"""
+An index of the tournaments saved in a directory.
+
+The catalog is a json file in the save directory recording the name, type,
+file, size, progress and modification time of each saved tournament. It is
+updated when tournaments are saved or deleted, and rebuilt only when the
+directory has been modified after the catalog was written, for example by
+copying tournaments into it. After each write the catalog's modification
+time is set to the directory's, so its own write, and the save which caused
+it, don't count as changes to the directory. Changes to the catalog are
+serialized by a lock, and an flock of catalog.lock, so threads and
+processes saving at once don't lose each other's entries.
+"""
+import json
+import os
+import pickle
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+
+try:
+    import fcntl
+except ImportError:  # not available on windows
+    fcntl = None
+
+from pynewood.constants import CATALOG_NAME, SAVE_FORMATS
+
+CATALOG_VERSION = 1
+
+# catalogs which have been opened, keyed by directory
+_CATALOGS = {}
+
+
+def describe_saved_file(path: Path) -> dict:
+    """ return the metadata of a saved tournament file """
+    if path.suffix == SAVE_FORMATS["npz"]:
+        from pynewood.columnar import read_metadata  # needs numpy
+
+        return read_metadata(path)
+    with path.open("rb") as fi:
+        return pickle.load(fi)._metadata()
+
+
+class Catalog:
+    """
+    An index of the tournaments saved in a directory.
+
+    Parameters
+    ----------
+    directory
+        The directory tournaments are saved in.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.path = self.directory / CATALOG_NAME
+        self._entries = None
+        self._catalog_mtime = None
+        self._lock = threading.Lock()
+
+    def _catalog_is_stale(self) -> bool:
+        """ True if the directory changed after the catalog was written """
+        try:
+            catalog_mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return True
+        return self.directory.stat().st_mtime_ns > catalog_mtime
+
+    @property
+    def entries(self) -> Dict[str, dict]:
+        """ return a dict of {name: entry} for each saved tournament """
+        if not self.directory.exists():
+            return {}
+        if self._catalog_is_stale():
+            with self._locked():
+                # it may have been written while waiting for the lock
+                if self._catalog_is_stale() or not self._read():
+                    self._rebuild()
+        elif self._entries is None or self._catalog_mtime != self._mtime():
+            if not self._read():
+                self.rebuild()
+        return self._entries
+
+    def names(self) -> List[str]:
+        """ return the sorted names of the saved tournaments """
+        return sorted(self.entries)
+
+    def update(self, metadata: dict, path: Path):
+        """ Record the tournament described by metadata saved to path. """
+        with self._locked():
+            entries = self._refresh()
+            entries[metadata["name"]] = self._make_entry(metadata, Path(path))
+            self._write()
+
+    def remove(self, name: str):
+        """ Remove a tournament from the catalog. """
+        with self._locked():
+            entries = self._refresh()
+            if entries.pop(name, None) is not None:
+                self._write()
+
+    def rebuild(self):
+        """
+        Scan the directory for saved tournaments.
+
+        Entries for files whose size and modification time have not changed
+        are reused, so only new or changed files are read.
+        """
+        with self._locked():
+            self._rebuild()
+
+    # --- helpers
+
+    def _rebuild(self):
+        previous = self._entries
+        if previous is None:
+            try:
+                previous = self._load()
+            except (OSError, ValueError, KeyError):
+                previous = {}
+        suffixes = set(SAVE_FORMATS.values())
+        entries = {}
+        paths = sorted(
+            (x for x in self.directory.iterdir() if x.suffix in suffixes),
+            key=lambda x: x.stat().st_mtime,
+        )
+        for path in paths:  # newest last, so it wins if saved in two formats
+            stat = path.stat()
+            entry = previous.get(path.stem)
+            unchanged = (
+                entry is not None
+                and entry["file"] == path.name
+                and entry["size"] == stat.st_size
+                and entry["modified"] == stat.st_mtime
+            )
+            if not unchanged:
+                try:
+                    entry = self._make_entry(describe_saved_file(path), path)
+                except Exception:  # skip files which can't be read
+                    continue
+            entries[path.stem] = entry
+        self._entries = entries
+        self._write()
+
+    @staticmethod
+    def _make_entry(metadata: dict, path: Path) -> dict:
+        stat = path.stat()
+        return dict(
+            name=path.stem,
+            type=metadata.get("type"),
+            file=path.name,
+            size=stat.st_size,
+            modified=stat.st_mtime,
+            progress=metadata.get("progress"),
+        )
+
+    @contextmanager
+    def _locked(self):
+        """ hold the catalog for a change, across threads and processes """
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with self.path.with_suffix(".lock").open("a") as fi:
+                fcntl.flock(fi, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fi, fcntl.LOCK_UN)
+
+    def _refresh(self) -> Dict[str, dict]:
+        """
+        Return the entries as last written, by any process, without checking
+        the directory, which the caller just changed. Call while locked.
+        """
+        # always read, two writes may leave the catalog with the same mtime
+        if not self._read():
+            self._rebuild()
+        return self._entries
+
+    def _mtime(self):
+        try:
+            return self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self) -> Dict[str, dict]:
+        with self.path.open() as fi:
+            contents = json.load(fi)
+        if contents["version"] != CATALOG_VERSION:
+            raise ValueError("unsupported catalog version")
+        return contents["tournaments"]
+
+    def _read(self) -> bool:
+        """ read the catalog, return False if it is missing or corrupt """
+        # stat first, so a catalog replaced while reading is read again
+        mtime = self._mtime()
+        try:
+            self._entries = self._load()
+        except (OSError, ValueError, KeyError):
+            self._entries = None
+            return False
+        self._catalog_mtime = mtime
+        return True
+
+    def _write(self):
+        # replaced atomically so other processes never read a partial catalog
+        contents = dict(version=CATALOG_VERSION, tournaments=self._entries)
+        handle, temp_path = tempfile.mkstemp(
+            prefix=f"{self.path.name}.", suffix=".tmp", dir=self.directory
+        )
+        try:
+            with os.fdopen(handle, "w") as fi:
+                json.dump(contents, fi)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        # the directory changed when the catalog, and any tournament saved
+        # before it, were replaced; record those changes as seen
+        directory_mtime = self.directory.stat().st_mtime_ns
+        os.utime(self.path, ns=(directory_mtime, directory_mtime))
+        self._catalog_mtime = self._mtime()
+
+
+def get_catalog(directory) -> Catalog:
+    """ return the catalog of a save directory """
+    key = Path(directory).resolve()
+    if key not in _CATALOGS:
+        _CATALOGS[key] = Catalog(key)
+    return _CATALOGS[key]
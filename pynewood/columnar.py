@@ -0,0 +1,117 @@
+"""
+A versioned columnar file format for saved tournaments.
+
+A tournament is saved as an uncompressed npz file holding one array per
+column plus a small json metadata member with the tournament type and
+options. Members of an npz file are read independently, so the metadata
+can be read without loading the columns, and because the members are stored
+uncompressed the columns can be memory mapped.
+"""
+import json
+import os
+import struct
+import zipfile
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+
+FORMAT_NAME = "pynewood-columnar"
+FORMAT_VERSION = 1
+METADATA_MEMBER = "metadata"
+
+
+def write_columnar(path, metadata: dict, arrays: Dict[str, np.ndarray]):
+    """
+    Write the metadata and arrays to path, replacing it atomically.
+
+    Parameters
+    ----------
+    path
+        The path of the npz file to write.
+    metadata
+        A json serializable dict of information about the tournament.
+    arrays
+        The columns of the tournament, none may have an object dtype.
+    """
+    path = Path(path)
+    assert METADATA_MEMBER not in arrays
+    for name, array in arrays.items():
+        if np.asarray(array).dtype == object:
+            msg = f"{name} can't be saved in the columnar format, use pickle"
+            raise TypeError(msg)
+    header = dict(metadata, format=FORMAT_NAME, version=FORMAT_VERSION)
+    members = dict(arrays, **{METADATA_MEMBER: np.array(json.dumps(header))})
+    temp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(temp_path, "wb") as fi:
+        np.savez(fi, **members)
+        fi.flush()
+        os.fsync(fi.fileno())
+    os.replace(temp_path, path)
+
+
+def read_metadata(path) -> dict:
+    """ Read only the metadata of a columnar file. """
+    with np.load(path, allow_pickle=False) as npz:
+        metadata = json.loads(str(npz[METADATA_MEMBER]))
+    if metadata.get("format") != FORMAT_NAME:
+        raise ValueError(f"{path} is not a pynewood columnar file")
+    if metadata["version"] > FORMAT_VERSION:
+        msg = (
+            f"{path} uses format version {metadata['version']} but only "
+            f"versions up to {FORMAT_VERSION} are supported"
+        )
+        raise ValueError(msg)
+    return metadata
+
+
+def _memmap_member(path: Path, archive: zipfile.ZipFile, name: str) -> np.ndarray:
+    """ Memory map an uncompressed npy member of an npz file. """
+    info = archive.getinfo(name)
+    assert info.compress_type == zipfile.ZIP_STORED
+    with archive.open(info) as fi:
+        version = np.lib.format.read_magic(fi)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(fi)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(fi)
+        header_size = fi.tell()
+    # the member data follows its local file header in the zip file
+    with path.open("rb") as fi:
+        fi.seek(info.header_offset)
+        local_header = fi.read(30)
+    name_size, extra_size = struct.unpack("<HH", local_header[26:30])
+    offset = info.header_offset + 30 + name_size + extra_size + header_size
+    if not np.prod(shape):  # empty arrays can't be memory mapped
+        return np.empty(shape, dtype=dtype)
+    order = "F" if fortran_order else "C"
+    return np.memmap(
+        path, dtype=dtype, mode="r", offset=offset, shape=shape, order=order
+    )
+
+
+def read_columnar(path, mmap: bool = False) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """
+    Read the metadata and arrays of a columnar file.
+
+    Parameters
+    ----------
+    path
+        The path of the npz file.
+    mmap
+        If True memory map the arrays (read only) instead of reading them.
+    """
+    path = Path(path)
+    metadata = read_metadata(path)
+    if mmap:
+        with zipfile.ZipFile(path) as archive:
+            names = [x[: -len(".npy")] for x in archive.namelist()]
+            arrays = {
+                x: _memmap_member(path, archive, x + ".npy")
+                for x in names
+                if x != METADATA_MEMBER
+            }
+    else:
+        with np.load(path, allow_pickle=False) as npz:
+            arrays = {x: npz[x] for x in npz.files if x != METADATA_MEMBER}
+    return metadata, arrays
@@ -5,3 +5,15 @@ from pathlib import Path
 
 AGGS = ["min", "max", "mean", "median", "std", "size"]
 DEFAULT_SAVE_PATH = Path(__file__).parent.parent / "tournaments"
+
+# strategies for assigning players to heats, the first is the default
+SCHEDULE_STRATEGIES = ("constructive", "random", "lane_balanced")
+# max number of times the random strategy shuffles players to avoid self play
+MAX_SHAKE_UPS = 100
+# engines for storing tournament entries, the first is the default
+STORAGE_ENGINES = ("frame", "array")
+# formats tournaments can be saved in and their file suffixes, the first is
+# the default
+SAVE_FORMATS = {"pickle": ".pkl", "npz": ".npz"}
+# the name of the index of saved tournaments kept in each save directory
+CATALOG_NAME = "catalog.json"
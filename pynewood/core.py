@@ -2,20 +2,54 @@
 Core classes for pynewood
 """
 import itertools
+import operator
+import os
 import pickle
-import random
 from pathlib import Path
-from typing import List, Sequence, Hashable
+from typing import List, Mapping, Optional, Sequence, Hashable
 
 import numpy as np
 import pandas as pd
 
-from pynewood.constants import DEFAULT_SAVE_PATH, AGGS
-from pynewood.exceptions import InvalidTournamentError
-
-# a list of aggregations to perform
-from pynewood.utils import missing_time, player_list, load_tournament, TournamentOption
-
+from pynewood.adjust import LaneModel
+from pynewood.catalog import get_catalog
+from pynewood.columnar import write_columnar
+from pynewood.constants import (
+    DEFAULT_SAVE_PATH,
+    AGGS,
+    SAVE_FORMATS,
+    SCHEDULE_STRATEGIES,
+    STORAGE_ENGINES,
+)
+from pynewood.journal import Journal
+from pynewood.metrics import timed
+from pynewood.oplog import Operation, OperationLog
+from pynewood.scheduling import make_schedule
+from pynewood.standings import Standings
+from pynewood.storage import FrameStorage, STORAGE_CLASSES
+
+from pynewood.utils import load_tournament, TournamentOption
+
+
+# versions are drawn from one counter so two states of tournaments loaded
+# in the same process never share a version
+_VERSIONS = itertools.count(1)
+
+
+def _as_round(round) -> int:
+    """ return a round number as an int, raise ValueError if it isn't one """
+    try:
+        return operator.index(round)
+    except TypeError:
+        pass
+    # whole floats, and strings such as those of a str array, are accepted
+    try:
+        value = float(round)
+    except (TypeError, ValueError):
+        value = np.nan
+    if not value.is_integer():
+        raise ValueError(f"round {round!r} is not a whole number")
+    return int(value)
 
 # --------- Tournament classes
 
@@ -28,23 +62,135 @@ class Tournament:
 
     def __init__(self, name):
         self.name = name
+        self.journal = None
+        self.save_format = "pickle"
+        self._log = OperationLog()
+        self._touch()
 
     def __init_subclass__(cls, **kwargs):
         # register subclass
         tournament_type = cls.__name__
         Tournament.registered_tournament_types[tournament_type] = cls
 
-    def save(self, path=None):
-        """ Pickle the tournament object to path or default path. """
-        path = Path(path or DEFAULT_SAVE_PATH) / f"{self.name}.pkl"
-        with open(path, "wb") as fi:
-            pickle.dump(self, fi)
+    def __setstate__(self, state):
+        # tournaments pickled before journals and the operation log were
+        # kept have neither
+        state.setdefault("journal", None)
+        state.setdefault("save_format", "pickle")
+        state.setdefault("_log", OperationLog())
+        self.__dict__.update(state)
+        self._touch()
+
+    @property
+    def version(self) -> int:
+        """ A number which increases each time the tournament changes. """
+        return self._version
+
+    def _touch(self):
+        """ Give the tournament a new version after a change. """
+        self._version = next(_VERSIONS)
+
+    def save(self, path=None, format=None):
+        """
+        Save the tournament to path or default path.
+
+        The file is replaced atomically so a crash while saving never leaves
+        a partly written tournament. If the tournament is journaled in the
+        same directory, the journal is cleared.
+
+        Parameters
+        ----------
+        path
+            The directory to save the tournament in.
+        format
+            One of SAVE_FORMATS. "pickle" pickles the tournament object and
+            "npz" uses the versioned columnar format of pynewood.columnar.
+            Defaults to the format the tournament was last saved in.
+        """
+        format = format or self.save_format
+        directory = Path(path or DEFAULT_SAVE_PATH)
+        path = directory / f"{self.name}{SAVE_FORMATS[format]}"
+        if format == "pickle":
+            self.save_format = format
+            temp_path = path.with_suffix(".pkl.tmp")
+            with open(temp_path, "wb") as fi:
+                pickle.dump(self, fi)
+                fi.flush()
+                os.fsync(fi.fileno())
+            os.replace(temp_path, path)
+        else:
+            write_columnar(path, *self._to_columns())
+            self.save_format = format
+        # remove any copies saved in other formats
+        for suffix in set(SAVE_FORMATS.values()) - {path.suffix}:
+            other_path = directory / f"{self.name}{suffix}"
+            if other_path.exists():
+                other_path.unlink()
+        get_catalog(directory).update(self._metadata(), path)
+        if self.journal is not None and self.journal.path.parent == directory:
+            self.journal.reset()
 
     @staticmethod
     def load(name, path=None):
         """ Loads a tournament into memory. """
         return load_tournament(name, path=path)
 
+    def use_journal(self, path=None, fsync_every=1, snapshot_every=100):
+        """
+        Journal each change to the tournament rather than needing to save.
+
+        Changes are appended to {name}.journal in path, or the default path,
+        and the tournament is saved in full every snapshot_every changes.
+        See pynewood.journal.Journal for the parameters.
+        """
+        if self.journal is not None:
+            self.journal.close()
+        journal_path = Path(path or DEFAULT_SAVE_PATH) / f"{self.name}.journal"
+        self.journal = Journal(journal_path, fsync_every, snapshot_every)
+        self.save(journal_path.parent)
+
+    def _record(self, record: dict):
+        """ Append a record of a change to the journal, if there is one. """
+        journal = self.journal
+        if journal is None:
+            return
+        journal.append(record)
+        if journal.snapshot_due:
+            self.save(journal.path.parent)
+
+    def _replay(self, record: dict):
+        """ Apply a change from the journal to the tournament. """
+        raise NotImplementedError
+
+    def _metadata(self) -> dict:
+        """ return json serializable information about the tournament """
+        journal = None
+        if self.journal is not None:
+            journal = dict(
+                name=self.journal.path.name,
+                seq=self.journal.seq,
+                fsync_every=self.journal.fsync_every,
+                snapshot_every=self.journal.snapshot_every,
+            )
+        return dict(type=type(self).__name__, name=self.name, journal=journal)
+
+    def _to_columns(self):
+        """ return the metadata and arrays to save in the columnar format """
+        raise NotImplementedError
+
+    @classmethod
+    def _from_columns(cls, metadata: dict, arrays: dict):
+        """ Create a tournament from the columnar format. """
+        raise NotImplementedError
+
+    def _restore_journal(self, metadata: dict, directory: Path):
+        """ Re-create the journal described in the metadata. """
+        info = metadata.get("journal")
+        if info is not None:
+            path = Path(directory) / info["name"]
+            self.journal = Journal(path, info["fsync_every"], info["snapshot_every"])
+            self.journal.seq = info["seq"]
+
 
 class LimitedRound(Tournament):
     """ Class to run each participant a certain number of times """
@@ -52,8 +198,11 @@ class LimitedRound(Tournament):
     players_per_round = TournamentOption(type=int, valid_values=range(1, 10))
     number_of_plays = TournamentOption(type=int, valid_values=range(1, 100))
     rank_stat = TournamentOption(type=str, valid_values=AGGS)
+    schedule_strategy = TournamentOption(type=str, valid_values=SCHEDULE_STRATEGIES)
+    storage = TournamentOption(type=str, valid_values=STORAGE_ENGINES)
 
-    _shake_ups = 100  # max number of times to shuffle players to avoid
+    # tournaments saved before lane models were kept have none
+    _lane_model = None
 
     def __init__(
         self,
@@ -62,6 +211,9 @@ class LimitedRound(Tournament):
         players_at_once: int = 4,
         number_of_plays: int = 4,
         rank_stat="min",
+        schedule_strategy="constructive",
+        seed: Optional[int] = None,
+        storage: str = "frame",
     ):
         """
 
@@ -75,6 +227,19 @@ class LimitedRound(Tournament):
             The number of times each player should participate
         rank_stat
             The statistic to rank players
+        schedule_strategy
+            The strategy used to assign players to heats. "constructive"
+            builds a valid schedule directly, "random" shuffles players
+            until no one is scheduled against him/her self and
+            "lane_balanced" also runs each player in each lane as evenly
+            as possible and spreads out their opponents.
+        seed
+            If not None, seeds the scheduler so the same schedule is
+            created each time.
+        storage
+            How entries are stored. "frame" keeps a pandas DataFrame,
+            "array" keeps compact NumPy arrays and only creates a DataFrame
+            when df is accessed.
         """
         assert isinstance(players, Sequence) and not isinstance(players, str)
         assert len(set(players)) == len(players)
@@ -86,109 +251,630 @@ class LimitedRound(Tournament):
         self.number_of_plays = number_of_plays
         self.players = players
         self.rank_stat = rank_stat
+        self.schedule_strategy = schedule_strategy
+        self.seed = seed
+
+        self.storage = storage
+        # entries to keep track of round, heat, time. No player is ever
+        # scheduled to race his or her self; if that is impossible an
+        # InvalidTournamentError is raised.
+        player_order = make_schedule(
+            players, players_at_once, number_of_plays, schedule_strategy, seed
+        )
+        cls = STORAGE_CLASSES[storage]
+        self._entries = cls.from_schedule(player_order, players, players_at_once)
+        self._stale = True
+
+    def __setstate__(self, state):
+        if "_entries" not in state:
+            # pickled before entries were kept in a storage, when players were
+            # shuffled at random and df was a plain attribute
+            state.setdefault("_schedule_strategy", "random")
+            state.setdefault("seed", None)
+            state["_storage"] = "frame"
+            state["_entries"] = FrameStorage.from_frame(
+                state.pop("df"), state["players"]
+            )
+        state["_stale"] = True
+        super().__setstate__(state)
 
-        # dataframe to keep track of round, heat, time
-        self.df = self._create_df(players, players_at_once, number_of_plays)
-
-        # Because each player participates more than once it is possible that,
-        # on an overlap round, that player is assigned to race his or her self.
-        # This is uniquely to happen, so just recreate the instance until it
-        # does not.
-        unique = self.get_next_matchups(100)
-        while any([len(x) != len(set(x)) for x in unique]):
-            if self._shake_ups < 1:
-                msg = (
-                    f"After {self._shake_ups} tries A tournament configuration"
-                    f"which does not require a player to play against him/her"
-                    f"self could not be found."
-                )
-                raise InvalidTournamentError(msg)
-            self.df = self._create_df(players, players_at_once, number_of_plays)
-            self._shake_ups -= 1
-            unique = self.get_next_matchups(100)
+    @property
+    def df(self) -> pd.DataFrame:
+        """
+        The dataframe of player, round, heat and time for each entry.
 
-    def _create_df(self, players, players_at_once, number_of_plays) -> pd.DataFrame:
+        With the default "frame" storage the dataframe may be edited in
+        place; the indices used to track the tournament state are rebuilt
+        from it on the next call that needs them. With "array" storage a new
+        dataframe is created on each access.
         """
-        Create the dataframe which keeps track of the tournaments
+        if self._entries.live_frame:
+            self._stale = True
+        return self._entries.frame()
+
+    @df.setter
+    def df(self, df: pd.DataFrame):
+        self._entries = FrameStorage.from_frame(df, self.players)
+        self.storage = "frame"
+        self._stale = True
+
+    @property
+    def version(self) -> int:
+        self._sync()
+        return self._version
+
+    def _sync(self):
+        """ Rebuild the state indices if the dataframe may have been edited. """
+        if self._stale:
+            self._build_index()
+            self._stale = False
+
+    def _build_index(self):
         """
-        # get randomized play sequence and flatten
-        nested_player_order = [
-            random.sample(players, len(players)) for _ in range(number_of_plays)
-        ]
-        player_list = tuple(itertools.chain.from_iterable(nested_player_order))
+        Build the indices which track the state of each heat.
+
+        Rows are ordered by heat, so the rows of heat h are
+        _heat_bounds[h]:_heat_bounds[h + 1], and _heat_remaining counts the
+        un-entered times in each heat. _next_heat points to the first heat
+        with any un-entered times, _last_heat to the last heat with any
+        entered times (-1 if none) and _completed_heats counts the heats
+        with all times entered.
 
-        cols = ["player", "round", "heat", "time"]
-        dtypes = {"time": float, "round": int, "heat": int}
-        df = pd.DataFrame(index=np.arange(len(player_list)), columns=cols)
-        df.loc[:, "player"] = player_list
-        df.loc[:, "round"] = np.arange(len(df)) // len(players)
-        df.loc[:, "heat"] = np.arange(len(df)) // players_at_once
-        df: pd.DataFrame = df.astype(dtype=dtypes)
-        return df
+        The rows of player code p, ordered by round, are
+        _player_rows_sorted[_player_starts[p]:_player_starts[p + 1]] and
+        _player_cursor[p] is the first of those rounds without a time.
+
+        _standings keeps running statistics of each player's times.
+        """
+        storage = self._entries
+        heats = storage.heats
+        total_heats = int(heats[-1]) + 1 if len(heats) else 0
+        self._player_codes = {name: num for num, name in enumerate(storage.names)}
+        self._heat_bounds = np.searchsorted(heats, np.arange(total_heats + 1))
+        times = storage.get_times()
+        missing = np.isnan(times)
+        self._heat_remaining = np.bincount(heats[missing], minlength=total_heats)
+        self._heat_sizes = np.diff(self._heat_bounds)
+        self._next_heat = 0
+        self._advance_next_heat()
+        self._completed_heats = int((self._heat_remaining == 0).sum())
+        started = np.flatnonzero(self._heat_remaining < self._heat_sizes)
+        self._last_heat = int(started[-1]) if len(started) else -1
+        # per player row index and next un-entered cursor
+        codes = storage.codes
+        order = np.argsort(codes, kind="stable")
+        starts = np.searchsorted(codes[order], np.arange(len(storage.names) + 1))
+        counts = np.diff(starts)
+        first_missing = np.where(missing[order], np.arange(len(order)), len(order))
+        cursor = np.full(len(counts), len(order))
+        has_rows = counts > 0
+        cursor[has_rows] = np.minimum.reduceat(first_missing, starts[:-1][has_rows])
+        self._player_rows_sorted = order
+        self._player_starts = starts
+        self._player_cursor = np.minimum(cursor - starts[:-1], counts)
+        # running statistics of each player's times
+        self._standings = Standings.from_times(
+            storage.names, codes, times, self.rank_stat
+        )
+        # the lane model is fitted when adjusted ratings are first asked for
+        self._lane_model = None
+        # the entries may have been edited in the dataframe
+        self._touch()
+
+    def _advance_next_heat(self):
+        """ Move the next heat pointer past completed heats. """
+        remaining = self._heat_remaining
+        while self._next_heat < len(remaining) and not remaining[self._next_heat]:
+            self._next_heat += 1
+
+    def _set_rows(self, rows, times, op="set", record=True, log=True, timestamp=None):
+        """
+        Set the times of the given row positions, NaN clears a time.
+
+        All changes to entered times should go through this method so the
+        state indices stay current and the change is journaled and added to
+        the operation log. op names the operation in the journal and log. If
+        log is False the change is kept in the history but not pushed on the
+        undo stack, as when undoing or redoing. timestamp is when the change
+        was made, defaulting to now; replayed changes keep their own.
+        """
+        self._sync()
+        storage = self._entries
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        times = np.broadcast_to(np.asarray(times, dtype=float), rows.shape)
+        old = storage.get_times(rows)
+        new = storage.set_times(rows, times)
+        self._standings.update(storage.codes[rows], old, new)
+        if self._lane_model is not None:
+            self._lane_model.update(
+                storage.codes[rows], storage.lanes[rows], storage.heats[rows], old, new
+            )
+        # +1 for each time cleared, -1 for each time entered
+        change = np.isnan(times).astype(np.int64) - np.isnan(old)
+        heats = storage.heats[rows]
+        self._update_heats(heats, change)
+        changed = change != 0
+        self._update_player_cursors(rows[changed], change[changed] > 0)
+        self._touch()
+        operation = Operation(
+            op, rows, np.array(old, dtype=float), np.array(new), timestamp
+        )
+        self._log.history.append(operation)
+        if log:
+            self._log.push(operation)
+        if record:
+            new_times = [None if np.isnan(x) else float(x) for x in new]
+            self._record(
+                dict(
+                    op=op,
+                    rows=rows.tolist(),
+                    times=new_times,
+                    timestamp=operation.timestamp,
+                )
+            )
+
+    def _replay(self, record: dict):
+        times = [np.nan if x is None else x for x in record["times"]]
+        rows, op = np.asarray(record["rows"], dtype=np.int64), record["op"]
+        # journals written before timestamps were recorded get the replay time
+        timestamp = record.get("timestamp")
+        if op in ("undo", "redo"):
+            # move the operation between the undo and redo stacks, as when it
+            # was applied, if it is still on top
+            log = self._log
+            source, dest = (
+                (log.done, log.undone) if op == "undo" else (log.undone, log.done)
+            )
+            if source and np.array_equal(source[-1].rows, rows):
+                dest.append(source.pop())
+            self._set_rows(
+                rows, times, op=op, record=False, log=False, timestamp=timestamp
+            )
+        else:
+            self._set_rows(rows, times, op=op, record=False, timestamp=timestamp)
+
+    def _update_heats(self, heats, change):
+        """ Update the heat counters and pointers for changed entries. """
+        remaining, sizes = self._heat_remaining, self._heat_sizes
+        affected = np.unique(heats)
+        was_complete = remaining[affected] == 0
+        np.add.at(remaining, heats, change)
+        is_complete = remaining[affected] == 0
+        self._completed_heats += int(is_complete.sum() - was_complete.sum())
+        # the first heat with un-entered times
+        reopened = affected[~is_complete]
+        if len(reopened):
+            self._next_heat = min(self._next_heat, int(reopened[0]))
+        self._advance_next_heat()
+        # the last heat with entered times
+        started = affected[remaining[affected] < sizes[affected]]
+        if len(started):
+            self._last_heat = max(self._last_heat, int(started[-1]))
+        last = self._last_heat
+        while last >= 0 and remaining[last] == sizes[last]:
+            last -= 1
+        self._last_heat = last
+
+    def _update_player_cursors(self, rows, cleared):
+        """ Keep the first un-entered round of each player current. """
+        storage = self._entries
+        starts, cursor = self._player_starts, self._player_cursor
+        sorted_rows = self._player_rows_sorted
+        for row, was_cleared in zip(rows, cleared):
+            code = storage.codes[row]
+            if was_cleared:
+                cursor[code] = min(cursor[code], storage.rounds[row])
+                continue
+            start, stop = starts[code], starts[code + 1]
+            while start + cursor[code] < stop and not np.isnan(
+                storage.get_times(sorted_rows[start + cursor[code]])
+            ):
+                cursor[code] += 1
+
+    def _player_code(self, player) -> int:
+        """ return the code of a player, raise ValueError if not found """
+        self._sync()
+        try:
+            return self._player_codes[player]
+        except KeyError:
+            msg = f"player {player} is not in tournament {self.name}"
+            raise ValueError(msg)
 
     def __getitem__(self, item):
         # TODO this is a bad idea, remove it in favor of explicit methods
+        df = self._entries.frame()
         if isinstance(item, int):
-            return self.df[self.df["round"] == item]
+            return df[df["round"] == item]
         elif isinstance(item, str):
-            return self.df[self.df["player"] == item]
+            return df[df["player"] == item]
 
+    @timed
     def undo(self, number_of_rounds=1):
-        """ Undo the last n rounds. """
+        """
+        Undo the last n changes.
+
+        Each call to set_time, set_times, import_times or undo_heat is one
+        change, and undoing it restores the times its rows had before. If
+        there are no logged changes to undo, as when times were edited in
+        the dataframe directly, the times of the last heat with any entered
+        times are cleared instead.
+        """
         assert number_of_rounds > 0 and isinstance(number_of_rounds, int)
-        # get the indices that are not null
-        not_null = self.df[~self.df["time"].isnull()].index
-        inds = not_null[-number_of_rounds * self.players_per_round :]
-        self.df.loc[inds, "time"] = np.NaN
+        log = self._log
+        for _ in range(number_of_rounds):
+            if log.done:
+                operation = log.done.pop()
+                self._set_rows(operation.rows, operation.old, op="undo", log=False)
+                log.undone.append(operation)
+                continue
+            heat = self.heat - 1
+            if heat < 0:
+                break
+            rows = np.arange(self._heat_bounds[heat], self._heat_bounds[heat + 1])
+            self._set_rows(rows, np.nan, op="undo", log=False)
+
+    @timed
+    def redo(self, number_of_rounds=1):
+        """ Redo the last n undone changes, until a new change is made. """
+        assert number_of_rounds > 0 and isinstance(number_of_rounds, int)
+        log = self._log
+        for _ in range(number_of_rounds):
+            if not log.undone:
+                break
+            operation = log.undone.pop()
+            self._set_rows(operation.rows, operation.new, op="redo", log=False)
+            log.done.append(operation)
+
+    @timed
+    def undo_heat(self, heat: int):
+        """
+        Clear the entered times of one heat.
+
+        This is a change like any other, so it can itself be undone.
+        """
+        self._sync()
+        if not 0 <= heat < self.total_heats:
+            raise ValueError(f"heat {heat} is not in tournament {self.name}")
+        rows = np.arange(self._heat_bounds[heat], self._heat_bounds[heat + 1])
+        self._set_rows(rows, np.nan, op="undo_heat")
+
+    @timed
+    def get_history(self) -> pd.DataFrame:
+        """
+        Return the audit trail of every change to the entered times.
 
+        There is one row for each entry changed, with the operation number,
+        the time the change was made, the kind of change, the player, round
+        and heat of the entry and its time before and after the change.
+        """
+        return self._log.to_frame(self._entries)
+
+    def get_recent_entries(self, last: int) -> List[tuple]:
+        """
+        Return the (timestamp, number of times entered) of the last changes
+        which entered times, oldest first.
+
+        Unlike get_history no dataframe is built, so this is cheap to call
+        after each heat.
+        """
+        out = []
+        for operation in reversed(self._log.history):
+            if len(out) >= last:
+                break
+            entered = np.isnan(operation.old) & ~np.isnan(operation.new)
+            if entered.any():
+                out.append((operation.timestamp, int(entered.sum())))
+        return out[::-1]
+
+    def get_columns(self) -> dict:
+        """
+        Return read-only arrays of the player code, round, heat and time of
+        each entry, in heat order. A player code indexes players.
+
+        The times are a snapshot. Unlike df this never marks the tournament
+        as edited, and with "array" storage never builds a dataframe.
+        """
+        self._sync()
+        storage = self._entries
+        columns = dict(
+            player=storage.codes.view(),
+            round=storage.rounds.view(),
+            heat=storage.heats.view(),
+            time=np.array(storage.get_times(), dtype=np.float64),
+        )
+        for values in columns.values():
+            values.flags.writeable = False
+        return columns
+
+    @property
+    def remaining_entries(self) -> int:
+        """ return the number of entries without a time. """
+        self._sync()
+        return int(self._heat_remaining.sum())
+
+    def _find_row(self, player, round=None, skip=()) -> int:
+        """
+        Return the row position of a player's round.
+
+        If round is None use the player's first round without a time which
+        is not in skip.
+        """
+        code = self._player_code(player)
+        start, stop = self._player_starts[code], self._player_starts[code + 1]
+        if round is None:  # use the first round with an un-entered time
+            round = self._player_cursor[code]
+            rows, storage = self._player_rows_sorted, self._entries
+            while start + round < stop and (
+                round in skip or not np.isnan(storage.get_times(rows[start + round]))
+            ):
+                round += 1
+            if round >= stop - start:
+                msg = f"player {player} has no un-entered times!"
+                raise ValueError(msg)
+        else:
+            round = _as_round(round)
+            if not 0 <= round < stop - start:
+                msg = f"player {player} has no round {round}"
+                raise ValueError(msg)
+        return self._player_rows_sorted[start + round]
+
+    @timed
     def set_time(self, player, score, round=None):
         """ set a players score for a given round """
-        df = self.df
-        if not round:  # try to guess round based on first with un-entered time
-            ndf = df[(self.df.player == player) & (df.time.isnull())]
-            if not len(ndf):
-                msg = f"player {player} has no un-entered times!"
+        self._set_rows(self._find_row(player, round), score)
+
+    @timed
+    def set_times(self, times, heat: Optional[int] = None):
+        """
+        Set many times at once.
+
+        All times are validated before any are set, so a bad entry leaves
+        the tournament unchanged.
+
+        Parameters
+        ----------
+        times
+            One of: a mapping of {player: time}, an iterable of
+            (player, round, time) records, such as a 2d array, where round
+            is a whole number or None, or, if
+            heat is given, a sequence of the times of each player in the
+            heat in the order returned by get_next_matchups. When the round
+            is not given the player's first round without a time is used.
+        heat
+            The heat the times are for.
+        """
+        self._sync()
+        if heat is not None:
+            if not 0 <= heat < len(self._heat_remaining):
+                raise ValueError(f"heat {heat} is not in tournament {self.name}")
+            start, stop = self._heat_bounds[heat], self._heat_bounds[heat + 1]
+            if len(times) != stop - start:
+                msg = f"heat {heat} has {stop - start} players, got {len(times)} times"
                 raise ValueError(msg)
-            round = ndf["round"].iloc[0]
-        # set values
-        entry = (df["player"] == player) & (df["round"] == round)
-        self.df.loc[entry, "time"] = score
+            rows = np.arange(start, stop)
+        else:
+            if isinstance(times, Mapping):
+                times = [(player, None, time) for player, time in times.items()]
+            times = list(times)
+            rows, claimed = [], {}
+            for player, round, _ in times:
+                skip = claimed.setdefault(player, set())
+                row = self._find_row(player, round, skip=skip)
+                skip.add(int(self._entries.rounds[row]))
+                rows.append(row)
+            times = [time for _, _, time in times]
+            if len(set(rows)) != len(rows):
+                raise ValueError("a player's round was given more than one time")
+        values = np.asarray(times, dtype=float)
+        if not (np.isfinite(values) & (values >= 0)).all():
+            raise ValueError("times must be numbers greater than or equal to 0")
+        self._set_rows(rows, values)
+
+    @timed
+    def import_times(self, source):
+        """
+        Set the times recorded in a log, such as the csv written by save.
 
+        Parameters
+        ----------
+        source
+            A path to a csv file, or a DataFrame, with player and time columns
+            and optionally a round column. Rows without a time are skipped
+            and rows without a round use the player's next un-entered round.
+        """
+        df = source if isinstance(source, pd.DataFrame) else pd.read_csv(source)
+        df = df[df["time"].notnull()]
+        rounds = df["round"] if "round" in df.columns else [None] * len(df)
+        records = [
+            (player, None if pd.isnull(round) else int(round), time)
+            for player, round, time in zip(df["player"], rounds, df["time"])
+        ]
+        self.set_times(records)
+
+    @timed
+    def get_heat(self, heat: int) -> List[tuple]:
+        """
+        Return the (player, time) of each player in a heat, in the order of
+        its matchup, with NaN for times not entered.
+        """
+        self._sync()
+        if not 0 <= heat < len(self._heat_remaining):
+            raise ValueError(f"heat {heat} is not in tournament {self.name}")
+        start, stop = self._heat_bounds[heat], self._heat_bounds[heat + 1]
+        players = self._entries.players(start, stop)
+        times = self._entries.get_times(np.arange(start, stop))
+        return [(x, float(y)) for x, y in zip(players, times)]
+
+    def get_next_heats(self, next_n: int) -> List[int]:
+        """ get the numbers of the next n heats with un-entered times """
+        self._sync()
+        heats = []
+        heat, remaining = self._next_heat, self._heat_remaining
+        while heat < len(remaining) and len(heats) < next_n:
+            if remaining[heat]:
+                heats.append(heat)
+            heat += 1
+        return heats
+
+    @timed
     def get_next_matchups(self, next_n: int) -> List[List[str]]:
         """ get the next n match-ups"""
-        # get a dataframe with any heats missing times
-        group = self.df.groupby("heat")
-        df = group.filter(missing_time)
-        return list(df.groupby("heat").apply(player_list)[:next_n])
-
-    def get_ratings(self):
-        """ Return a table of current ranks for each player """
-        # filter df to only include rows with times defined
-        valid = self.df[~self.df["time"].isnull()]
-        df = valid.groupby("player")["time"].agg(AGGS)
-        df.sort_values(self.rank_stat, inplace=True)
-        df.insert(0, column="rank", value=range(1, len(df) + 1))
-        return df.rename(columns={"size": "races"})
+        heats = self.get_next_heats(next_n)
+        bounds = self._heat_bounds
+        return [self._entries.players(bounds[x], bounds[x + 1]) for x in heats]
+
+    def get_lane_counts(self) -> pd.DataFrame:
+        """
+        Return the number of times each player is scheduled in each lane,
+        with a row for each player and a column for each lane.
+        """
+        storage = self._entries
+        size, lanes = len(storage.names), self.players_per_round
+        flat = storage.codes.astype(np.int64) * lanes + storage.lanes
+        counts = np.bincount(flat, minlength=size * lanes).reshape(size, lanes)
+        index = pd.Index(storage.names, dtype=object, name="player")
+        return pd.DataFrame(counts, index, pd.RangeIndex(lanes, name="lane"))
+
+    def _get_lane_model(self) -> LaneModel:
+        """ return the lane model, fitting it to the entries if needed """
+        self._sync()
+        if self._lane_model is None:
+            storage = self._entries
+            self._lane_model = LaneModel.from_times(
+                storage.names,
+                self.players_per_round,
+                self.total_heats,
+                storage.codes,
+                storage.lanes,
+                storage.heats,
+                storage.get_times(),
+            )
+        return self._lane_model
+
+    @timed
+    def get_lane_effects(self, trend: bool = False) -> pd.Series:
+        """
+        Return how much slower each lane is than the average lane, fitted
+        from the times entered so far.
+
+        Parameters
+        ----------
+        trend
+            If True also fit a steady change in times over the event.
+        """
+        return self._get_lane_model().lane_effects(trend)
+
+    @timed
+    def get_ratings(self, adjusted: bool = False, trend: bool = False):
+        """
+        Return a table of current ranks for each player
+
+        Parameters
+        ----------
+        adjusted
+            If True rank on times adjusted for the lanes each player ran
+            in, see pynewood.adjust.LaneModel. The table then also has each
+            player's fitted effect.
+        trend
+            If True the adjusted times also remove a steady change in times
+            over the event, as when a track speeds up.
+        """
+        if adjusted:
+            storage = self._entries
+            return self._get_lane_model().table(
+                storage.codes,
+                storage.lanes,
+                storage.heats,
+                storage.get_times(),
+                self.rank_stat,
+                trend,
+            )
+        self._sync()
+        if self._standings.rank_stat != self.rank_stat:
+            self._standings.set_rank_stat(self.rank_stat)
+        return self._standings.table()
 
     @property
     def heat(self):
         """ return the current heat number """
-        not_null = self.df[~self.df["time"].isnull()]
-        if not len(not_null):
-            return 0
-        elif len(not_null) == len(self.df):
-            return self.df.heat.max() + 1
-        else:
-            return not_null["heat"].max() + 1
+        self._sync()
+        return self._last_heat + 1
 
     @property
     def total_heats(self):
         """ return the total number of heats. """
-        return self.df.heat.max() + 1
+        self._sync()
+        return len(self._heat_remaining)
 
-    def save(self, path=None):
-        super().save(path)
-        self.df.to_csv("backup.csv")
+    @property
+    def completed_heats(self):
+        """ return the number of heats with all times entered. """
+        self._sync()
+        return self._completed_heats
+
+    @timed
+    def save(self, path=None, format=None):
+        super().save(path, format=format)
+        self._entries.frame().to_csv("backup.csv")
+
+    def _metadata(self):
+        metadata = super()._metadata()
+        metadata["options"] = dict(
+            players_per_round=self.players_per_round,
+            number_of_plays=self.number_of_plays,
+            rank_stat=self.rank_stat,
+            schedule_strategy=self.schedule_strategy,
+            seed=self.seed,
+            storage=self.storage,
+        )
+        entered = int((~np.isnan(self._entries.get_times())).sum())
+        metadata["progress"] = dict(
+            entries=len(self._entries),
+            entered=entered,
+            heat=self.heat,
+            total_heats=self.total_heats,
+        )
+        return metadata
+
+    def _to_columns(self):
+        storage = self._entries
+        # numpy would silently turn other player ids into str
+        if not all(isinstance(x, str) for x in storage.names):
+            msg = "only str player ids can be saved in the columnar format, use pickle"
+            raise TypeError(msg)
+        arrays = dict(
+            players=np.array(storage.names),
+            codes=storage.codes,
+            rounds=storage.rounds,
+            heats=storage.heats,
+            times=storage.get_times().astype(storage.time_dtype),
+            # the history, for get_history and undo, as log_* arrays
+            **self._log.to_arrays(),
+        )
+        return self._metadata(), arrays
+
+    @classmethod
+    def _from_columns(cls, metadata, arrays):
+        options = metadata["options"]
+        out = cls.__new__(cls)
+        Tournament.__init__(out, metadata["name"])
+        out.players_per_round = options["players_per_round"]
+        out.number_of_plays = options["number_of_plays"]
+        out.players = arrays["players"].tolist()
+        out.rank_stat = options["rank_stat"]
+        out.schedule_strategy = options["schedule_strategy"]
+        out.seed = options["seed"]
+        out.storage = options["storage"]
+        out._entries = STORAGE_CLASSES[out.storage](
+            out.players,
+            arrays["codes"],
+            arrays["rounds"],
+            arrays["heats"],
+            np.array(arrays["times"]),  # times must be writable
+        )
+        out._log = OperationLog.from_arrays(arrays)
+        out._stale = True
+        return out
 
 
 def get_tournament_types():
@@ -0,0 +1,193 @@
+"""
+Running one tournament on several tracks at once.
+
+A HeatDispatcher hands the next heat which can run to whichever track is
+free. Heats are normally run in order, but a heat is skipped, for now, if
+it is already running or one of its players is racing on another track.
+Results may come back in any order.
+"""
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+
+class Assignment:
+    """ A heat running on a track. """
+
+    __slots__ = ("track", "heat", "players", "started")
+
+    def __init__(self, track, heat: int, players: List[Hashable], started: float):
+        self.track = track
+        self.heat = heat
+        self.players = players
+        self.started = started
+
+    def __repr__(self):
+        attrs = ("track", "heat", "players")
+        values = ", ".join(f"{x}={getattr(self, x)!r}" for x in attrs)
+        return f"Assignment({values})"
+
+
+class HeatDispatcher:
+    """
+    Hands out the heats of a LimitedRound to several tracks.
+
+    The dispatcher reads which heats still need times from the tournament
+    on each call, so times entered, or undone, elsewhere are respected. It
+    isn't thread safe; hold the tournament's lock while using it.
+
+    Parameters
+    ----------
+    tournament
+        The LimitedRound to run.
+    tracks
+        The number of tracks, or a sequence of track names.
+    lookahead
+        How many unfinished heats past the first may be run, so players
+        don't get too far ahead of the schedule.
+    clock
+        A function returning the time in seconds, used to measure how busy
+        each track is.
+    """
+
+    def __init__(
+        self,
+        tournament,
+        tracks: Union[int, Sequence[Hashable]] = 2,
+        lookahead: int = 20,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.tournament = tournament
+        self.tracks = list(range(tracks)) if isinstance(tracks, int) else list(tracks)
+        assert self.tracks and len(set(self.tracks)) == len(self.tracks)
+        self.lookahead = lookahead
+        self.clock = clock
+        self.started = clock()
+        self._running: Dict[Hashable, Assignment] = {}  # {track: assignment}
+        self._heats: Dict[int, Assignment] = {}  # {heat: assignment}
+        self._racing = set()  # players in running heats
+        self._busy = {x: 0.0 for x in self.tracks}  # seconds spent racing
+        self._completed = {x: 0 for x in self.tracks}  # heats finished
+
+    @property
+    def free_tracks(self) -> list:
+        """ the tracks without a running heat """
+        return [x for x in self.tracks if x not in self._running]
+
+    @property
+    def running(self) -> Dict[int, Assignment]:
+        """ the running heats, {heat: assignment} """
+        return dict(self._heats)
+
+    def _next_runnable(self) -> Optional[Tuple[int, List[Hashable]]]:
+        """ return the first heat which can run now and its players, or None """
+        tour = self.tournament
+        for heat in tour.get_next_heats(self.lookahead + 1):
+            if heat in self._heats:
+                continue
+            players = [x for x, _ in tour.get_heat(heat)]
+            if self._racing.isdisjoint(players):
+                return heat, players
+        return None
+
+    def dispatch(self, track=None) -> Optional[Assignment]:
+        """
+        Start the next heat which can run on a track.
+
+        Returns None if no heat can run until a running one finishes.
+
+        Parameters
+        ----------
+        track
+            The track to run on, defaults to the first free track.
+        """
+        if track is None:
+            free = self.free_tracks
+            if not free:
+                return None
+            track = free[0]
+        elif track not in self._busy:
+            raise ValueError(f"{track} is not a track")
+        elif track in self._running:
+            msg = f"track {track} is running heat {self._running[track].heat}"
+            raise ValueError(msg)
+        runnable = self._next_runnable()
+        if runnable is None:
+            return None
+        heat, players = runnable
+        assignment = Assignment(track, heat, players, self.clock())
+        self._running[track] = self._heats[heat] = assignment
+        self._racing.update(players)
+        return assignment
+
+    def dispatch_all(self) -> List[Assignment]:
+        """ Start a heat on every free track that one can run on. """
+        out = []
+        for track in self.free_tracks:
+            assignment = self.dispatch(track)
+            if assignment is None:
+                break
+            out.append(assignment)
+        return out
+
+    def _release(self, heat: int) -> Assignment:
+        """ Stop tracking a running heat and return its assignment. """
+        if heat not in self._heats:
+            raise ValueError(f"heat {heat} is not running")
+        assignment = self._heats.pop(heat)
+        del self._running[assignment.track]
+        self._racing.difference_update(assignment.players)
+        return assignment
+
+    def complete(self, heat: int, times: Sequence[float]) -> Assignment:
+        """
+        Enter the times of a running heat and free its track.
+
+        Parameters
+        ----------
+        heat
+            The heat number.
+        times
+            The time of each player, in the order of the assignment.
+        """
+        if heat not in self._heats:
+            raise ValueError(f"heat {heat} is not running")
+        # times are validated before the heat is released
+        self.tournament.set_times(times, heat=heat)
+        assignment = self._release(heat)
+        self._busy[assignment.track] += self.clock() - assignment.started
+        self._completed[assignment.track] += 1
+        return assignment
+
+    def cancel(self, heat: int) -> Assignment:
+        """ Stop a running heat without times, so it is run again later. """
+        assignment = self._release(heat)
+        self._busy[assignment.track] += self.clock() - assignment.started
+        return assignment
+
+    def utilization(self) -> pd.DataFrame:
+        """
+        Return a table of each track's completed heats, seconds spent
+        racing, the fraction of the time since the dispatcher started that
+        was spent racing and the heats completed per hour.
+        """
+        now = self.clock()
+        elapsed = max(now - self.started, 1e-9)
+        busy = {
+            track: seconds
+            + (now - self._running[track].started if track in self._running else 0.0)
+            for track, seconds in self._busy.items()
+        }
+        completed = pd.Series(self._completed, dtype=int)
+        busy = pd.Series(busy, dtype=float)
+        out = pd.DataFrame(
+            dict(
+                heats=completed,
+                busy_seconds=busy,
+                utilization=busy / elapsed,
+                heats_per_hour=completed * 3600 / elapsed,
+            )
+        )
+        out.index.name = "track"
+        return out
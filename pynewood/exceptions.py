@@ -5,3 +5,7 @@ Custom exceptions for pynewood.
 
 class InvalidTournamentError(ValueError):
     """ Raised when a tournament is not valid """
+
+
+class TimerProtocolError(ValueError):
+    """ Raised when a line from a race timer can't be understood """
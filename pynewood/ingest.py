@@ -0,0 +1,329 @@
+"""
+Streaming times from a race timer straight into a tournament.
+
+A timer sends one line per heat, with the time of each lane:
+
+    [#<id>] <lane>=<time> [<lane>=<time> ...]
+
+Lanes are numbered from 1, or lettered from A, as on the track. The
+optional id numbers the result; a result whose id was already received is
+a duplicate, as is a line without an id repeated within a couple of seconds.
+Each result is entered for the next heat still needing times, the lanes in
+the order get_next_matchups lists the heat's players.
+
+A TimerIngestor reads lines from any asyncio stream, a TCP connection or a
+serial port adapter, and queues the results. A single task commits the
+queued results in batches, so the tournament is locked once per batch. When
+the queue is full reading stops until it drains, which holds back the timer
+rather than dropping times. To feed a tournament run by the web app::
+
+    ingestor = TimerIngestor(
+        write=lambda: STORE.write(name), on_commit=lambda _: CHANGES.notify()
+    )
+    server = await ingestor.serve("0.0.0.0", 5005)
+    await ingestor.run()
+"""
+import asyncio
+import random
+import re
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from pynewood.exceptions import TimerProtocolError
+
+# a result id, after the #, and a lane=time pair
+_ID_PATTERN = re.compile(r"#(\w+)$")
+_LANE_PATTERN = re.compile(r"([A-Za-z]|\d+)=(\d+(?:\.\d*)?|\.\d+)$")
+
+
+class TimerResult:
+    """ The lane times of one heat read from a timer. """
+
+    __slots__ = ("times", "result_id", "line")
+
+    def __init__(self, times: Dict[int, float], result_id=None, line=""):
+        self.times = times  # {lane, from 0: time}
+        self.result_id = result_id
+        self.line = line
+
+    def __repr__(self):
+        return f"TimerResult(times={self.times!r}, result_id={self.result_id!r})"
+
+
+def parse_line(line: str) -> TimerResult:
+    """ Parse a line from a timer, raise TimerProtocolError if invalid. """
+    line = line.strip()
+    tokens = line.split()
+    result_id = None
+    if tokens and tokens[0].startswith("#"):
+        match = _ID_PATTERN.match(tokens.pop(0))
+        if match is None:
+            raise TimerProtocolError(f"invalid result id in {line!r}")
+        result_id = match.group(1)
+    if not tokens:
+        raise TimerProtocolError(f"no lane times in {line!r}")
+    times = {}
+    for token in tokens:
+        match = _LANE_PATTERN.match(token)
+        if match is None:
+            raise TimerProtocolError(f"invalid lane time {token!r}")
+        lane, value = match.groups()
+        lane = int(lane) - 1 if lane.isdigit() else ord(lane.upper()) - ord("A")
+        if lane < 0 or lane in times:
+            raise TimerProtocolError(f"invalid or repeated lane in {line!r}")
+        times[lane] = float(value)
+    return TimerResult(times, result_id, line)
+
+
+class TimerIngestor:
+    """
+    Reads timer results from streams and enters them in a tournament.
+
+    Parameters
+    ----------
+    tournament
+        The LimitedRound to enter times in, if write is not given.
+    write
+        A function returning a context manager which locks the tournament
+        and yields it, such as TournamentStore.write.
+    batch_size
+        The most results committed at once.
+    queue_size
+        The most results waiting to be committed before reading stops.
+    dedup_size
+        How many result ids, and lines without ids, to remember.
+    dedup_window
+        The seconds within which a repeated line without an id is a
+        duplicate.
+    on_commit
+        Called with the number of results entered after each batch, for
+        example to wake displays.
+    clock
+        A function returning the time in seconds.
+    """
+
+    def __init__(
+        self,
+        tournament=None,
+        write: Optional[Callable] = None,
+        batch_size: int = 32,
+        queue_size: int = 256,
+        dedup_size: int = 1024,
+        dedup_window: float = 2.0,
+        on_commit: Optional[Callable[[int], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        assert (tournament is None) != (write is None)
+        self.write = write or (lambda: self._hold(tournament))
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.dedup_size = dedup_size
+        self.dedup_window = dedup_window
+        self.on_commit = on_commit
+        self.clock = clock
+        self.received = 0  # lines read
+        self.duplicates = 0  # results dropped as duplicates
+        self.rejected = 0  # lines or results which could not be entered
+        self.committed = 0  # results entered
+        self.batches = 0  # batches committed
+        self.errors: List[str] = []  # messages of recent rejections
+        self._queue = None
+        self._seen = OrderedDict()  # {result id or line: time received}
+
+    @staticmethod
+    @contextmanager
+    def _hold(tournament):
+        yield tournament
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        """ the queue of results waiting to be committed """
+        # made on first use so it belongs to the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.queue_size)
+        return self._queue
+
+    def stats(self) -> dict:
+        """ return the counts of lines received and results committed """
+        return dict(
+            received=self.received,
+            duplicates=self.duplicates,
+            rejected=self.rejected,
+            committed=self.committed,
+            batches=self.batches,
+            queued=self.queue.qsize(),
+        )
+
+    def _reject(self, message: str):
+        self.rejected += 1
+        self.errors = (self.errors + [message])[-100:]
+
+    def _is_duplicate(self, result: TimerResult) -> bool:
+        """ return True if the result was already received, and remember it """
+        now = self.clock()
+        if result.result_id is not None:
+            key, window = ("id", result.result_id), float("inf")
+        else:
+            key, window = ("line", result.line), self.dedup_window
+        last = self._seen.pop(key, None)
+        self._seen[key] = now
+        while len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+        return last is not None and now - last <= window
+
+    async def submit(self, line: str) -> str:
+        """
+        Queue the result on a line, waiting while the queue is full.
+
+        Returns "queued", or "duplicate" if the result was already received.
+        Raises TimerProtocolError if the line is invalid.
+        """
+        self.received += 1
+        try:
+            result = parse_line(line)
+        except TimerProtocolError as e:
+            self._reject(str(e))
+            raise
+        if self._is_duplicate(result):
+            self.duplicates += 1
+            return "duplicate"
+        await self.queue.put(result)
+        return "queued"
+
+    async def handle(self, reader: asyncio.StreamReader, writer=None):
+        """
+        Read lines from a stream until it ends, acknowledging each line with
+        "queued", "duplicate" or "error: <reason>" if there is a writer.
+        """
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                line = raw.decode("ascii", errors="replace").strip()
+                if not line:
+                    continue
+                try:
+                    reply = await self.submit(line)
+                except TimerProtocolError as e:
+                    reply = f"error: {e}"
+                if writer is not None:
+                    writer.write(f"{reply}\n".encode())
+                    await writer.drain()
+        finally:
+            if writer is not None:
+                writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 5005):
+        """ Start a TCP server which reads timer lines, return the server. """
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def run(self):
+        """ Commit queued results as they arrive, until cancelled. """
+        queue = self.queue
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                # locking may block, so commit off the event loop
+                await loop.run_in_executor(None, self._commit, batch)
+            except Exception as e:  # keep reading, the timer can't retry
+                self._reject(f"could not commit {len(batch)} results: {e!r}")
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def join(self):
+        """ Wait until every queued result is committed. """
+        await self.queue.join()
+
+    def _commit(self, batch: List[TimerResult]):
+        """ Enter each result for the next heat which needs times. """
+        entered = 0
+        with self.write() as tour:
+            for result in batch:
+                heats = tour.get_next_heats(1)
+                if not heats:
+                    self._reject(f"no heat left for {result.line!r}")
+                    continue
+                heat = heats[0]
+                size = len(tour.get_heat(heat))
+                missing = [x + 1 for x in range(size) if x not in result.times]
+                if missing:
+                    self._reject(f"heat {heat} has no time for lanes {missing}")
+                    continue
+                try:
+                    tour.set_times([result.times[x] for x in range(size)], heat=heat)
+                except ValueError as e:
+                    self._reject(str(e))
+                    continue
+                entered += 1
+        self.committed += entered
+        self.batches += 1
+        if entered and self.on_commit is not None:
+            self.on_commit(entered)
+
+
+class FakeTimer:
+    """
+    A stand in for a race timer, which makes lines of random lane times.
+
+    Parameters
+    ----------
+    lanes
+        The number of lanes.
+    mean
+        The mean time.
+    spread
+        The standard deviation of times.
+    repeat
+        The chance each line is sent twice, as a flaky connection might.
+    seed
+        Seeds the random times.
+    """
+
+    def __init__(self, lanes=4, mean=3.0, spread=0.2, repeat=0.0, seed=None):
+        self.lanes = lanes
+        self.mean = mean
+        self.spread = spread
+        self.repeat = repeat
+        self.random = random.Random(seed)
+
+    def line(self, result_id) -> str:
+        """ return the line of one result """
+        times = (
+            max(self.random.gauss(self.mean, self.spread), 0.001)
+            for _ in range(self.lanes)
+        )
+        lanes = " ".join(f"{num + 1}={x:.4f}" for num, x in enumerate(times))
+        return f"#{result_id} {lanes}"
+
+    def lines(self, count: int, start: int = 0):
+        """ yield the lines of count results, some repeated """
+        for result_id in range(start, start + count):
+            line = self.line(result_id)
+            yield line
+            if self.random.random() < self.repeat:
+                yield line
+
+    async def send(self, host: str, port: int, count: int, interval: float = 0.0):
+        """
+        Send count results to a TCP server, waiting interval seconds between
+        them, and return the replies.
+        """
+        reader, writer = await asyncio.open_connection(host, port)
+        replies = []
+        try:
+            for line in self.lines(count):
+                writer.write(f"{line}\n".encode())
+                await writer.drain()
+                replies.append((await reader.readline()).decode().strip())
+                if interval:
+                    await asyncio.sleep(interval)
+        finally:
+            writer.close()
+        return replies
@@ -0,0 +1,125 @@
+"""
+An append-only journal of changes to a saved tournament.
+
+Rather than saving the whole tournament after every change, each change is
+appended to the journal as one line of json. The full tournament is saved
+(a snapshot) every so often, after which the journal starts over. Loading
+reads the snapshot and replays the journal records it does not contain.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Iterator, List
+
+
+class Journal:
+    """
+    A write-ahead journal stored in a json lines file.
+
+    Parameters
+    ----------
+    path
+        The path of the journal file.
+    fsync_every
+        Force the journal to disk after this many records. 1 syncs every
+        record, 0 leaves it to the operating system.
+    snapshot_every
+        The number of records after which the tournament should be saved
+        in full and the journal cleared. 0 never asks for a snapshot.
+    """
+
+    def __init__(self, path, fsync_every: int = 1, snapshot_every: int = 100):
+        self.path = Path(path)
+        self.fsync_every = fsync_every
+        self.snapshot_every = snapshot_every
+        self.seq = 0  # sequence number of the last record
+        self.pending = 0  # number of records since the last snapshot
+        self._unsynced = 0
+        self._file = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_file"] = None
+        state["_unsynced"] = 0
+        return state
+
+    def append(self, record: dict) -> int:
+        """ Append a record, return its sequence number. """
+        if self._file is None:
+            self._file = self.path.open("a")
+        self.seq += 1
+        line = json.dumps(dict(record, seq=self.seq), separators=(",", ":"))
+        self._file.write(line + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if self.fsync_every and self._unsynced >= self.fsync_every:
+            self.sync()
+        self.pending += 1
+        return self.seq
+
+    def sync(self):
+        """ Force written records to disk. """
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    @property
+    def snapshot_due(self) -> bool:
+        """ True if enough records have been written to take a snapshot """
+        return bool(self.snapshot_every) and self.pending >= self.snapshot_every
+
+    def read(self, after: int = 0) -> Iterator[dict]:
+        """
+        Yield records with sequence numbers greater than after.
+
+        A final line which was only partly written, as happens when the
+        process dies mid-write, is ignored.
+        """
+        if not self.path.exists():
+            return
+        with self.path.open() as fi:
+            for line in fi:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                if not line.endswith("\n"):
+                    break
+                if record["seq"] > after:
+                    yield record
+
+    def recover(self, after: int = 0) -> List[dict]:
+        """
+        Return records with sequence numbers greater than after and cut off
+        any partly written final record so new records can be appended.
+        """
+        if not self.path.exists():
+            return []
+        records, size = [], 0
+        with self.path.open("rb") as fi:
+            for line in fi:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                size += len(line)
+                if record["seq"] > after:
+                    records.append(record)
+        os.truncate(self.path, size)
+        return records
+
+    def reset(self):
+        """ Clear the journal after a snapshot has been saved. """
+        self.close()
+        with self.path.open("w") as fi:
+            os.fsync(fi.fileno())
+        self.pending = 0
+
+    def close(self):
+        """ Sync and close the journal file. """
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
@@ -0,0 +1,259 @@
+"""
+Counters and latency histograms of tournament operations.
+
+Metrics are off by default. While off, timed methods check a single flag
+before calling through and nothing is recorded. Turn them on with
+METRICS.enable(), or the PYNEWOOD_METRICS environment variable, then read
+them with METRICS.snapshot() or METRICS.to_prometheus().
+
+Operations are labeled with the number of players in the tournament,
+rounded up to a power of ten, so the cost of big events can be told apart.
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+# upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def size_label(size: int) -> str:
+    """ return size rounded up to a power of ten, as a label """
+    bound = 10
+    while bound < size:
+        bound *= 10
+    return str(bound)
+
+
+class Histogram:
+    """ Counts of observed values in LATENCY_BUCKETS, with their sum. """
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # the last is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, fraction: float) -> float:
+        """ return the upper bound of the bucket holding a quantile """
+        if not self.count:
+            return float("nan")
+        target, seen = fraction * self.count, 0
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """
+    A registry of counters and latency histograms.
+
+    Each metric has a name and is split by labels, a tuple of
+    (label, value) pairs.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # {name: {labels: value}}
+        self._counters: Dict[str, Dict[Tuple, float]] = {}
+        self._histograms: Dict[str, Dict[Tuple, Histogram]] = {}
+        self._help: Dict[str, str] = {}
+
+    def enable(self):
+        """ Start recording metrics. """
+        self.enabled = True
+
+    def disable(self):
+        """ Stop recording metrics, keeping those recorded. """
+        self.enabled = False
+
+    def reset(self):
+        """ Forget all recorded metrics. """
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def describe(self, name: str, text: str):
+        """ Set the help text of a metric. """
+        self._help[name] = text
+
+    # --- recording
+
+    def inc(self, name: str, labels: Tuple = (), value: float = 1):
+        """ Add to a counter. """
+        if not self.enabled:
+            return
+        with self._lock:
+            counters = self._counters.setdefault(name, {})
+            counters[labels] = counters.get(labels, 0) + value
+
+    def observe(self, name: str, seconds: float, labels: Tuple = ()):
+        """ Add a latency to a histogram. """
+        if not self.enabled:
+            return
+        with self._lock:
+            histograms = self._histograms.setdefault(name, {})
+            if labels not in histograms:
+                histograms[labels] = Histogram()
+            histograms[labels].observe(seconds)
+
+    @contextmanager
+    def _time(self, name, labels):
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc(f"{name}_errors_total", labels)
+            raise
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - start, labels)
+
+    def timer(self, name: str, **labels):
+        """
+        Return a context manager timing its body into the histogram
+        {name}_seconds and counting exceptions in {name}_errors_total.
+        """
+        if not self.enabled:
+            return _NOT_TIMED
+        return self._time(name, tuple(sorted(labels.items())))
+
+    # --- reading
+
+    def snapshot(self) -> dict:
+        """
+        Return the recorded metrics, {name: {labels: value}} for counters
+        and {name: {labels: dict(count, sum, p50, p95, p99)}} for histograms.
+        """
+        with self._lock:
+            out = {k: dict(v) for k, v in self._counters.items()}
+            for name, histograms in self._histograms.items():
+                out[name] = {
+                    labels: dict(
+                        count=x.count,
+                        sum=x.total,
+                        p50=x.quantile(0.5),
+                        p95=x.quantile(0.95),
+                        p99=x.quantile(0.99),
+                    )
+                    for labels, x in histograms.items()
+                }
+        return out
+
+    def to_prometheus(self, extra: Optional[Dict[str, float]] = None) -> str:
+        """
+        Return the metrics in the Prometheus text format.
+
+        Parameters
+        ----------
+        extra
+            Gauges to include, {name: value}.
+        """
+        lines = []
+
+        def header(name, kind):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            for name, counters in sorted(self._counters.items()):
+                header(name, "counter")
+                for labels, value in counters.items():
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            for name, histograms in sorted(self._histograms.items()):
+                header(name, "histogram")
+                for labels, hist in histograms.items():
+                    cumulative = 0
+                    bounds = [repr(x) for x in LATENCY_BUCKETS] + ["+Inf"]
+                    for bound, count in zip(bounds, hist.counts):
+                        cumulative += count
+                        bucket_labels = _format_labels(labels + (("le", bound),))
+                        lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {hist.total}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {hist.count}")
+        for name, value in sorted((extra or {}).items()):
+            header(name, "gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    """ return a label value with backslashes and quotes escaped """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _format_labels(labels: Tuple) -> str:
+    """ return labels formatted as {name="value",...} """
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class _NotTimed:
+    """ A reusable context manager which does nothing. """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NOT_TIMED = _NotTimed()
+
+METRICS = Metrics(enabled=bool(os.environ.get("PYNEWOOD_METRICS")))
+METRICS.describe(
+    "pynewood_operation_seconds", "Latency of tournament operations in seconds."
+)
+METRICS.describe(
+    "pynewood_operation_errors_total", "Tournament operations which raised."
+)
+
+
+def timed(func):
+    """
+    Time a tournament method into pynewood_operation_seconds, labeled with
+    the method name and the tournament's size.
+    """
+    operation = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if not METRICS.enabled:
+            return func(self, *args, **kwargs)
+        players = getattr(self, "players", ())
+        labels = (("operation", operation), ("size", size_label(len(players))))
+        with METRICS._time("pynewood_operation", labels):
+            return func(self, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,140 @@
+"""
+A log of the changes made to a tournament's times.
+
+Each change records the rows it touched with their times before and after,
+so it can be undone or redone exactly, and the full history doubles as an
+audit trail.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+
+class Operation:
+    """
+    One change to the times of a tournament.
+
+    Parameters
+    ----------
+    op
+        The name of the operation, eg "set" or "undo".
+    rows
+        The row positions changed.
+    old
+        The times of the rows before the change, NaN if not entered.
+    new
+        The times of the rows after the change, NaN if not entered.
+    """
+
+    __slots__ = ("op", "rows", "old", "new", "timestamp")
+
+    def __init__(self, op, rows, old, new, timestamp=None):
+        self.op = op
+        self.rows = rows
+        self.old = old
+        self.new = new
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def __getstate__(self):
+        return {x: getattr(self, x) for x in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return f"Operation(op={self.op!r}, rows={self.rows.tolist()})"
+
+
+class OperationLog:
+    """
+    Stacks of operations which can be undone and redone, plus the history
+    of every operation applied.
+    """
+
+    def __init__(self):
+        self.done = []
+        self.undone = []
+        self.history = []
+
+    def push(self, operation: Operation):
+        """ Add a new operation, which can no longer be followed by a redo. """
+        self.done.append(operation)
+        self.undone.clear()
+
+    def to_frame(self, storage) -> pd.DataFrame:
+        """
+        Return the history with one row for each entry changed.
+
+        Parameters
+        ----------
+        storage
+            The storage of the tournament, used to look up the player, round
+            and heat of each row.
+        """
+        columns = ["timestamp", "op", "player", "round", "heat", "old", "new"]
+        if not self.history:
+            return pd.DataFrame(columns=["operation"] + columns)
+        sizes = [len(x.rows) for x in self.history]
+        rows = np.concatenate([x.rows for x in self.history])
+        data = dict(
+            operation=np.repeat(np.arange(len(self.history)), sizes),
+            timestamp=pd.to_datetime(
+                np.repeat([x.timestamp for x in self.history], sizes), unit="s"
+            ),
+            op=np.repeat([x.op for x in self.history], sizes),
+            player=[storage.names[x] for x in storage.codes[rows]],
+            round=storage.rounds[rows],
+            heat=storage.heats[rows],
+            old=np.concatenate([x.old for x in self.history]),
+            new=np.concatenate([x.new for x in self.history]),
+        )
+        return pd.DataFrame(data)
+
+    def to_arrays(self) -> dict:
+        """
+        Return the history and undo and redo stacks as arrays, which can be
+        saved in the columnar format. See from_arrays.
+        """
+        history = self.history
+        positions = {id(x): num for num, x in enumerate(history)}
+
+        def concatenate(name, dtype):
+            values = [getattr(x, name) for x in history]
+            return np.concatenate(values + [np.empty(0, dtype)]).astype(dtype)
+
+        return dict(
+            log_ops=np.array([x.op for x in history], dtype=str),
+            log_timestamps=np.array([x.timestamp for x in history], dtype=float),
+            log_sizes=np.array([len(x.rows) for x in history], dtype=np.int64),
+            log_rows=concatenate("rows", np.int64),
+            log_old=concatenate("old", np.float64),
+            log_new=concatenate("new", np.float64),
+            # the stacks hold operations from the history
+            log_done=np.array([positions[id(x)] for x in self.done], np.int64),
+            log_undone=np.array([positions[id(x)] for x in self.undone], np.int64),
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> "OperationLog":
+        """
+        Create a log from the arrays of to_arrays. Other arrays are ignored,
+        and without them the log is empty, as for files saved before the log
+        was kept.
+        """
+        out = cls()
+        if "log_sizes" not in arrays:
+            return out
+        bounds = np.concatenate([[0], np.cumsum(arrays["log_sizes"])])
+        names = ("log_rows", "log_old", "log_new")
+        rows, old, new = (np.array(arrays[x]) for x in names)
+        ops = arrays["log_ops"].tolist()
+        timestamps = arrays["log_timestamps"].tolist()
+        for num, (op, timestamp) in enumerate(zip(ops, timestamps)):
+            part = slice(bounds[num], bounds[num + 1])
+            operation = Operation(op, rows[part], old[part], new[part], timestamp)
+            out.history.append(operation)
+        out.done = [out.history[x] for x in arrays["log_done"].tolist()]
+        out.undone = [out.history[x] for x in arrays["log_undone"].tolist()]
+        return out
@@ -0,0 +1,269 @@
+"""
+Strategies for scheduling players into heats.
+
+Each strategy returns a flat sequence of players; the heat of the i-th
+entry is i // players_at_once and its lane is i % players_at_once.
+"""
+import itertools
+import math
+import random
+from typing import Hashable, List, Optional, Sequence
+
+from pynewood.constants import MAX_SHAKE_UPS
+from pynewood.exceptions import InvalidTournamentError
+
+
+def has_self_matchup(sequence: Sequence[Hashable], players_at_once: int) -> bool:
+    """ return True if any heat in sequence contains a player twice """
+    for start in range(0, len(sequence), players_at_once):
+        heat = sequence[start : start + players_at_once]
+        if len(set(heat)) != len(heat):
+            return True
+    return False
+
+
+def random_schedule(
+    players: Sequence[Hashable],
+    players_at_once: int,
+    number_of_plays: int,
+    rng: random.Random,
+) -> List[Hashable]:
+    """
+    Shuffle the players once per play, retrying until no player is
+    scheduled against him/her self.
+    """
+    for _ in range(MAX_SHAKE_UPS):
+        nested_player_order = [
+            rng.sample(players, len(players)) for _ in range(number_of_plays)
+        ]
+        sequence = list(itertools.chain.from_iterable(nested_player_order))
+        if not has_self_matchup(sequence, players_at_once):
+            return sequence
+    msg = (
+        f"After {MAX_SHAKE_UPS} tries a tournament configuration "
+        f"which does not require a player to play against him/her "
+        f"self could not be found."
+    )
+    raise InvalidTournamentError(msg)
+
+
+def constructive_schedule(
+    players: Sequence[Hashable],
+    players_at_once: int,
+    number_of_plays: int,
+    rng: random.Random,
+) -> List[Hashable]:
+    """
+    Build a schedule which never pits a player against him/her self.
+
+    Each play is a shuffled ordering of all players. Only a heat which
+    straddles two plays can contain a repeat, so the players that open a
+    new play are drawn from those not already in the straddling heat.
+    This always succeeds when there are at least players_at_once players.
+    """
+    _check_enough_players(players, players_at_once)
+    sequence = []
+    for _ in range(number_of_plays):
+        order = rng.sample(players, len(players))
+        sequence.extend(_open_play(sequence, order, players_at_once))
+    return sequence
+
+
+def lane_balanced_schedule(
+    players: Sequence[Hashable],
+    players_at_once: int,
+    number_of_plays: int,
+    rng: random.Random,
+) -> List[Hashable]:
+    """
+    Build a schedule which runs each player in each lane as evenly as
+    possible and spreads out who they race against.
+
+    Each play steps through one shuffled ordering of the players with a
+    different stride, coprime with the number of players, so the players
+    sharing a heat differ from play to play. Heats straddling two plays are
+    fixed as in constructive_schedule.
+
+    Lanes follow a Latin square: the player at position k of the shuffled
+    ordering runs lane (play + k) % players_at_once. When the number of
+    players is a multiple of players_at_once every heat holds one player
+    of each offset, so this is exact; otherwise see _assign_lanes. Either
+    way each player runs each lane once in every players_at_once plays.
+    """
+    _check_enough_players(players, players_at_once)
+    size = len(players)
+    base = rng.sample(players, size)
+    offsets = {player: num % players_at_once for num, player in enumerate(base)}
+    sequence = []
+    for stride in _strides(size, number_of_plays, players_at_once):
+        order = [base[(num * stride) % size] for num in range(size)]
+        sequence.extend(_open_play(sequence, order, players_at_once))
+    return _assign_lanes(sequence, offsets, players_at_once)
+
+
+def _check_enough_players(players: Sequence[Hashable], players_at_once: int):
+    """ raise if there are too few players to fill a heat without repeats """
+    if len(players) < players_at_once:
+        msg = (
+            f"{len(players)} players cannot fill heats of {players_at_once} "
+            f"without a player playing against him/her self."
+        )
+        raise InvalidTournamentError(msg)
+
+
+def _open_play(
+    sequence: Sequence[Hashable], order: Sequence[Hashable], players_at_once: int
+) -> List[Hashable]:
+    """
+    Return the order of a play reordered so it can follow sequence.
+
+    Only the heat which straddles two plays can contain a repeat, so the
+    players that open the new play are drawn from those not already in it.
+    """
+    # players already in the heat this play will start in
+    tail = set(sequence[len(sequence) - len(sequence) % players_at_once :])
+    need = players_at_once - len(tail) if tail else 0
+    head, rest = [], []
+    for player in order:
+        if len(head) < need and player not in tail:
+            head.append(player)
+        else:
+            rest.append(player)
+    return head + rest
+
+
+def _strides(size: int, number_of_plays: int, players_at_once: int) -> List[int]:
+    """
+    Return a stride, coprime with size, for each play.
+
+    Strides at least players_at_once apart put different players next to
+    each other, so in the same heat, in each play. They repeat if there
+    are not enough of them.
+    """
+    strides = [x for x in range(1, max(size, 2)) if math.gcd(x, size) == 1] or [1]
+    spaced, last = [], -players_at_once
+    for stride in strides:
+        if stride - last >= players_at_once:
+            spaced.append(stride)
+            last = stride
+    strides = spaced + [x for x in strides if x not in spaced]
+    return [strides[x % len(strides)] for x in range(number_of_plays)]
+
+
+def _assign_lanes(
+    sequence: List[Hashable], offsets: dict, players_at_once: int
+) -> List[Hashable]:
+    """
+    Return sequence with the players of each heat ordered by lane.
+
+    Lanes are found by coloring the edges of a bipartite graph between
+    heats and each player's plays, taken players_at_once at a time, with
+    one color per lane. Each edge first tries the Latin square lane of
+    lane_balanced_schedule; when that is taken at either end the colors
+    along an alternating path are swapped, as in the proof of Konig's
+    theorem, so no heat or group of plays ever repeats a lane. A short last
+    heat is padded with placeholders, then the lanes are renumbered so its
+    players use the first lanes.
+    """
+    lanes = players_at_once
+    # heat_lanes[h][lane] is the group of plays in that lane of heat h and
+    # group_lanes[g][lane] the heat group g runs that lane in, or -1
+    heat_lanes, group_lanes, groups, edges = [], [], {}, []
+    plays = dict.fromkeys(offsets, 0)
+    for num, player in enumerate(sequence):
+        play = plays[player]
+        plays[player] += 1
+        key = (player, play // lanes)
+        if key not in groups:
+            groups[key] = len(group_lanes)
+            group_lanes.append([-1] * lanes)
+        if num % lanes == 0:
+            heat_lanes.append([-1] * lanes)
+        edges.append((num // lanes, groups[key], (offsets[player] + play) % lanes))
+    short = len(sequence) % lanes
+    if short:  # placeholders fill the last heat
+        for num in range(short, lanes):
+            group_lanes.append([-1] * lanes)
+            edges.append((len(heat_lanes) - 1, len(group_lanes) - 1, num))
+
+    def swap_path(group, first, second):
+        """ swap first and second along the path leaving group by first """
+        path, color, node, at_group = [], first, group, True
+        while True:
+            lanes_at = group_lanes[node] if at_group else heat_lanes[node]
+            other = lanes_at[color]
+            if other < 0:
+                break
+            path.append((other, node) if at_group else (node, other))
+            node, at_group = other, not at_group
+            color = second if color == first else first
+        for num, (heat, member) in enumerate(path):
+            old = first if num % 2 == 0 else second
+            heat_lanes[heat][old] = group_lanes[member][old] = -1
+        for num, (heat, member) in enumerate(path):
+            new = second if num % 2 == 0 else first
+            heat_lanes[heat][new], group_lanes[member][new] = member, heat
+
+    for heat, group, lane in edges:
+        at_heat, at_group = heat_lanes[heat], group_lanes[group]
+        if at_heat[lane] >= 0 or at_group[lane] >= 0:
+            free_heat = lane if at_heat[lane] < 0 else at_heat.index(-1)
+            free_group = lane if at_group[lane] < 0 else at_group.index(-1)
+            if at_group[free_heat] < 0:
+                lane = free_heat
+            elif at_heat[free_group] < 0:
+                lane = free_group
+            else:
+                # free_heat becomes free at group, and stays free at heat
+                swap_path(group, free_heat, free_group)
+                lane = free_heat
+        at_heat[lane], at_group[lane] = group, heat
+
+    # renumber the lanes so the players of a short last heat use the first
+    order = list(range(lanes))
+    if short:
+        used = [lane for lane, x in enumerate(heat_lanes[-1]) if x < len(groups)]
+        order = used + [x for x in order if x not in used]
+    renumber = {lane: num for num, lane in enumerate(order)}
+    players = {num: player for (player, _), num in groups.items()}
+    out = []
+    for heat in heat_lanes:
+        by_lane = sorted((renumber[lane], x) for lane, x in enumerate(heat))
+        out.extend(players[x] for _, x in by_lane if x < len(groups))
+    return out
+
+
+SCHEDULERS = {
+    "constructive": constructive_schedule,
+    "random": random_schedule,
+    "lane_balanced": lane_balanced_schedule,
+}
+
+
+def make_schedule(
+    players: Sequence[Hashable],
+    players_at_once: int,
+    number_of_plays: int,
+    strategy: str = "constructive",
+    seed: Optional[int] = None,
+) -> List[Hashable]:
+    """
+    Return a flat sequence of players using the named strategy.
+
+    Parameters
+    ----------
+    players
+        A sequence of unique player ids
+    players_at_once
+        The number of players in each heat
+    number_of_plays
+        The number of times each player should participate
+    strategy
+        The name of the scheduling strategy, a key of SCHEDULERS
+    seed
+        If not None, used to seed the random number generator so the same
+        schedule is produced each time.
+    """
+    rng = random.Random(seed)
+    func = SCHEDULERS[strategy]
+    return func(list(players), players_at_once, number_of_plays, rng)
@@ -0,0 +1,302 @@
+"""
+Monte Carlo projections of a LimitedRound's standings and finish time.
+
+The times not yet entered are drawn from a normal distribution for each
+player, estimated from the times entered so far and shrunk towards the times
+of all players while a player has few times. Each trial is a slice of a
+(trials, players, plays) array of times, so thousands of trials run as a few
+vectorized NumPy operations and the tournament itself is never copied.
+"""
+import datetime
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# the most elements of the (trials, players, plays) array made at once
+CHUNK_SIZE = 2 ** 22
+
+# rank statistics for which a lower time never gives a worse rank
+_MONOTONIC_STATS = ("min", "max", "mean", "median")
+
+
+def _rank_stat(times: np.ndarray, rank_stat: str) -> np.ndarray:
+    """ return the rank statistic over the last axis, ignoring NaN """
+    if rank_stat == "min":
+        return np.nanmin(times, axis=-1)
+    elif rank_stat == "max":
+        return np.nanmax(times, axis=-1)
+    elif rank_stat == "mean":
+        return np.nanmean(times, axis=-1)
+    elif rank_stat == "median":
+        return np.nanmedian(times, axis=-1)
+    elif rank_stat == "std":
+        return np.nanstd(times, axis=-1, ddof=1)
+    elif rank_stat == "size":
+        return (~np.isnan(times)).sum(axis=-1).astype(float)
+    raise ValueError(f"unknown statistic {rank_stat}")
+
+
+class SimulationResult:
+    """
+    The ranks players finished at in each of many simulated tournaments.
+
+    Parameters
+    ----------
+    players
+        The player ids, in code order.
+    rank_counts
+        The number of trials each player finished at each rank, an array of
+        (players, ranks) where rank_counts[p, r] counts rank r + 1.
+    trials
+        The number of trials run.
+    """
+
+    def __init__(self, players, rank_counts: np.ndarray, trials: int):
+        self.players = tuple(players)
+        self.rank_counts = rank_counts
+        self.trials = trials
+
+    def rank_probabilities(self) -> pd.DataFrame:
+        """
+        return the probability of each player finishing at each rank, with
+        a row for each player and a column for each rank.
+        """
+        index = pd.Index(self.players, dtype=object, name="player")
+        columns = pd.RangeIndex(1, self.rank_counts.shape[1] + 1, name="rank")
+        return pd.DataFrame(self.rank_counts / self.trials, index, columns)
+
+    def top_probability(self, top: int) -> pd.Series:
+        """ return the probability of each player finishing in the top n """
+        assert 0 < top <= self.rank_counts.shape[1]
+        counts = self.rank_counts[:, :top].sum(axis=1)
+        index = pd.Index(self.players, dtype=object, name="player")
+        return pd.Series(counts / self.trials, index=index, name=f"top_{top}")
+
+    def expected_rank(self) -> pd.Series:
+        """ return the mean rank of each player, if all ranks were counted """
+        ranks = np.arange(1, self.rank_counts.shape[1] + 1)
+        index = pd.Index(self.players, dtype=object, name="player")
+        values = self.rank_counts @ ranks / self.trials
+        return pd.Series(values, index=index, name="expected_rank")
+
+
+class Simulator:
+    """
+    Simulates the rest of a LimitedRound from the times entered so far.
+
+    The simulator reads the tournament's entries when created, so create a
+    new one after times are entered.
+
+    Parameters
+    ----------
+    tournament
+        The LimitedRound to simulate.
+    prior_weight
+        How many times a player's estimates are worth when shrunk towards
+        those of all players.
+    seed
+        Seeds the random draws so the same results are returned each time.
+    """
+
+    def __init__(self, tournament, prior_weight: float = 2.0, seed=None):
+        columns = tournament.get_columns()
+        self.players = list(tournament.players)
+        self.rank_stat = tournament.rank_stat
+        self.random_state = np.random.RandomState(seed)
+        codes = columns["player"].astype(np.int64)
+        rounds = columns["round"].astype(np.int64)
+        times = columns["time"]
+        plays = int(rounds.max()) + 1 if len(rounds) else 0
+        # entered times by (player, round), NaN for un-entered and padding
+        self.entered = np.full((len(self.players), plays), np.nan)
+        self.entered[codes, rounds] = times
+        missing = np.isnan(times)
+        self.missing_codes = codes[missing]
+        self.missing_rounds = rounds[missing]
+        self.mean, self.std = self._estimate(codes, times, prior_weight)
+
+    def _estimate(self, codes, times, prior_weight):
+        """ return the mean and std of the times of each player """
+        entered = ~np.isnan(times)
+        if not entered.any():
+            raise ValueError("times must be entered before simulating")
+        codes, times = codes[entered], times[entered]
+        size = len(self.players)
+        count = np.bincount(codes, minlength=size)
+        total = np.bincount(codes, weights=times, minlength=size)
+        squares = np.bincount(codes, weights=times ** 2, minlength=size)
+        # deviations from each player's own mean, pooled over players
+        with np.errstate(invalid="ignore", divide="ignore"):
+            player_mean = total / count
+            deviation = np.where(count > 0, squares - total * player_mean, 0.0)
+        degrees = np.maximum(count - 1, 0)
+        if degrees.sum():
+            pooled_var = max(deviation.sum(), 0.0) / degrees.sum()
+        else:
+            pooled_var = times.var()
+        pooled_mean = times.mean()
+        mean = (total + prior_weight * pooled_mean) / (count + prior_weight)
+        var = (np.maximum(deviation, 0) + prior_weight * pooled_var) / (
+            degrees + prior_weight
+        )
+        return mean, np.sqrt(var)
+
+    def _trial_times(self, trials: int) -> np.ndarray:
+        """ return (trials, players, plays) times with un-entered times drawn """
+        out = np.broadcast_to(self.entered, (trials,) + self.entered.shape).copy()
+        codes, rounds = self.missing_codes, self.missing_rounds
+        draws = self.random_state.standard_normal((trials, len(codes)))
+        draws = self.mean[codes] + self.std[codes] * draws
+        out[:, codes, rounds] = np.maximum(draws, 0.0)
+        return out
+
+    def _chunks(self, trials: int):
+        """ yield the number of trials to simulate at once """
+        per_trial = max(self.entered.size, 1)
+        chunk = max(CHUNK_SIZE // per_trial, 1)
+        for start in range(0, trials, chunk):
+            yield min(chunk, trials - start)
+
+    def run(self, trials: int = 1000, max_rank: Optional[int] = None):
+        """
+        Simulate the rest of the tournament many times.
+
+        Parameters
+        ----------
+        trials
+            The number of simulated tournaments.
+        max_rank
+            Only count ranks up to this, defaults to the number of players.
+        """
+        size = len(self.players)
+        max_rank = size if max_rank is None else min(max_rank, size)
+        counts = np.zeros(size * max_rank, dtype=np.int64)
+        for chunk in self._chunks(trials):
+            stats = _rank_stat(self._trial_times(chunk), self.rank_stat)
+            # NaN sorts last and ties go to the lower code, as in Standings
+            order = np.argsort(stats, axis=1, kind="stable")
+            ranks = np.empty_like(order)
+            np.put_along_axis(ranks, order, np.arange(size)[None, :], axis=1)
+            codes = np.broadcast_to(np.arange(size), ranks.shape)
+            kept = ranks < max_rank
+            flat = codes[kept] * max_rank + ranks[kept]
+            counts += np.bincount(flat, minlength=size * max_rank)
+        return SimulationResult(self.players, counts.reshape(size, max_rank), trials)
+
+    def required_time(
+        self, player, top: int = 8, probability: float = 0.5, trials: int = 1000
+    ) -> float:
+        """
+        Return the time a player needs in their next run to finish in the
+        top n with at least the given probability.
+
+        Returns NaN if no time is good enough and inf if any time is.
+
+        Parameters
+        ----------
+        player
+            The player id.
+        top
+            The number of places to finish within.
+        probability
+            The chance of finishing in the top places the time should give.
+        trials
+            The number of simulated tournaments.
+        """
+        if self.rank_stat not in _MONOTONIC_STATS:
+            msg = f"required_time can't be found when ranking by {self.rank_stat}"
+            raise ValueError(msg)
+        code = self.players.index(player)
+        rounds = self.missing_rounds[self.missing_codes == code]
+        if not len(rounds):
+            raise ValueError(f"player {player} has no un-entered times!")
+        next_round = rounds.min()
+        size = len(self.players)
+        assert 0 < top < size
+        cutoffs, player_times = [], []
+        for chunk in self._chunks(trials):
+            times = self._trial_times(chunk)
+            stats = _rank_stat(times, self.rank_stat)
+            stats[:, code] = np.inf
+            # the stat the player must beat is the top-th best of the others
+            cutoffs.append(np.partition(stats, top - 1, axis=1)[:, top - 1])
+            player_times.append(times[:, code, :])
+        cutoff, player_times = np.concatenate(cutoffs), np.concatenate(player_times)
+
+        def chance(value):
+            player_times[:, next_round] = value
+            return (_rank_stat(player_times, self.rank_stat) < cutoff).mean()
+
+        low, high = 0.0, 2 * float(np.nanmax(cutoff[np.isfinite(cutoff)]))
+        if chance(low) < probability:
+            return np.nan
+        if chance(high) >= probability:
+            return np.inf
+        for _ in range(60):
+            middle = (low + high) / 2
+            if chance(middle) >= probability:
+                low = middle
+            else:
+                high = middle
+            if high - low <= 1e-6 * high:
+                break
+        return low
+
+
+def simulate(tournament, trials=1000, max_rank=None, seed=None) -> SimulationResult:
+    """ Simulate the rest of a LimitedRound, see Simulator.run """
+    return Simulator(tournament, seed=seed).run(trials, max_rank)
+
+
+def estimate_finish(tournament, window: int = 20, now: Optional[float] = None):
+    """
+    Estimate when a tournament will finish at its current pace.
+
+    The pace is the rate times were entered over the last window changes
+    which entered times, from the tournament's history.
+
+    Returns a dict with the remaining entries and heats, the seconds per
+    heat, the seconds remaining and the finish as a datetime, or None for
+    the last three if the pace is unknown.
+
+    Parameters
+    ----------
+    tournament
+        The LimitedRound.
+    window
+        The number of recent changes to measure the pace over.
+    now
+        The time, in seconds since the epoch, to estimate from.
+    """
+    now = time.time() if now is None else now
+    remaining = tournament.remaining_entries
+    heats_left = tournament.total_heats - tournament.completed_heats
+    out = dict(
+        remaining_entries=remaining,
+        remaining_heats=heats_left,
+        seconds_per_heat=None,
+        seconds_remaining=None,
+        finish=None,
+    )
+    if not remaining:
+        out.update(seconds_remaining=0.0, finish=datetime.datetime.fromtimestamp(now))
+        return out
+    # (timestamp, number of times entered) of recent changes entering times
+    changes = tournament.get_recent_entries(window)
+    if len(changes) < 2:
+        return out
+    elapsed = changes[-1][0] - changes[0][0]
+    # the times of the first change were entered before the window started
+    entered = sum(x[1] for x in changes[1:])
+    if elapsed <= 0:
+        return out
+    seconds_per_entry = elapsed / entered
+    seconds = remaining * seconds_per_entry
+    out.update(
+        seconds_per_heat=seconds_per_entry * tournament.players_per_round,
+        seconds_remaining=seconds,
+        finish=datetime.datetime.fromtimestamp(now + seconds),
+    )
+    return out
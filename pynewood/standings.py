@@ -0,0 +1,178 @@
+"""
+Running standings for the players of a tournament.
+"""
+import bisect
+from typing import Hashable, Sequence
+
+import numpy as np
+import pandas as pd
+
+from pynewood.constants import AGGS
+
+
+def _median(sorted_times):
+    """ return the median of a sorted list """
+    if not sorted_times:
+        return np.nan
+    middle = len(sorted_times) // 2
+    if len(sorted_times) % 2:
+        return sorted_times[middle]
+    return (sorted_times[middle - 1] + sorted_times[middle]) / 2
+
+
+class Standings:
+    """
+    Per player statistics of entered times which are updated one time at a
+    time, so the ranks can be read without aggregating every entry.
+
+    Counts, sums and sums of squares give the mean and std, a sorted list of
+    each player's times gives the min, max and median, and players are kept
+    sorted by the rank statistic.
+
+    Parameters
+    ----------
+    names
+        The table of player ids, player codes index into it.
+    rank_stat
+        The statistic, one of AGGS, used to rank players.
+    """
+
+    def __init__(self, names: Sequence[Hashable], rank_stat: str = "min"):
+        size = len(names)
+        self.names = tuple(names)
+        self.rank_stat = rank_stat
+        self.count = np.zeros(size, dtype=np.int64)
+        self.total = np.zeros(size)
+        self.total_squared = np.zeros(size)
+        self.median = np.full(size, np.nan)
+        self._times = [[] for _ in range(size)]
+        self._keys = [None] * size
+        self._order = []  # sorted (rank key, code) of players with times
+
+    @classmethod
+    def from_times(cls, names, codes, times, rank_stat="min"):
+        """ Create standings from the player code and time of each entry """
+        out = cls(names, rank_stat)
+        valid = ~np.isnan(times)
+        codes, times = np.asarray(codes)[valid], np.asarray(times)[valid]
+        out.count[:] = np.bincount(codes, minlength=len(names))
+        out.total[:] = np.bincount(codes, weights=times, minlength=len(names))
+        out.total_squared[:] = np.bincount(
+            codes, weights=times ** 2, minlength=len(names)
+        )
+        order = np.lexsort((times, codes))
+        starts = np.searchsorted(codes[order], np.arange(len(names) + 1))
+        sorted_times = times[order].tolist()
+        for code in np.flatnonzero(out.count):
+            out._times[code] = sorted_times[starts[code] : starts[code + 1]]
+            out.median[code] = _median(out._times[code])
+        out.set_rank_stat(rank_stat)
+        return out
+
+    # --- statistics
+
+    def _stat(self, code, stat):
+        """ return the value of one statistic for one player """
+        times, count = self._times[code], self.count[code]
+        total, total_squared = self.total[code], self.total_squared[code]
+        if stat == "min":
+            return times[0]
+        elif stat == "max":
+            return times[-1]
+        elif stat == "mean":
+            return total / count
+        elif stat == "median":
+            return self.median[code]
+        elif stat == "std":
+            return self._std(count, total, total_squared)
+        elif stat == "size":
+            return count
+        raise ValueError(f"unknown statistic {stat}")
+
+    @staticmethod
+    def _std(count, total, total_squared):
+        """ return the sample std from the count, sum and sum of squares """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = (total_squared - total ** 2 / count) / (count - 1)
+        return np.sqrt(np.where(count > 1, np.maximum(var, 0), np.nan))
+
+    def _key(self, code):
+        """ return the sort key of a player, NaN values sort last """
+        value = float(self._stat(code, self.rank_stat))
+        return (1, 0.0, code) if np.isnan(value) else (0, value, code)
+
+    # --- updates
+
+    def _unrank(self, code):
+        key = self._keys[code]
+        if key is not None:
+            del self._order[bisect.bisect_left(self._order, key)]
+            self._keys[code] = None
+
+    def _rank(self, code):
+        if self.count[code]:
+            key = self._key(code)
+            bisect.insort(self._order, key)
+            self._keys[code] = key
+
+    def add(self, code: int, time: float):
+        """ add an entered time for a player """
+        self._unrank(code)
+        bisect.insort(self._times[code], time)
+        self.count[code] += 1
+        self.total[code] += time
+        self.total_squared[code] += time ** 2
+        self.median[code] = _median(self._times[code])
+        self._rank(code)
+
+    def remove(self, code: int, time: float):
+        """ remove a previously entered time for a player """
+        self._unrank(code)
+        times = self._times[code]
+        del times[bisect.bisect_left(times, time)]
+        self.count[code] -= 1
+        self.median[code] = _median(times)
+        if self.count[code]:
+            self.total[code] -= time
+            self.total_squared[code] -= time ** 2
+        else:  # reset to avoid accumulating rounding errors
+            self.total[code] = self.total_squared[code] = 0.0
+        self._rank(code)
+
+    def update(self, codes, old, new):
+        """ replace the old times of each code with the new, NaN is no time """
+        for code, old_time, new_time in zip(codes, old, new):
+            if old_time == new_time:
+                continue
+            if not np.isnan(old_time):
+                self.remove(code, old_time)
+            if not np.isnan(new_time):
+                self.add(code, new_time)
+
+    def set_rank_stat(self, rank_stat: str):
+        """ change the statistic players are ranked on """
+        assert rank_stat in AGGS
+        self.rank_stat = rank_stat
+        self._keys = [None] * len(self.names)
+        for code in np.flatnonzero(self.count):
+            self._keys[code] = self._key(code)
+        self._order = sorted(x for x in self._keys if x is not None)
+
+    # --- output
+
+    def table(self) -> pd.DataFrame:
+        """ return a table of each player's rank and statistics """
+        codes = np.array([x[-1] for x in self._order], dtype=np.int64)
+        count = self.count[codes]
+        total, total_squared = self.total[codes], self.total_squared[codes]
+        data = dict(
+            rank=np.arange(1, len(codes) + 1),
+            min=np.array([self._times[x][0] for x in codes], dtype=float),
+            max=np.array([self._times[x][-1] for x in codes], dtype=float),
+            mean=total / np.where(count, count, 1),
+            median=self.median[codes],
+            std=self._std(count, total, total_squared),
+            races=count,
+        )
+        index = pd.Index([self.names[x] for x in codes], dtype=object, name="player")
+        return pd.DataFrame(data, index=index)
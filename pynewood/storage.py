@@ -0,0 +1,253 @@
+"""
+Storage engines for the entries (player, round, heat, time) of a tournament.
+
+Each row is one race of one player. The schedule (player, round and heat) is
+fixed when the tournament is created; only the times change. Player ids are
+stored as integer codes into a table of names, and rows are ordered by heat.
+The lane of a row is its position within its heat.
+"""
+from typing import Hashable, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+FRAME_COLUMNS = ["player", "round", "heat", "time"]
+FRAME_DTYPES = {"player": object, "round": int, "heat": int, "time": float}
+
+
+def _rounds_from_codes(codes: np.ndarray) -> np.ndarray:
+    """ return the number of times each row's player appears before it """
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    first = np.searchsorted(sorted_codes, sorted_codes)
+    rounds = np.empty(len(codes), dtype=np.int64)
+    rounds[order] = np.arange(len(codes)) - first
+    return rounds
+
+
+def _object_array(values) -> np.ndarray:
+    """ return a 1D object array of values, even if they are sequences """
+    out = np.empty(len(values), dtype=object)
+    for num, value in enumerate(values):
+        out[num] = value
+    return out
+
+
+def _code_dtype(number_of_names: int):
+    """ return the smallest unsigned int dtype that can hold the codes """
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if number_of_names <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.uint64
+
+
+class Entry:
+    """ A lightweight view of a single row in a tournament's storage. """
+
+    __slots__ = ("storage", "row")
+
+    def __init__(self, storage: "Storage", row: int):
+        self.storage = storage
+        self.row = row
+
+    @property
+    def player(self) -> Hashable:
+        return self.storage.names[self.storage.codes[self.row]]
+
+    @property
+    def round(self) -> int:
+        return int(self.storage.rounds[self.row])
+
+    @property
+    def heat(self) -> int:
+        return int(self.storage.heats[self.row])
+
+    @property
+    def lane(self) -> int:
+        return int(self.storage.lanes[self.row])
+
+    @property
+    def time(self) -> float:
+        return float(self.storage.get_times(self.row))
+
+    def __repr__(self):
+        attrs = ("player", "round", "heat", "lane", "time")
+        values = ", ".join(f"{x}={getattr(self, x)!r}" for x in attrs)
+        return f"Entry({values})"
+
+
+class Storage:
+    """
+    Base class for tournament storage engines.
+
+    Parameters
+    ----------
+    names
+        The table of player ids, codes index into it.
+    codes
+        The player code of each row.
+    """
+
+    # True if frame returns the storage itself, so edits to it persist
+    live_frame = False
+    # the dtype times are stored with
+    time_dtype = np.float64
+
+    def __init__(self, names: Sequence[Hashable], codes: np.ndarray):
+        self.names = tuple(names)
+        self.codes = np.asarray(codes, dtype=_code_dtype(len(self.names)))
+
+    @classmethod
+    def from_schedule(
+        cls,
+        player_order: Sequence[Hashable],
+        names: Sequence[Hashable],
+        players_at_once: int,
+    ):
+        """ Create storage from a flat sequence of players. """
+        lookup = {name: num for num, name in enumerate(names)}
+        codes = np.array([lookup[x] for x in player_order], dtype=np.int64)
+        rounds = _rounds_from_codes(codes)
+        heats = np.arange(len(codes)) // players_at_once
+        times = np.full(len(codes), np.nan)
+        return cls(names, codes, rounds, heats, times)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, row: int) -> Entry:
+        if not -len(self) <= row < len(self):
+            raise IndexError(f"row {row} is out of range")
+        return Entry(self, row % len(self))
+
+    def __iter__(self):
+        return (Entry(self, x) for x in range(len(self)))
+
+    def players(self, start: int, stop: int) -> List[Hashable]:
+        """ return the player ids of rows start through stop """
+        names = self.names
+        return [names[x] for x in self.codes[start:stop]]
+
+    @property
+    def rounds(self) -> np.ndarray:
+        raise NotImplementedError
+
+    @property
+    def heats(self) -> np.ndarray:
+        raise NotImplementedError
+
+    @property
+    def lanes(self) -> np.ndarray:
+        """ the lane of each row, its position within its heat """
+        heats = self.heats
+        return np.arange(len(heats)) - np.searchsorted(heats, heats)
+
+    def get_times(self, rows=slice(None)) -> np.ndarray:
+        """ return the times of the given rows, NaN where not entered """
+        raise NotImplementedError
+
+    def set_times(self, rows, times) -> np.ndarray:
+        """ set the times at the given row positions, return stored values """
+        raise NotImplementedError
+
+    def frame(self) -> pd.DataFrame:
+        """ return a dataframe with the player, round, heat, and time """
+        raise NotImplementedError
+
+
+class FrameStorage(Storage):
+    """ Keeps the entries in a pandas DataFrame, which may be edited. """
+
+    live_frame = True
+
+    def __init__(self, names, codes, rounds, heats, times):
+        super().__init__(names, codes)
+        player = _object_array(self.names)[self.codes]
+        data = dict(player=player, round=rounds, heat=heats, time=times)
+        self.df = pd.DataFrame(data, columns=FRAME_COLUMNS).astype(FRAME_DTYPES)
+        self._cache_schedule()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, names: Sequence[Hashable]):
+        """ Wrap an existing dataframe. """
+        out = cls.__new__(cls)
+        lookup = {name: num for num, name in enumerate(names)}
+        Storage.__init__(out, names, [lookup[x] for x in df["player"]])
+        out.df = df
+        out._cache_schedule()
+        return out
+
+    def _cache_schedule(self):
+        # looking up dataframe columns is slow, so keep the schedule, which
+        # doesn't change, as arrays
+        self._rounds = self.df["round"].to_numpy()
+        self._heats = self.df["heat"].to_numpy()
+        self._time_col = self.df.columns.get_loc("time")
+
+    @property
+    def rounds(self):
+        return self._rounds
+
+    @property
+    def heats(self):
+        return self._heats
+
+    def get_times(self, rows=slice(None)):
+        if isinstance(rows, (int, np.integer)):  # iat is faster for one value
+            return self.df.iat[rows, self._time_col]
+        return self.df["time"].to_numpy()[rows]
+
+    def set_times(self, rows, times):
+        if len(rows) == 1:
+            self.df.iat[rows[0], self._time_col] = times[0]
+        else:
+            self.df.iloc[rows, self._time_col] = times
+        return np.asarray(times, dtype=np.float64)
+
+    def frame(self):
+        return self.df
+
+
+class ArrayStorage(Storage):
+    """
+    Keeps the entries in compact NumPy arrays.
+
+    Codes use the smallest unsigned int that fits, rounds and heats are int32
+    and times are float32. The dataframe is created when requested and edits
+    to it do not change the storage.
+    """
+
+    time_dtype = np.float32
+
+    def __init__(self, names, codes, rounds, heats, times):
+        super().__init__(names, codes)
+        self._rounds = np.asarray(rounds, dtype=np.int32)
+        self._heats = np.asarray(heats, dtype=np.int32)
+        self._times = np.asarray(times, dtype=np.float32)
+
+    @property
+    def rounds(self):
+        return self._rounds
+
+    @property
+    def heats(self):
+        return self._heats
+
+    def get_times(self, rows=slice(None)):
+        return self._times[rows].astype(np.float64)
+
+    def set_times(self, rows, times):
+        self._times[rows] = times
+        return self._times[rows].astype(np.float64)
+
+    def frame(self):
+        data = dict(
+            player=_object_array(self.names)[self.codes],
+            round=self._rounds,
+            heat=self._heats,
+            time=self.get_times(),
+        )
+        return pd.DataFrame(data, columns=FRAME_COLUMNS).astype(FRAME_DTYPES)
+
+
+STORAGE_CLASSES = {"frame": FrameStorage, "array": ArrayStorage}
@@ -6,6 +6,7 @@ from pathlib import Path
 
 import pynewood as pn
 import pynewood.constants
+from pynewood.catalog import get_catalog
 
 
 def missing_time(df):
@@ -20,27 +21,121 @@ def player_list(df):
 def get_saved_tournament_names(path=None):
     """ return a list of all the saved tournaments. """
     path = Path(path or pynewood.constants.DEFAULT_SAVE_PATH)
-    return sorted([x.name.replace(".pkl", "") for x in path.glob("*.pkl")])
+    return get_catalog(path).names()
 
 
-def load_tournament(tournament_name: str, path=None):
-    """ Load a tournament by its name. """
+def list_saved_tournaments(path=None):
+    """
+    Return a list of dicts describing each saved tournament.
+
+    Each has the name, type, file, size, modified time and progress (or None
+    if the tournament type doesn't report it) of a tournament.
+    """
     path = Path(path or pynewood.constants.DEFAULT_SAVE_PATH)
-    tournies = list(path.glob(f"{tournament_name}.pkl"))
-    if tournament_name not in get_saved_tournament_names(path):
+    entries = get_catalog(path).entries
+    return [entries[x] for x in sorted(entries)]
+
+
+def _find_saved_tournament(tournament_name: str, path: Path) -> Path:
+    """ return the path of a saved tournament, the newest if in many formats """
+    suffixes = pynewood.constants.SAVE_FORMATS.values()
+    paths = [path / f"{tournament_name}{x}" for x in suffixes]
+    existing = [x for x in paths if x.exists()]
+    if not existing:
         msg = f"{tournament_name} not found in {path}"
         raise FileNotFoundError(msg)
+    return max(existing, key=lambda x: x.stat().st_mtime)
+
 
-    with tournies[0].open("rb") as fi:
-        return pickle.load(fi)
+def read_tournament_info(tournament_name: str, path=None) -> dict:
+    """
+    Return the type, name, options and progress of a saved tournament.
+
+    For tournaments saved in the columnar format only the metadata is read.
+    """
+    path = Path(path or pynewood.constants.DEFAULT_SAVE_PATH)
+    tournament_path = _find_saved_tournament(tournament_name, path)
+    if tournament_path.suffix == pynewood.constants.SAVE_FORMATS["npz"]:
+        from pynewood.columnar import read_metadata  # needs numpy
+
+        return read_metadata(tournament_path)
+    return load_tournament(tournament_name, path=path, recover=False)._metadata()
+
+
+def load_tournament(tournament_name: str, path=None, mmap=False, recover=True):
+    """
+    Load a tournament by its name.
+
+    Parameters
+    ----------
+    tournament_name
+        The name of the tournament.
+    path
+        The directory the tournament was saved in.
+    mmap
+        If True, and the tournament was saved in the columnar format, memory
+        map its columns rather than reading them.
+    recover
+        Passed to replay_journal. Use False when only reading the tournament
+        without holding an exclusive lock on it.
+    """
+    path = Path(path or pynewood.constants.DEFAULT_SAVE_PATH)
+    tournament_path = _find_saved_tournament(tournament_name, path)
+    if tournament_path.suffix == pynewood.constants.SAVE_FORMATS["npz"]:
+        from pynewood.columnar import read_columnar  # needs numpy
+
+        metadata, arrays = read_columnar(tournament_path, mmap=mmap)
+        cls = pn.get_tournament_types()[metadata["type"]]
+        tournament = cls._from_columns(metadata, arrays)
+        tournament.save_format = "npz"
+        tournament._restore_journal(metadata, path)
+    else:
+        with tournament_path.open("rb") as fi:
+            tournament = pickle.load(fi)
+    # replay journaled changes made since the snapshot was saved
+    journal = getattr(tournament, "journal", None)
+    if journal is not None:
+        journal.path = path / journal.path.name
+        replay_journal(tournament, recover=recover)
+    return tournament
+
+
+def replay_journal(tournament, recover: bool = True) -> int:
+    """
+    Apply the changes in a tournament's journal which it doesn't have yet,
+    as when another process has journaled changes to the same tournament.
+    Return the number of changes applied.
+
+    If recover is True a partly written final record is cut off the journal
+    so new records can be appended, which is only safe while no other
+    process can use the journal. Otherwise the journal is only read.
+    """
+    journal = tournament.journal
+    if recover:
+        records = journal.recover(after=journal.seq)
+    else:
+        records = list(journal.read(after=journal.seq))
+    # detach the journal so replayed changes aren't journaled again
+    tournament.journal = None
+    try:
+        for record in records:
+            tournament._replay(record)
+            journal.seq = record["seq"]
+            journal.pending += 1
+    finally:
+        tournament.journal = journal
+    return len(records)
 
 
 def delete_tournament(tournament_name: str, path=None):
     """ Delete a tournament if it exists. """
     base = Path(path or pynewood.constants.DEFAULT_SAVE_PATH)
-    path = base / f"{tournament_name}.pkl"
-    if path.exists():
-        path.unlink()
+    suffixes = list(pynewood.constants.SAVE_FORMATS.values()) + [".journal"]
+    for suffix in suffixes:
+        path = base / f"{tournament_name}{suffix}"
+        if path.exists():
+            path.unlink()
+    get_catalog(base).remove(tournament_name)
 
 
 class TournamentOption:
@@ -64,6 +159,10 @@ class TournamentOption:
         #     assert self.validator(value, instance=instance)
         # set attr if they pass or are not applicable
         setattr(instance, self.name, value)
+        # changing an option changes the tournament
+        touch = getattr(instance, "_touch", None)
+        if touch is not None:
+            touch()
 
     def __get__(self, instance, owner):
         return getattr(instance, self.name)
@@ -1,12 +1,21 @@
 """
 tests for pynewood
 """
+import random
+import string
 import sys
 from os.path import dirname
 
 import pytest
 
 from app import app
+from app.routes import STORE
+from pynewood import LimitedRound
+from pynewood.utils import (
+    get_saved_tournament_names,
+    load_tournament,
+    delete_tournament,
+)
 
 # path jiggering so pynewood is importable
 up_two = dirname(dirname(__file__))
@@ -20,3 +29,35 @@ def client():
     app.config["TESTING"] = True
     app.config["WTF_CSRF_ENABLED"] = False
     return app.test_client()
+
+
+@pytest.fixture
+def make_tournament():
+    """ return a function creating a LimitedRound of racer_0, racer_1, ... """
+
+    def _make_tournament(players, name, **kwargs):
+        racers = [f"racer_{x}" for x in range(players)]
+        return LimitedRound(racers, name=name, **kwargs)
+
+    return _make_tournament
+
+
+@pytest.fixture
+def tourn_name():
+    """ return a random tournament name. """
+    return "".join([random.choice(string.ascii_letters) for _ in range(10)])
+
+
+@pytest.fixture
+def tournament(client, tourn_name):
+    """ Create the north 40 tournament, return loaded object. """
+    delete_tournament(tourn_name)
+    assert tourn_name not in get_saved_tournament_names()
+    tour_type = "LimitedRound"
+    url = f"/create_tournament_{tour_type}_{tourn_name}"
+    data = dict(players_per_round=4, number_of_plays=2)
+    client.post(url, data=data, follow_redirects=True)
+    assert tourn_name in get_saved_tournament_names()
+    yield load_tournament(tourn_name)
+    STORE.discard(tourn_name)
+    delete_tournament(tourn_name)
@@ -0,0 +1,179 @@
+"""
+Tests for the json api and event stream.
+"""
+import json
+
+import pytest
+
+from app.events import CHANGES
+from app.routes import STORE
+
+
+def read_event(chunks):
+    """ return the name and data of the next event, skipping heartbeats """
+    for chunk in chunks:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if text.startswith(":"):
+            continue
+        fields = dict(line.split(": ", 1) for line in text.strip().splitlines())
+        return fields["event"], json.loads(fields["data"])
+
+
+def enter_heat(client, name):
+    """ submit times for the next heat through the web page """
+    players = client.get(f"/api/tournament/{name}/matchups").get_json()
+    data = {f"player{num}": 2.0 + num for num in range(len(players["matchups"][0]))}
+    client.post(f"/tournament_{name}", data=data)
+
+
+class TestApi:
+    """ Tests for the json endpoints. """
+
+    def test_matchups(self, client, tournament):
+        """ the matchups should match the tournament's """
+        rv = client.get(f"/api/tournament/{tournament.name}/matchups")
+        assert rv.status_code == 200
+        assert rv.get_json()["matchups"] == tournament.get_next_matchups(2)
+        rv = client.get(f"/api/tournament/{tournament.name}/matchups?n=3")
+        assert rv.get_json()["matchups"] == tournament.get_next_matchups(3)
+
+    def test_standings(self, client, tournament):
+        """ standings should hold a row for each player with times """
+        url = f"/api/tournament/{tournament.name}/standings"
+        assert client.get(url).get_json()["standings"] == []
+        enter_heat(client, tournament.name)
+        standings = client.get(url).get_json()["standings"]
+        assert [x["rank"] for x in standings] == [1, 2, 3, 4]
+        assert standings[0]["min"] == 2.0
+        assert standings[0]["std"] is None  # one time has no std
+
+    def test_progress(self, client, tournament):
+        """ progress should follow the heats entered """
+        url = f"/api/tournament/{tournament.name}/progress"
+        progress = client.get(url).get_json()
+        assert progress["heat"] == 0
+        assert progress["total_heats"] == tournament.total_heats
+        enter_heat(client, tournament.name)
+        progress = client.get(url).get_json()
+        assert progress["heat"] == progress["completed_heats"] == 1
+
+    def test_store_stats(self, client, tournament):
+        """ the store should report its cache counters """
+        stats = client.get("/api/store").get_json()
+        assert {"size", "hits", "misses", "evictions"} <= set(stats)
+        client.get(f"/api/tournament/{tournament.name}/progress")
+        assert client.get("/api/store").get_json()["hits"] > stats["hits"]
+
+    def test_unknown_tournament(self, client):
+        """ unknown tournaments should return 404 """
+        rv = client.get("/api/tournament/not_a_tournament/progress")
+        assert rv.status_code == 404
+
+
+class TestEnterHeat:
+    """ Tests for entering times through the api. """
+
+    def post(self, client, name, heat, times):
+        url = f"/api/tournament/{name}/heats/{heat}"
+        return client.post(url, json=dict(times=times))
+
+    def test_matchup_heats(self, client, tournament):
+        """ matchups should come with their heat numbers """
+        rv = client.get(f"/api/tournament/{tournament.name}/matchups")
+        assert rv.get_json()["heats"] == [0, 1]
+
+    def test_enter(self, client, tournament):
+        """ posted times should be entered for the heat """
+        rv = self.post(client, tournament.name, 1, [3.0, 3.1, 3.2, 3.3])
+        assert rv.status_code == 200 and rv.get_json()["entered"]
+        with STORE.read(tournament.name) as tour:
+            assert [x for _, x in tour.get_heat(1)] == [3.0, 3.1, 3.2, 3.3]
+            assert tour.completed_heats == 1
+
+    def test_get(self, client, tournament):
+        """ a heat's players and times should be returned, None if not entered """
+        self.post(client, tournament.name, 1, [3.0, 3.1, 3.2, 3.3])
+        url = f"/api/tournament/{tournament.name}/heats"
+        entered, missing = client.get(f"{url}/1").get_json(), client.get(f"{url}/0")
+        assert entered["times"] == [3.0, 3.1, 3.2, 3.3]
+        assert len(entered["players"]) == 4
+        assert missing.get_json()["times"] == [None] * 4
+        assert client.get(f"{url}/1000").status_code == 404
+
+    def test_retry(self, client, tournament):
+        """ posting a heat again should change nothing """
+        times = [3.0, 3.1, 3.2, 3.3]
+        first = self.post(client, tournament.name, 0, times).get_json()
+        rv = self.post(client, tournament.name, 0, times)
+        assert rv.status_code == 200
+        assert not rv.get_json()["entered"]
+        assert rv.get_json()["version"] == first["version"]
+        with STORE.read(tournament.name) as tour:
+            assert tour.completed_heats == 1
+
+    def test_conflict(self, client, tournament):
+        """ other times for a heat already entered should be refused """
+        self.post(client, tournament.name, 0, [3.0, 3.1, 3.2, 3.3])
+        rv = self.post(client, tournament.name, 0, [4.0, 3.1, 3.2, 3.3])
+        assert rv.status_code == 409
+        assert rv.get_json()["times"] == [3.0, 3.1, 3.2, 3.3]
+
+    @pytest.mark.parametrize(
+        "heat, times, status",
+        [(0, [3.0], 400), (0, [-1, 3, 3, 3], 400), (0, ["a", 3, 3, 3], 400)]
+        + [(1000, [3.0, 3.0, 3.0, 3.0], 404)],
+    )
+    def test_invalid(self, client, tournament, heat, times, status):
+        """ invalid times or heats should be refused """
+        assert self.post(client, tournament.name, heat, times).status_code == status
+        with STORE.read(tournament.name) as tour:
+            assert tour.completed_heats == 0
+
+    def test_not_json(self, client, tournament):
+        """ form posts should be refused """
+        url = f"/api/tournament/{tournament.name}/heats/0"
+        assert client.post(url, data=dict(times=3)).status_code == 400
+        rv = self.post(client, "not_a_tournament", 0, [1.0])
+        assert rv.status_code == 404
+
+
+class TestEvents:
+    """ Tests for the server-sent event stream. """
+
+    @pytest.fixture
+    def events(self, client, tournament):
+        """ return an iterator of event stream chunks """
+        url = f"/api/tournament/{tournament.name}/events"
+        rv = client.get(url, buffered=False)
+        assert rv.mimetype == "text/event-stream"
+        yield iter(rv.response)
+        rv.close()
+
+    def test_state_then_updates(self, client, tournament, events):
+        """ the full state should be sent first and then only changes """
+        event, state = read_event(events)
+        assert event == "state"
+        assert state["progress"]["heat"] == 0
+        assert state["matchups"] == tournament.get_next_matchups(2)
+        enter_heat(client, tournament.name)
+        event, delta = read_event(events)
+        assert event == "update"
+        assert delta["version"] > state["version"]
+        assert delta["progress"]["heat"] == 1
+        assert len(delta["standings"]["changed"]) == 4
+        # undoing removes those players from the standings
+        client.post(f"/tournament_{tournament.name}", data=dict(undo="Undo"))
+        event, delta = read_event(events)
+        assert sorted(delta["standings"]["removed"]) == sorted(state["matchups"][0])
+        assert delta["matchups"] == state["matchups"]
+
+    def test_unchanged_parts_left_out(self, client, tournament, events):
+        """ parts of the state which didn't change should not be sent """
+        read_event(events)
+        with STORE.write(tournament.name) as tour:
+            tour.rank_stat = "mean"  # a new version with the same state
+            tour.set_times({tour.get_next_matchups(1)[0][0]: 1.0})
+        CHANGES.notify()
+        event, delta = read_event(events)
+        assert "matchups" not in delta
+        assert len(delta["standings"]["changed"]) == 1
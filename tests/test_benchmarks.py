@@ -0,0 +1,62 @@
+"""
+Smoke tests for the benchmark suite.
+"""
+import json
+
+import pytest
+
+from benchmarks.bench_core import BENCHMARKS, compare, main, run_benchmarks
+from benchmarks.load_test import run_load_test
+
+
+class TestBenchmarks:
+    """ Make sure the benchmarks run on a tiny grid. """
+
+    def test_run(self):
+        """ each benchmark should produce a timing """
+        results = run_benchmarks(
+            players=(10,), players_at_once=(4,), number_of_plays=(2,), repeat=1
+        )
+        assert {x["benchmark"] for x in results} == set(BENCHMARKS)
+        assert all(x["seconds"] >= 0 for x in results)
+
+    def test_output_and_compare(self, tmpdir):
+        """ results should be written to json and comparable """
+        path = tmpdir / "results.json"
+        args = ["--players", "10", "--players-at-once", "4"]
+        args += ["--number-of-plays", "2", "--storage", "array", "--repeat", "1"]
+        args += ["--benchmarks", "init", "get_ratings", "--output", str(path)]
+        assert main(args) == 0
+        with open(path) as fi:
+            results = json.load(fi)
+        assert len(results["results"]) == 2
+        comparison = compare(results, results)
+        assert (comparison["ratio"] == 1).all()
+
+
+class TestLoadTest:
+    """ Make sure the load test runs against a local server. """
+
+    @pytest.mark.parametrize("lean", [False, True])
+    def test_run(self, lean):
+        """ a short run should enter every posted time exactly once """
+        summary = run_load_test(
+            operators=2, displays=2, players=12, heats=3, lean=lean
+        )
+        assert summary["lost"] == 0 and summary["duplicated"] == 0
+        posts = summary["requests"]["post_heat"]
+        assert posts["requests"] == 6 and posts["error_rate"] == 0
+        assert summary["requests"]["display"]["requests"] > 0
+        assert {"p50", "p95", "p99"} <= set(posts)
+
+    @pytest.mark.parametrize("lean", [False, True])
+    def test_shared(self, lean):
+        """ operators racing for the same heats should enter each once """
+        summary = run_load_test(
+            operators=4, displays=1, players=12, tournaments=1, lean=lean
+        )
+        assert summary["lost"] == 0 and summary["duplicated"] == 0
+        assert summary["requests"]["post_heat"]["error_rate"] == 0
+        posts = summary["requests"]["post_heat"]["requests"]
+        # every heat was entered once, the other posts were conflicts
+        assert posts - summary["conflicts"] == 6
@@ -0,0 +1,144 @@
+"""
+Tests for the catalog of saved tournaments.
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+import pynewood.catalog
+from pynewood import LimitedRound
+from pynewood.catalog import Catalog, get_catalog
+from pynewood.utils import (
+    delete_tournament,
+    get_saved_tournament_names,
+    list_saved_tournaments,
+)
+
+
+@pytest.fixture
+def save_path(make_tournament, tmp_path):
+    """ return a directory with a few saved tournaments """
+    for num in range(3):
+        tour = make_tournament(6, f"tour_{num}", number_of_plays=2)
+        tour.set_times([3.0] * 4, heat=0)
+        tour.save(tmp_path, format="npz" if num else "pickle")
+    return tmp_path
+
+
+@pytest.fixture
+def count_reads(monkeypatch):
+    """ count the number of saved tournaments read by catalogs """
+    reads = []
+    describe = pynewood.catalog.describe_saved_file
+
+    def _describe(path):
+        reads.append(path)
+        return describe(path)
+
+    monkeypatch.setattr(pynewood.catalog, "describe_saved_file", _describe)
+    return reads
+
+
+class TestCatalog:
+    """ Tests for indexing saved tournaments. """
+
+    def test_entries(self, save_path):
+        """ the catalog should describe each tournament """
+        entries = list_saved_tournaments(save_path)
+        assert [x["name"] for x in entries] == ["tour_0", "tour_1", "tour_2"]
+        assert all(x["type"] == "LimitedRound" for x in entries)
+        assert all(x["progress"]["heat"] == 1 for x in entries)
+        assert all(x["progress"]["total_heats"] == 3 for x in entries)
+
+    def test_no_scan_after_save(self, save_path, count_reads):
+        """ a new catalog should read the index rather than each file """
+        assert Catalog(save_path).names() == ["tour_0", "tour_1", "tour_2"]
+        assert not count_reads
+
+    def test_delete(self, save_path):
+        """ deleted tournaments should be removed from the catalog """
+        delete_tournament("tour_1", path=save_path)
+        assert get_saved_tournament_names(save_path) == ["tour_0", "tour_2"]
+
+    def test_external_changes(self, save_path, count_reads):
+        """ files copied into the directory should be found """
+        shutil.copy(save_path / "tour_1.npz", save_path / "copied.npz")
+        names = get_saved_tournament_names(save_path)
+        assert names == ["copied", "tour_0", "tour_1", "tour_2"]
+        # only the new file should have been read
+        assert count_reads == [save_path / "copied.npz"]
+
+    def test_corrupt_catalog(self, save_path):
+        """ a corrupt catalog should be rebuilt """
+        (save_path / "catalog.json").write_text('{"version": 1, "tourn')
+        catalog = Catalog(save_path)
+        assert catalog.names() == ["tour_0", "tour_1", "tour_2"]
+        contents = json.loads((save_path / "catalog.json").read_text())
+        assert set(contents["tournaments"]) == {"tour_0", "tour_1", "tour_2"}
+
+    def test_shared_catalog(self, save_path):
+        """ catalogs should be shared by directory """
+        assert get_catalog(save_path) is get_catalog(save_path / ".")
+
+    def test_no_scan_on_save(self, save_path, count_reads, monkeypatch):
+        """ saving should update the catalog without rescanning the directory """
+        rebuilds = []
+        monkeypatch.setattr(Catalog, "rebuild", lambda self: rebuilds.append(self))
+        tour = LimitedRound.load("tour_0", save_path)
+        for heat in range(1, 3):
+            tour.set_times([4.0] * 4, heat=heat)
+            tour.save(save_path)
+        entries = {x["name"]: x for x in list_saved_tournaments(save_path)}
+        assert entries["tour_0"]["progress"]["heat"] == 3
+        # nor should a catalog opened by another process
+        assert Catalog(save_path).names() == ["tour_0", "tour_1", "tour_2"]
+        assert not rebuilds and not count_reads
+        assert not list(save_path.glob("*.tmp"))
+
+    def test_concurrent_threads(self, make_tournament, tmp_path):
+        """ threads saving at once should all be recorded """
+        tours = [make_tournament(6, f"thread_{x}") for x in range(8)]
+        errors = []
+
+        def save(tour):
+            try:
+                for _ in range(5):
+                    tour.save(tmp_path)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=save, args=(x,)) for x in tours]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors
+        expected = sorted(x.name for x in tours)
+        assert Catalog(tmp_path)._load().keys() == set(expected)
+        assert not list(tmp_path.glob("*.tmp"))
+
+    def test_concurrent_processes(self, tmp_path):
+        """ processes saving at once should not drop each other's entries """
+        code = (
+            "import sys; from pynewood import LimitedRound; "
+            "players = [f'racer_{x}' for x in range(6)]; "
+            "[LimitedRound(players, name=f'{sys.argv[1]}_{x}').save(sys.argv[2]) "
+            "for x in range(10)]"
+        )
+        env = dict(os.environ, PYTHONPATH=str(Path(__file__).parent.parent))
+        processes = [
+            subprocess.Popen(
+                [sys.executable, "-c", code, f"proc{x}", str(tmp_path)],
+                cwd=tmp_path,  # for the backup csv
+                env=env,
+            )
+            for x in range(4)
+        ]
+        assert all(x.wait() == 0 for x in processes)
+        assert len(Catalog(tmp_path)._load()) == 40
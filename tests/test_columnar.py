@@ -0,0 +1,93 @@
+"""
+Tests for saving tournaments in the columnar format.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from pynewood import LimitedRound
+from pynewood.utils import (
+    get_saved_tournament_names,
+    load_tournament,
+    read_tournament_info,
+)
+
+
+@pytest.fixture(params=["frame", "array"])
+def tournament(make_tournament, request):
+    """ return a tournament with a few heats entered """
+    tour = make_tournament(
+        10, "columnar", number_of_plays=3, seed=2, storage=request.param
+    )
+    for heat in range(3):
+        tour.set_times(np.arange(4) + 3.5, heat=heat)
+    return tour
+
+
+class TestColumnar:
+    """ Tests for the npz format. """
+
+    @pytest.mark.parametrize("mmap", [False, True])
+    def test_round_trip(self, tournament, tmp_path, mmap):
+        """ the tournament should be the same after saving and loading """
+        tournament.save(tmp_path, format="npz")
+        assert (tmp_path / "columnar.npz").exists()
+        loaded = load_tournament(tournament.name, path=tmp_path, mmap=mmap)
+        pd.testing.assert_frame_equal(loaded.df, tournament.df)
+        assert loaded.players == list(tournament.players)
+        assert loaded.storage == tournament.storage
+        assert loaded.get_next_matchups(3) == tournament.get_next_matchups(3)
+        # the loaded tournament should still accept times
+        loaded.set_times(np.arange(4) + 3.0, heat=3)
+        assert loaded.heat == 4
+
+    @pytest.mark.parametrize("mmap", [False, True])
+    def test_history(self, tournament, tmp_path, mmap):
+        """ the history and undo stack should be saved with the times """
+        tournament.undo(2)
+        tournament.redo()
+        tournament.save(tmp_path, format="npz")
+        loaded = load_tournament(tournament.name, path=tmp_path, mmap=mmap)
+        pd.testing.assert_frame_equal(loaded.get_history(), tournament.get_history())
+        for tour in (tournament, loaded):
+            tour.undo(2)
+        pd.testing.assert_frame_equal(loaded.df, tournament.df)
+        for tour in (tournament, loaded):
+            tour.redo(2)
+        pd.testing.assert_frame_equal(loaded.df, tournament.df)
+
+    def test_info(self, tournament, tmp_path):
+        """ the metadata can be read without loading the tournament """
+        tournament.save(tmp_path, format="npz")
+        info = read_tournament_info(tournament.name, path=tmp_path)
+        assert info["type"] == "LimitedRound"
+        assert info["options"]["number_of_plays"] == 3
+        assert info["progress"]["heat"] == 3
+        assert info["progress"]["entered"] == 12
+
+    def test_change_format(self, tournament, tmp_path):
+        """ saving in a new format should replace the old file """
+        tournament.save(tmp_path)
+        tournament.save(tmp_path, format="npz")
+        assert not (tmp_path / "columnar.pkl").exists()
+        assert get_saved_tournament_names(tmp_path) == ["columnar"]
+
+    def test_journal(self, tournament, tmp_path):
+        """ journaled changes should be replayed onto a columnar snapshot """
+        tournament.save(tmp_path, format="npz")
+        tournament.use_journal(tmp_path, snapshot_every=0)
+        tournament.set_times(np.arange(4) + 3.0, heat=5)
+        tournament.journal.close()
+        loaded = load_tournament(tournament.name, path=tmp_path)
+        pd.testing.assert_frame_equal(loaded.df, tournament.df)
+
+    def test_non_str_players(self, tmp_path):
+        """ players which aren't str can't be saved as npz, but can be pickled """
+        tour = LimitedRound(["a", 2, "c", 4, "e"], name="mixed", seed=1)
+        with pytest.raises(TypeError, match="use pickle"):
+            tour.save(tmp_path, format="npz")
+        assert not list(tmp_path.iterdir())
+        tour.save(tmp_path)
+        loaded = load_tournament("mixed", path=tmp_path)
+        assert loaded.players == ["a", 2, "c", 4, "e"]
+        loaded.set_time(2, 1.0)
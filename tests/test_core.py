@@ -1,6 +1,11 @@
 """
 Tests for core structures.
 """
+import itertools
+import pickle
+import subprocess
+import sys
+import time
 from pathlib import Path
 
 import numpy as np
@@ -9,6 +14,8 @@ import pytest
 
 from pynewood import LimitedRound
 from pynewood.exceptions import InvalidTournamentError
+from pynewood.scheduling import has_self_matchup, make_schedule
+from pynewood.utils import get_saved_tournament_names, load_tournament
 
 random_state = np.random.RandomState(13)
 
@@ -38,6 +45,46 @@ class TestBasics:
             players = ["bob", "bill", "sue"]
             LimitedRound(players=players, name="sometest", players_at_once=4)
 
+    def test_lazy_import(self):
+        """ importing pynewood should not import pandas until it is used """
+        code = (
+            "import sys, pynewood; assert 'pandas' not in sys.modules; "
+            "pynewood.LimitedRound; assert 'pandas' in sys.modules"
+        )
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+    def test_load_baseline_pickle(self, player_list, tmp_path):
+        """ tournaments pickled when df was a plain attribute should load """
+        players = list(player_list)
+        df = pd.DataFrame(
+            dict(
+                player=players * 2,
+                round=np.repeat([0, 1], len(players)),
+                heat=np.arange(len(players) * 2) // 4,
+                time=[4.0] * 4 + [np.nan] * 12,
+            )
+        )
+        old = LimitedRound.__new__(LimitedRound)
+        old.__dict__.update(
+            name="old",
+            _players_per_round=4,
+            _number_of_plays=2,
+            players=players,
+            _rank_stat="min",
+            df=df,
+        )
+        with (tmp_path / "old.pkl").open("wb") as fi:
+            pickle.dump(old, fi)
+        assert get_saved_tournament_names(tmp_path) == ["old"]
+        tour = load_tournament("old", tmp_path)
+        assert tour.get_next_matchups(1) == [players[4:8]]
+        assert tour.completed_heats == 1
+        tour.set_times({x: 5.0 for x in players[4:8]})
+        tour.undo()
+        assert tour.completed_heats == 1
+        tour.save(tmp_path)
+        assert load_tournament("old", tmp_path).schedule_strategy == "random"
+
     def test_get_item(self, basic_limited_round, player_list):
         """ Tests for get items. """
         # and int should return a df of a particular round
@@ -52,6 +99,145 @@ class TestBasics:
         assert unique_players[0] == player_list[0]
 
 
+class TestScheduling:
+    """ Tests for assigning players to heats. """
+
+    @pytest.mark.parametrize("strategy", ["constructive", "random", "lane_balanced"])
+    def test_no_self_matchups(self, player_list, strategy):
+        """ no strategy should ever schedule a player against him/her self """
+        lr = LimitedRound(
+            player_list,
+            name="schedule_test",
+            players_at_once=3,
+            number_of_plays=5,
+            schedule_strategy=strategy,
+        )
+        heats = lr.df.groupby("heat")["player"].agg(list)
+        assert all(len(x) == len(set(x)) for x in heats)
+        assert (lr.df.player.value_counts() == 5).all()
+
+    def test_large_event(self):
+        """ the constructive scheduler should handle big events directly """
+        players = [f"racer_{x}" for x in range(317)]
+        sequence = make_schedule(players, 6, 6, seed=1)
+        assert len(sequence) == len(players) * 6
+        assert not has_self_matchup(sequence, 6)
+
+    def test_tight_event(self):
+        """ the constructive scheduler works with one more player than lanes """
+        sequence = make_schedule(["a", "b", "c", "d", "e"], 4, 20)
+        assert not has_self_matchup(sequence, 4)
+
+    def test_seed(self, player_list):
+        """ the same seed should always produce the same schedule """
+        first = make_schedule(player_list, 4, 3, seed=42)
+        second = make_schedule(player_list, 4, 3, seed=42)
+        assert first == second
+
+    def test_rounds(self, player_list):
+        """ the round should count how many times a player has played """
+        lr = LimitedRound(player_list, name="schedule_test", number_of_plays=3)
+        for _, df in lr.df.groupby("player"):
+            assert list(df["round"]) == [0, 1, 2]
+            assert df["heat"].is_monotonic_increasing
+
+    @pytest.mark.parametrize(
+        "players, lanes, plays",
+        [(20, 4, 4), (23, 4, 6), (37, 4, 4), (50, 4, 4), (37, 4, 5), (9, 3, 7)]
+        + [(5, 4, 20), (13, 5, 3), (101, 6, 12), (1000, 6, 6)],
+    )
+    @pytest.mark.parametrize("seed", [3, 8])
+    def test_lane_balanced(self, make_tournament, players, lanes, plays, seed):
+        """ each player should run each lane as evenly as possible """
+        lr = make_tournament(
+            players,
+            "lane_test",
+            players_at_once=lanes,
+            number_of_plays=plays,
+            schedule_strategy="lane_balanced",
+            seed=seed,
+        )
+        counts = lr.get_lane_counts()
+        assert (counts.sum(axis=1) == plays).all()
+        spread = (counts.max(axis=1) - counts.min(axis=1)).max()
+        # exactly even whenever the plays divide evenly over the lanes
+        assert spread <= (0 if plays % lanes == 0 else 1)
+
+    def test_lane_balanced_opponents(self):
+        """ players should meet each opponent at most once when possible """
+        players = [f"racer_{x}" for x in range(300)]
+        sequence = make_schedule(players, 4, 8, "lane_balanced", seed=1)
+        pairs = [
+            frozenset(pair)
+            for start in range(0, len(sequence), 4)
+            for pair in itertools.combinations(sequence[start : start + 4], 2)
+        ]
+        assert len(pairs) == len(set(pairs))
+
+    def test_lane_balanced_large_event(self):
+        """ the lane balanced scheduler should be fast for big events """
+        players = [f"racer_{x}" for x in range(500)]
+        start = time.perf_counter()
+        sequence = make_schedule(players, 6, 8, "lane_balanced", seed=1)
+        assert time.perf_counter() - start < 1
+        assert not has_self_matchup(sequence, 6)
+
+    def test_lanes(self, player_list):
+        """ the lane of an entry is its position within its heat """
+        lr = LimitedRound(player_list, name="schedule_test", players_at_once=4)
+        lanes = lr._entries.lanes
+        assert list(lanes[:8]) == [0, 1, 2, 3, 0, 1, 2, 3]
+        assert lr._entries[5].lane == 1
+
+
+class TestArrayStorage:
+    """ Tests for the compact array storage engine. """
+
+    @pytest.fixture
+    def tournaments(self, player_list):
+        """ return a frame and array tournament with the same schedule """
+        kwargs = dict(name="storage_test", number_of_plays=3, seed=7)
+        frame = LimitedRound(player_list, storage="frame", **kwargs)
+        array = LimitedRound(player_list, storage="array", **kwargs)
+        return frame, array
+
+    def test_same_df(self, tournaments):
+        """ both storage engines should produce the same dataframe """
+        frame, array = tournaments
+        pd.testing.assert_frame_equal(frame.df, array.df)
+
+    def test_same_state(self, tournaments):
+        """ both engines should track matchups and ratings the same way """
+        for tour in tournaments:
+            for player in tour.get_next_matchups(1)[0]:
+                tour.set_time(player, 2.5)
+            tour.set_time("joe", 3.0, round=2)
+        frame, array = tournaments
+        assert frame.get_next_matchups(4) == array.get_next_matchups(4)
+        pd.testing.assert_frame_equal(frame.get_ratings(), array.get_ratings())
+        assert frame.heat == array.heat
+
+    def test_compact(self, tournaments):
+        """ the array storage should use much less memory """
+        frame, array = tournaments
+        entries = array._entries
+        array_bytes = sum(
+            x.nbytes for x in (entries.codes, entries.rounds, entries.heats)
+        )
+        frame_bytes = frame.df.memory_usage(deep=True).sum()
+        assert array_bytes * 4 < frame_bytes
+
+    def test_entry_views(self, tournaments):
+        """ rows can be viewed without creating a dataframe """
+        _, array = tournaments
+        df = array.df
+        entry = array._entries[5]
+        assert not hasattr(entry, "__dict__")
+        assert entry.player == df.loc[5, "player"]
+        assert entry.heat == df.loc[5, "heat"]
+        assert np.isnan(entry.time)
+
+
 class TestLimitedRound1:
     number_of_plays = 3
     players_at_once = 4
@@ -104,6 +290,23 @@ class TestLimitedRound1:
         assert isinstance(matches, list)
         assert len(matches) == 3
 
+    def test_next_matchups_follow_entries(self, limited_round):
+        """ matchups should skip heats once all their times are entered """
+        first, second = limited_round.get_next_matchups(2)
+        for player in first:
+            limited_round.set_time(player, 1.0)
+        assert limited_round.get_next_matchups(1) == [second]
+        # undoing the heat should bring it back
+        limited_round.undo()
+        assert limited_round.get_next_matchups(2) == [first, second]
+
+    def test_next_matchups_match_dataframe(self, lr_partial_times):
+        """ the matchups should agree with the heats missing times in df """
+        df = lr_partial_times.df
+        missing = df[df.groupby("heat")["time"].transform(lambda x: x.isnull().any())]
+        expected = [list(x) for _, x in missing.groupby("heat")["player"]]
+        assert lr_partial_times.get_next_matchups(100) == expected
+
     def test_set_score(self, limited_round):
         """ ensure the setting score works """
         # set with an explicit round
@@ -123,6 +326,93 @@ class TestLimitedRound1:
         with pytest.raises(ValueError):
             limited_round.set_time("jeff", .4)
 
+    def test_set_time_cursor(self, limited_round):
+        """ times without a round should fill the first un-entered round """
+        df = limited_round.df
+        joe = df[df.player == "joe"]
+        limited_round.set_time("joe", 1.0, round=0)
+        limited_round.set_time("joe", 2.0)
+        assert df.loc[joe.index[1], "time"] == 2.0
+        # clearing the first round should make it the next one filled
+        limited_round._set_rows(joe.index[0], np.nan)
+        limited_round.set_time("joe", 3.0)
+        assert df.loc[joe.index[0], "time"] == 3.0
+
+    def test_set_time_bad_inputs(self, limited_round):
+        """ unknown players and rounds should raise ValueError """
+        with pytest.raises(ValueError):
+            limited_round.set_time("not_a_player", 1.0)
+        with pytest.raises(ValueError):
+            limited_round.set_time("joe", 1.0, round=self.number_of_plays)
+        for round in (1.5, "x", [1]):
+            with pytest.raises(ValueError):
+                limited_round.set_time("joe", 1.0, round=round)
+
+    def test_set_time_whole_rounds(self, limited_round):
+        """ rounds may be given as any whole number """
+        limited_round.set_time("joe", 1.0, round=1.0)
+        limited_round.set_time("joe", 2.0, round=np.int32(2))
+        df = limited_round.df
+        joe = df[df.player == "joe"].set_index("round")["time"]
+        assert joe[1] == 1.0 and joe[2] == 2.0
+
+    def test_set_times_heat(self, limited_round):
+        """ a whole heat can be set from a vector of lane times """
+        players = limited_round.get_next_matchups(1)[0]
+        limited_round.set_times([1.0, 2.0, 3.0, 4.0], heat=0)
+        df = limited_round.df
+        assert list(df.loc[df.heat == 0, "time"]) == [1.0, 2.0, 3.0, 4.0]
+        assert list(df.loc[df.heat == 0, "player"]) == players
+        with pytest.raises(ValueError):
+            limited_round.set_times([1.0, 2.0], heat=1)
+
+    def test_set_times_records(self, limited_round):
+        """ many heats can be set from a mapping or records """
+        matchups = limited_round.get_next_matchups(2)
+        limited_round.set_times({player: 1.5 for player in matchups[0]})
+        records = [(player, None, 2.5) for player in matchups[1]]
+        records.append(("joe", 2, 3.5))
+        limited_round.set_times(records)
+        df = limited_round.df
+        assert (df.loc[df.heat < 2, "time"] > 0).all()
+        joe = df[(df.player == "joe") & (df["round"] == 2)]
+        assert joe["time"].iloc[0] == 3.5
+
+    @pytest.mark.parametrize("dtype", [str, object])
+    def test_set_times_ndarray(self, limited_round, dtype):
+        """ records may be given as a 2d array, as read from a file """
+        records = np.array([("joe", 1, 1.5), ("jeff", 0, 2.5)], dtype=dtype)
+        limited_round.set_times(records)
+        df = limited_round.df
+        times = df.set_index(["player", "round"])["time"]
+        assert times["joe", 1] == 1.5
+        assert times["jeff", 0] == 2.5
+        assert df["time"].notnull().sum() == 2
+
+    def test_set_times_validates(self, limited_round):
+        """ a bad entry should leave the tournament unchanged """
+        bad_batches = [
+            [("joe", None, 1.0), ("jeff", None, -1.0)],
+            [("joe", None, 1.0), ("not_a_player", None, 1.0)],
+            [("joe", 0, 1.0), ("joe", 0, 2.0)],
+            [("joe", None, 1.0), ("jeff", None, np.nan)],
+            [("joe", None, 1.0), ("jeff", 1.5, 1.0)],
+            np.array([("joe", 0, 1.0), ("jeff", "x", 1.0)]),
+        ]
+        for batch in bad_batches:
+            with pytest.raises(ValueError):
+                limited_round.set_times(batch)
+        assert limited_round.df["time"].isnull().all()
+
+    def test_import_times(self, lr_with_times, limited_round, tmpdir):
+        """ times saved to a csv can be replayed into a tournament """
+        path = Path(tmpdir) / "log.csv"
+        lr_with_times.df.to_csv(path)
+        limited_round.import_times(path)
+        df = limited_round.df.set_index(["player", "round"]).sort_index()
+        expected = lr_with_times.df.set_index(["player", "round"]).sort_index()
+        assert np.allclose(df["time"], expected["time"])
+
     def test_empty_ratings(self, limited_round):
         """ ratings with no input times should return an empty list """
         ranks = limited_round.get_ratings()
@@ -162,6 +452,31 @@ class TestLimitedRound1:
         inds = df2.index[-4:]
         assert df2.loc[inds, "time"].isnull().all()
 
+    def test_progress(self, limited_round):
+        """ heat and completed heats should follow entries and undos """
+        df = limited_round.df
+
+        def check():
+            entered = df[df["time"].notnull()]
+            heat = entered["heat"].max() + 1 if len(entered) else 0
+            counts = entered.groupby("heat").size()
+            sizes = df.groupby("heat").size()
+            completed = (counts == sizes[counts.index]).sum()
+            assert limited_round.heat == heat
+            assert limited_round.completed_heats == completed
+
+        check()
+        limited_round.set_times([1.0] * 4, heat=2)
+        check()
+        limited_round.set_times([1.0] * 4, heat=0)
+        limited_round.set_time(df.loc[4, "player"], 2.0, round=df.loc[4, "round"])
+        check()
+        limited_round.undo()
+        check()
+        limited_round.undo(2)
+        check()
+        assert limited_round.total_heats == df["heat"].max() + 1
+
     def test_rounds(self, lr_with_times):
         df = lr_with_times.df.copy()
         heat = lr_with_times.heat
@@ -170,3 +485,177 @@ class TestLimitedRound1:
         # now undo one, make sure heat is one less
         lr_with_times.undo()
         assert lr_with_times.heat == heat - 1
+
+
+class TestUndoRedo:
+    """ Tests for undoing and redoing changes with the operation log. """
+
+    @pytest.fixture
+    def tour(self, player_list):
+        """ return a tournament with three heats entered one at a time """
+        tour = LimitedRound(player_list, name="undo_redo", number_of_plays=3)
+        for heat in range(3):
+            tour.set_times(randon_times[heat * 4 : heat * 4 + 4], heat=heat)
+        return tour
+
+    def test_undo_redo(self, tour):
+        """ undo should restore the previous times and redo reapply them """
+        full = tour.df.copy()
+        tour.set_time(full.loc[0, "player"], 1.0, round=full.loc[0, "round"])
+        changed = tour.df.copy()
+        tour.undo()
+        pd.testing.assert_frame_equal(tour.df, full)
+        tour.undo(2)
+        assert tour.df["time"].notnull().sum() == 4
+        assert tour.heat == 1
+        tour.redo(3)
+        pd.testing.assert_frame_equal(tour.df, changed)
+        assert tour.heat == 3
+        # nothing left to redo
+        tour.redo()
+        pd.testing.assert_frame_equal(tour.df, changed)
+
+    def test_new_change_clears_redo(self, tour):
+        """ a change after an undo can't be followed by a redo """
+        tour.undo()
+        tour.set_times([1.0] * 4, heat=4)
+        expected = tour.df.copy()
+        tour.redo()
+        pd.testing.assert_frame_equal(tour.df, expected)
+
+    def test_undo_heat(self, tour):
+        """ a single heat can be cleared, and that can be undone """
+        expected = tour.df.copy()
+        tour.undo_heat(1)
+        df = tour.df
+        assert df.loc[df["heat"] == 1, "time"].isnull().all()
+        assert df["time"].notnull().sum() == 8
+        heat_players = df.loc[df["heat"] == 1, "player"].tolist()
+        assert tour.get_next_matchups(1)[0] == heat_players
+        tour.undo()
+        pd.testing.assert_frame_equal(tour.df, expected)
+        with pytest.raises(ValueError):
+            tour.undo_heat(tour.total_heats)
+
+    def test_history(self, tour):
+        """ the history should record every change to each entry """
+        tour.undo()
+        tour.redo()
+        history = tour.get_history()
+        assert history["op"].tolist() == ["set"] * 12 + ["undo"] * 4 + ["redo"] * 4
+        assert history["operation"].max() == 4
+        last = history[history["operation"] == 4]
+        assert last["heat"].unique().tolist() == [2]
+        np.testing.assert_array_equal(last["new"], randon_times[8:12])
+        assert last["old"].isnull().all()
+        assert history["timestamp"].is_monotonic_increasing
+
+    def test_empty_history(self, player_list):
+        """ a tournament without changes should have an empty history """
+        tour = LimitedRound(player_list, name="no_history")
+        assert tour.get_history().empty
+
+    def test_recent_entries(self, tour):
+        """ only changes which entered times should count, oldest first """
+        tour.undo()
+        tour.redo()
+        recent = tour.get_recent_entries(10)
+        timestamps = [x.timestamp for x in tour._log.history]
+        assert recent == [(timestamps[x], 4) for x in (0, 1, 2, 4)]
+        assert tour.get_recent_entries(2) == recent[-2:]
+
+    @pytest.mark.parametrize("storage", ["frame", "array"])
+    def test_columns(self, player_list, storage):
+        """ the columns should match df without marking the tournament edited """
+        tour = LimitedRound(player_list, name="columns", storage=storage)
+        tour.set_times(randon_times[:4], heat=0)
+        version = tour.version
+        columns = tour.get_columns()
+        assert tour.remaining_entries == len(tour._entries) - 4
+        assert tour.version == version
+        df = tour.df
+        players = [tour.players[x] for x in columns["player"]]
+        assert players == df["player"].tolist()
+        for name in ("round", "heat", "time"):
+            np.testing.assert_array_equal(columns[name], df[name])
+        with pytest.raises(ValueError):
+            columns["time"][0] = 1.0
+
+    def test_version(self, tour):
+        """ the version should increase with each change """
+        versions = [tour.version]
+        tour.undo()
+        versions.append(tour.version)
+        tour.redo()
+        versions.append(tour.version)
+        tour.rank_stat = "mean"
+        versions.append(tour.version)
+        # the dataframe may be edited directly
+        tour.df.loc[0, "time"] = 1.0
+        versions.append(tour.version)
+        assert versions == sorted(set(versions))
+        assert tour.version == versions[-1]
+
+
+class TestAdjustedRatings:
+    """ Tests for ratings adjusted for lane and trend effects. """
+
+    lane_bias = np.array([0.0, 0.04, 0.08, -0.04])
+
+    @pytest.fixture
+    def skills(self):
+        """ return the true time of 40 players """
+        rng = np.random.default_rng(5)
+        return {f"racer_{x}": float(rng.normal(3, 0.1)) for x in range(40)}
+
+    def race(self, lr, skills, drift=0.0):
+        """ enter every heat, times depend on skill, lane and heat """
+        for heat in range(lr.total_heats):
+            players = lr.get_next_matchups(1)[0]
+            times = {
+                player: skills[player] + self.lane_bias[lane] + drift * heat
+                for lane, player in enumerate(players)
+            }
+            lr.set_times(times)
+
+    @pytest.fixture
+    def lr(self, skills):
+        """ return a lane balanced tournament """
+        return LimitedRound(
+            list(skills),
+            name="adjust_test",
+            number_of_plays=4,
+            schedule_strategy="lane_balanced",
+            seed=2,
+        )
+
+    def test_lane_effects(self, lr, skills):
+        """ the lane effects should be recovered, relative to the average """
+        self.race(lr, skills)
+        effects = lr.get_lane_effects()
+        expected = self.lane_bias - self.lane_bias.mean()
+        assert np.allclose(effects.to_numpy(), expected)
+
+    def test_adjusted_ranks(self, lr, skills):
+        """ adjusted times should rank players by their true times """
+        self.race(lr, skills, drift=0.001)
+        ratings = lr.get_ratings(adjusted=True, trend=True)
+        expected = sorted(skills, key=skills.get)
+        assert list(ratings.index) == expected
+        assert np.allclose(ratings["effect"], ratings["mean"])
+
+    def test_incremental(self, lr, skills):
+        """ updating the fit as times change should match refitting """
+        lr.get_ratings(adjusted=True)
+        self.race(lr, skills, drift=0.002)
+        lr.undo(3)
+        incremental = lr.get_ratings(adjusted=True, trend=True)
+        lr._lane_model = None
+        refit = lr.get_ratings(adjusted=True, trend=True)
+        pd.testing.assert_frame_equal(incremental, refit)
+
+    def test_unadjusted_unchanged(self, lr, skills):
+        """ the default ratings should still use the raw times """
+        self.race(lr, skills)
+        ratings = lr.get_ratings()
+        assert "effect" not in ratings.columns
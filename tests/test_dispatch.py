@@ -0,0 +1,112 @@
+"""
+Tests for running a tournament on several tracks.
+"""
+import pytest
+
+from pynewood.dispatch import HeatDispatcher
+
+
+class FakeClock:
+    """ A clock which only moves when told to. """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def tour(make_tournament):
+    """ return a tournament with 12 racers """
+    return make_tournament(12, "dispatched", number_of_plays=4, seed=3)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def dispatcher(tour, clock):
+    """ return a dispatcher for three tracks """
+    return HeatDispatcher(tour, tracks=["a", "b", "c"], clock=clock)
+
+
+class TestDispatch:
+    """ Tests for handing heats to tracks. """
+
+    def test_fills_tracks(self, dispatcher):
+        """ each free track should get a different heat """
+        assignments = dispatcher.dispatch_all()
+        assert [x.track for x in assignments] == ["a", "b", "c"]
+        assert len({x.heat for x in assignments}) == 3
+        assert dispatcher.free_tracks == []
+        assert dispatcher.dispatch() is None
+
+    def test_no_player_on_two_tracks(self, dispatcher):
+        """ running heats should never share a player """
+        for assignment in dispatcher.dispatch_all():
+            players = set(assignment.players)
+            others = [x for x in dispatcher.running.values() if x is not assignment]
+            assert all(players.isdisjoint(x.players) for x in others)
+
+    def test_out_of_order(self, dispatcher, tour):
+        """ results may come back in any order """
+        first, second = dispatcher.dispatch("a"), dispatcher.dispatch("b")
+        dispatcher.complete(second.heat, [1.0] * len(second.players))
+        assert tour.completed_heats == 1
+        assert first.heat in dispatcher.running
+        assert dispatcher.dispatch("b").track == "b"
+        dispatcher.complete(first.heat, [2.0] * len(first.players))
+        assert tour.completed_heats == 2
+
+    def test_runs_whole_tournament(self, dispatcher, tour, clock):
+        """ dispatching until done should enter every heat """
+        while tour.completed_heats < tour.total_heats:
+            assignments = dispatcher.dispatch_all()
+            clock.now += 30
+            for assignment in reversed(list(dispatcher.running.values())):
+                dispatcher.complete(assignment.heat, [3.0] * len(assignment.players))
+            assert assignments or not dispatcher.running
+        assert not tour.df["time"].isnull().any()
+        table = dispatcher.utilization()
+        assert table["heats"].sum() == tour.total_heats
+        assert (table["utilization"] <= 1).all()
+
+    def test_cancel(self, dispatcher):
+        """ a cancelled heat should be handed out again """
+        assignment = dispatcher.dispatch("a")
+        dispatcher.cancel(assignment.heat)
+        assert dispatcher.dispatch("b").heat == assignment.heat
+
+    def test_bad_times(self, dispatcher, tour):
+        """ invalid times should leave the heat running """
+        assignment = dispatcher.dispatch()
+        with pytest.raises(ValueError):
+            dispatcher.complete(assignment.heat, [1.0])
+        assert assignment.heat in dispatcher.running
+        with pytest.raises(ValueError):
+            dispatcher.complete(assignment.heat + 100, [1.0])
+
+    def test_busy_track(self, dispatcher):
+        """ a running track can't be given another heat """
+        dispatcher.dispatch("a")
+        with pytest.raises(ValueError):
+            dispatcher.dispatch("a")
+        with pytest.raises(ValueError):
+            dispatcher.dispatch("z")
+
+    def test_utilization(self, dispatcher, clock):
+        """ utilization is the fraction of time each track spent racing """
+        first = dispatcher.dispatch("a")
+        dispatcher.dispatch("b")
+        clock.now = 60
+        dispatcher.complete(first.heat, [1.0] * len(first.players))
+        clock.now = 120
+        table = dispatcher.utilization()
+        assert table.loc["a", "heats"] == 1
+        assert table.loc["a", "utilization"] == pytest.approx(0.5)
+        assert table.loc["b", "utilization"] == pytest.approx(1.0)
+        assert table.loc["c", "busy_seconds"] == 0
+        assert table.loc["a", "heats_per_hour"] == pytest.approx(30)
@@ -1,36 +1,17 @@
 """
 tests for flasky components
 """
-import random
-import string
+import subprocess
+import sys
+import threading
+from collections import OrderedDict
 
 import pytest
 
-from pynewood.utils import (
-    get_saved_tournament_names,
-    load_tournament,
-    delete_tournament,
-)
-
-
-@pytest.fixture
-def tourn_name():
-    """ return a random tournament name. """
-    return "".join([random.choice(string.ascii_letters) for _ in range(10)])
-
-
-@pytest.fixture
-def tournament(client, tourn_name):
-    """ Create the north 40 tournament, return loaded object. """
-    delete_tournament(tourn_name)
-    assert tourn_name not in get_saved_tournament_names()
-    tour_type = "LimitedRound"
-    url = f"/create_tournament_{tour_type}_{tourn_name}"
-    data = dict(players_per_round=4, number_of_plays=2)
-    client.post(url, data=data, follow_redirects=True)
-    assert tourn_name in get_saved_tournament_names()
-    yield load_tournament(tourn_name)
-    delete_tournament(tourn_name)
+import app.routes
+from app.cache import LRUCache
+from app.routes import RENDER_CACHE, STORE, make_up_first_form
+from pynewood.utils import get_saved_tournament_names, load_tournament
 
 
 class TestIndex:
@@ -40,6 +21,27 @@ class TestIndex:
         assert "200" in str(rv)
 
 
+class TestStartup:
+    """ Tests for keeping app startup fast. """
+
+    def test_no_heavy_imports(self):
+        """ importing the app should not import pandas or numpy """
+        code = (
+            "import sys, app; "
+            "assert not {'pandas', 'numpy'} & set(sys.modules), sys.modules"
+        )
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+    def test_default_players_reread(self, tmp_path, monkeypatch):
+        """ the default players should be read again after they change """
+        path = tmp_path / "players.txt"
+        path.write_text("bob\nbill")
+        monkeypatch.setattr(app.routes, "DEFAULT_PLAYER_PATH", path)
+        assert app.routes.get_default_players() == ["bob", "bill"]
+        path.write_text("sue")
+        assert app.routes.get_default_players() == ["sue"]
+
+
 class TestCreateTournament:
     def test_create_new_tournament(self, tournament):
         """ Create a new tournament with a different default name. """
@@ -103,3 +105,93 @@ class TestRunStandardTournmant:
         assert not df["time"].isnull().any()
         # Now undo and make sure last 4 where cleared
         df = self.current_df(name)
+
+
+class TestTimeEntry:
+    """ Tests for entering times through the tournament page. """
+
+    def test_form_classes_cached(self):
+        """ forms for the same number of lanes should share a class """
+        with app.routes.app.test_request_context():
+            first = make_up_first_form(["a", "b", "c", "d"], 0)
+            second = make_up_first_form(["e", "f", "g", "h"], 1)
+        assert type(first) is type(second)
+        assert first.player0.label.text == "a"
+        assert second.player0.label.text == "e"
+        assert second.heat.data == "1"
+
+    def test_repeated_post(self, client, tournament):
+        """ posting the same heat twice should only enter it once """
+        url = f"/tournament_{tournament.name}"
+        data = dict(heat="0", player0=2, player1=2, player2=2, player3=2)
+        assert client.post(url, data=data).status_code == 302
+        assert client.post(url, data=data).status_code == 302
+        with STORE.read(tournament.name) as tour:
+            assert tour.completed_heats == 1
+        rv = client.get(url)
+        assert b"Heat 0 was already entered" in rv.data
+
+    def test_post_does_not_render(self, client, tournament):
+        """ a successful post should not render the standings """
+        url = f"/tournament_{tournament.name}"
+        misses = RENDER_CACHE.misses
+        data = dict(heat="0", player0=2, player1=2, player2=2, player3=2)
+        assert client.post(url, data=data).status_code == 302
+        assert RENDER_CACHE.misses == misses
+
+
+class TestPageCache:
+    """ Tests for caching rendered tournament pages. """
+
+    def test_not_modified(self, client, tournament):
+        """ an unchanged page should not be sent again """
+        url = f"/tournament_{tournament.name}"
+        rv = client.get(url)
+        assert rv.status_code == 200
+        etag = rv.headers["ETag"]
+        rv = client.get(url, headers={"If-None-Match": etag})
+        assert rv.status_code == 304
+        assert rv.headers["ETag"] == etag
+        # entering times changes the page
+        TestRunStandardTournmant.submit_times(tournament.name, client)
+        rv = client.get(url, headers={"If-None-Match": etag})
+        assert rv.status_code == 200
+        assert rv.headers["ETag"] != etag
+
+    def test_rendered_state_cached(self, client, tournament):
+        """ the standings should be rendered once per version """
+        url = f"/tournament_{tournament.name}"
+        client.get(url)
+        hits = RENDER_CACHE.hits
+        client.get(url)
+        assert RENDER_CACHE.hits == hits + 1
+
+    def test_lru_cache(self):
+        """ the least recently used item should be discarded when full """
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get("a") == 1
+        cache.put("c", 3)
+        assert "b" not in cache and "a" in cache and "c" in cache
+        assert cache.get("b") is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_lru_cache_threads(self):
+        """ a put from another thread shouldn't evict a key while it is read """
+        cache = LRUCache(1)
+        cache.put("a", 1)
+        putter = threading.Thread(target=cache.put, args=("b", 2))
+
+        class Interrupted(OrderedDict):
+            def __getitem__(self, key):
+                value = super().__getitem__(key)
+                # the put waits for the get, so don't wait long for it here
+                putter.start()
+                putter.join(0.1)
+                return value
+
+        cache._data = Interrupted(cache._data)
+        assert cache.get("a") == 1
+        putter.join()
+        assert "b" in cache and "a" not in cache
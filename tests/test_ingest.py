@@ -0,0 +1,138 @@
+"""
+Tests for streaming timer results into a tournament.
+"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from pynewood.exceptions import TimerProtocolError
+from pynewood.ingest import FakeTimer, TimerIngestor, parse_line
+
+
+@pytest.fixture
+def tour(make_tournament):
+    """ return a tournament of 10 racers, 4 lanes """
+    return make_tournament(10, "ingested", number_of_plays=2, seed=4)
+
+
+async def _ingest(ingestor, lines):
+    """ submit lines, wait for them to be committed and return the replies """
+    runner = asyncio.ensure_future(ingestor.run())
+    try:
+        replies = [await ingestor.submit(x) for x in lines]
+        await ingestor.join()
+    finally:
+        runner.cancel()
+    return replies
+
+
+def ingest(ingestor, lines):
+    return asyncio.run(_ingest(ingestor, lines))
+
+
+class TestParseLine:
+    """ Tests for the timer line protocol. """
+
+    def test_numbered_lanes(self):
+        result = parse_line("#12 1=3.1 2=3.25 3=.9\n")
+        assert result.result_id == "12"
+        assert result.times == {0: 3.1, 1: 3.25, 2: 0.9}
+
+    def test_lettered_lanes(self):
+        result = parse_line("A=3.1 b=3.2")
+        assert result.result_id is None
+        assert result.times == {0: 3.1, 1: 3.2}
+
+    @pytest.mark.parametrize(
+        "line", ["", "#1", "1=3.1 1=3.2", "0=3.1", "1=fast", "#a-b 1=3.0", "1:3.0"]
+    )
+    def test_invalid(self, line):
+        with pytest.raises(TimerProtocolError):
+            parse_line(line)
+
+
+class TestIngestor:
+    """ Tests for committing timer results. """
+
+    def test_enters_heats_in_order(self, tour):
+        """ each result should fill the next heat, lanes in matchup order """
+        matchups = tour.get_next_matchups(2)
+        lines = ["#1 1=3.1 2=3.2 3=3.3 4=3.4", "#2 A=4 B=5 C=6 D=7"]
+        ingest(TimerIngestor(tour), lines)
+        df = tour.df.set_index(["player", "round"])["time"]
+        assert [df[(x, 0)] for x in matchups[0]] == [3.1, 3.2, 3.3, 3.4]
+        assert [df[(x, 0)] for x in matchups[1]] == [4, 5, 6, 7]
+        assert tour.completed_heats == 2
+
+    def test_duplicates(self, tour):
+        """ repeated ids, and lines repeated soon after, are dropped """
+        ingestor = TimerIngestor(tour)
+        lines = ["#1 1=3 2=3 3=3 4=3", "#1 1=3 2=3 3=3 4=3", "1=2 2=2 3=2 4=2"]
+        replies = ingest(ingestor, lines + lines[-1:])
+        assert replies == ["queued", "duplicate", "queued", "duplicate"]
+        assert ingestor.committed == 2
+        assert tour.completed_heats == 2
+
+    def test_missing_lane(self, tour):
+        """ a result without a time for every lane in the heat is rejected """
+        ingestor = TimerIngestor(tour)
+        ingest(ingestor, ["1=3 2=3 3=3"])
+        assert ingestor.rejected == 1
+        assert tour.completed_heats == 0
+        assert "lanes [4]" in ingestor.errors[-1]
+
+    def test_short_last_heat(self, tour):
+        """ lanes past the end of a short heat are ignored """
+        ingestor = TimerIngestor(tour)
+        lines = [f"#{x} 1=3 2=3 3=3 4=3" for x in range(tour.total_heats)]
+        ingest(ingestor, lines)
+        assert ingestor.committed == tour.total_heats
+        assert not np.isnan(tour.df["time"]).any()
+
+    def test_batches(self, tour):
+        """ queued results should be committed together """
+        counts = []
+        ingestor = TimerIngestor(tour, batch_size=10, on_commit=counts.append)
+        ingest(ingestor, [f"#{x} 1=3 2=3 3=3 4=3" for x in range(4)])
+        assert sum(counts) == 4
+        assert ingestor.batches < 4
+
+    def test_backpressure(self, tour):
+        """ submitting should wait while the queue is full """
+        ingestor = TimerIngestor(tour, queue_size=1)
+
+        async def fill():
+            await ingestor.submit("#1 1=3 2=3 3=3 4=3")
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(ingestor.submit("#2 1=3 2=3 3=3 4=3"), 0.05)
+
+        asyncio.run(fill())
+        assert ingestor.queue.qsize() == 1
+
+
+class TestFakeTimer:
+    """ Tests for the fake timer and TCP server. """
+
+    def test_over_tcp(self, tour):
+        """ a fake timer sending results should fill the tournament """
+        ingestor = TimerIngestor(tour)
+        timer = FakeTimer(lanes=4, repeat=0.3, seed=1)
+
+        async def race():
+            server = await ingestor.serve("127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            runner = asyncio.ensure_future(ingestor.run())
+            try:
+                replies = await timer.send("127.0.0.1", port, tour.total_heats)
+                await ingestor.join()
+            finally:
+                runner.cancel()
+                server.close()
+                await server.wait_closed()
+            return replies
+
+        replies = asyncio.run(race())
+        assert replies.count("queued") == tour.total_heats
+        assert ingestor.duplicates == replies.count("duplicate")
+        assert tour.completed_heats == tour.total_heats
@@ -0,0 +1,93 @@
+"""
+Tests for journaled tournaments.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from pynewood.utils import load_tournament
+
+
+@pytest.fixture
+def journaled(make_tournament, tmp_path):
+    """ return a journaled tournament """
+    tour = make_tournament(9, "journaled", number_of_plays=3, seed=1)
+    tour.use_journal(tmp_path, snapshot_every=0)
+    yield tour
+    tour.journal.close()
+
+
+def enter_heats(tour, heats):
+    """ enter random times for the next few heats """
+    for _ in range(heats):
+        tour.set_times({x: np.random.rand() + 3 for x in tour.get_next_matchups(1)[0]})
+
+
+class TestJournal:
+    """ Tests for journaling changes instead of saving. """
+
+    def test_load_replays_journal(self, journaled, tmp_path):
+        """ changes made since the last save should be loaded """
+        enter_heats(journaled, 3)
+        journaled.undo()
+        journaled.set_time("racer_2", 2.0, round=2)
+        loaded = load_tournament(journaled.name, path=tmp_path)
+        pd.testing.assert_frame_equal(loaded.df, journaled.df)
+        assert loaded.get_next_matchups(2) == journaled.get_next_matchups(2)
+
+    def test_snapshot(self, journaled, tmp_path):
+        """ a snapshot should be saved and the journal cleared periodically """
+        journaled.journal.snapshot_every = 2
+        enter_heats(journaled, 3)
+        assert journaled.journal.pending == 1
+        assert len(list(journaled.journal.read())) == 1
+        loaded = load_tournament(journaled.name, path=tmp_path)
+        pd.testing.assert_frame_equal(loaded.df, journaled.df)
+
+    def test_replay_skips_saved_records(self, journaled, tmp_path):
+        """ records already in the snapshot should not be applied again """
+        enter_heats(journaled, 2)
+        journal_text = journaled.journal.path.read_text()
+        journaled.save(tmp_path)
+        # simulate a crash after saving but before the journal was cleared
+        journaled.journal.path.write_text(journal_text)
+        journaled.undo()
+        loaded = load_tournament(journaled.name, path=tmp_path)
+        pd.testing.assert_frame_equal(loaded.df, journaled.df)
+
+    def test_torn_write(self, journaled, tmp_path):
+        """ a partly written final record should be ignored """
+        enter_heats(journaled, 2)
+        expected = journaled.df.copy()
+        with journaled.journal.path.open("a") as fi:
+            fi.write('{"op":"set","rows":[')
+        loaded = load_tournament(journaled.name, path=tmp_path)
+        pd.testing.assert_frame_equal(loaded.df, expected)
+        # the loaded tournament should be able to keep journaling
+        enter_heats(loaded, 1)
+        loaded.journal.close()
+        reloaded = load_tournament(journaled.name, path=tmp_path)
+        pd.testing.assert_frame_equal(reloaded.df, loaded.df)
+
+    def test_replay_undo_redo(self, journaled, tmp_path):
+        """ undos and redos should be replayed with the undo stack """
+        enter_heats(journaled, 3)
+        journaled.undo(2)
+        journaled.redo()
+        loaded = load_tournament(journaled.name, path=tmp_path)
+        pd.testing.assert_frame_equal(loaded.df, journaled.df)
+        # the loaded tournament should be able to undo and redo the same way
+        loaded.journal = None
+        for tour in (journaled, loaded):
+            tour.undo(2)
+        pd.testing.assert_frame_equal(loaded.df, journaled.df)
+        for tour in (journaled, loaded):
+            tour.redo(2)
+        pd.testing.assert_frame_equal(loaded.df, journaled.df)
+
+    def test_replay_timestamps(self, journaled, tmp_path):
+        """ replayed changes should keep the time they were made """
+        enter_heats(journaled, 2)
+        journaled.undo()
+        loaded = load_tournament(journaled.name, path=tmp_path)
+        pd.testing.assert_frame_equal(loaded.get_history(), journaled.get_history())
@@ -0,0 +1,116 @@
+"""
+Tests for recording and serving metrics.
+"""
+import pytest
+
+from pynewood.metrics import METRICS, Metrics, size_label
+
+
+@pytest.fixture
+def metrics():
+    """ enable the global metrics for a test, then reset them """
+    METRICS.reset()
+    METRICS.enable()
+    yield METRICS
+    METRICS.disable()
+    METRICS.reset()
+
+
+@pytest.fixture
+def tour(make_tournament):
+    return make_tournament(12, "measured", number_of_plays=2, seed=1)
+
+
+class TestMetrics:
+    """ Tests for the metrics registry. """
+
+    def test_disabled(self):
+        """ nothing should be recorded while disabled """
+        registry = Metrics()
+        registry.inc("hits")
+        registry.observe("latency", 0.1)
+        with registry.timer("work"):
+            pass
+        assert registry.snapshot() == {}
+
+    def test_histogram(self):
+        """ observations should be counted in buckets with quantiles """
+        registry = Metrics(enabled=True)
+        for value in [0.0002] * 90 + [0.2] * 10:
+            registry.observe("latency", value, (("op", "x"),))
+        stats = registry.snapshot()["latency"][(("op", "x"),)]
+        assert stats["count"] == 100
+        assert stats["sum"] == pytest.approx(2.018)
+        assert stats["p50"] == 0.00025
+        assert stats["p99"] == 0.25
+
+    def test_timer_errors(self):
+        """ exceptions in a timed block should be counted """
+        registry = Metrics(enabled=True)
+        with pytest.raises(ValueError):
+            with registry.timer("work", op="bad"):
+                raise ValueError("boom")
+        snapshot = registry.snapshot()
+        assert snapshot["work_errors_total"] == {(("op", "bad"),): 1}
+        assert snapshot["work_seconds"][(("op", "bad"),)]["count"] == 1
+
+    def test_prometheus(self):
+        """ the text format should have cumulative buckets and labels """
+        registry = Metrics(enabled=True)
+        registry.describe("latency", "How long it took.")
+        registry.observe("latency", 0.003, (("op", 'a"b'),))
+        registry.inc("calls_total")
+        text = registry.to_prometheus({"queue_size": 3})
+        assert "# TYPE latency histogram" in text
+        assert "# HELP latency How long it took." in text
+        assert 'latency_bucket{op="a\\"b",le="0.0025"} 0' in text
+        assert 'latency_bucket{op="a\\"b",le="0.005"} 1' in text
+        assert 'latency_bucket{op="a\\"b",le="+Inf"} 1' in text
+        assert 'latency_count{op="a\\"b"} 1' in text
+        assert "calls_total 1" in text
+        assert "queue_size 3" in text
+
+    def test_size_label(self):
+        assert [size_label(x) for x in (0, 10, 11, 250, 1000)] == [
+            "10",
+            "10",
+            "100",
+            "1000",
+            "1000",
+        ]
+
+
+class TestInstrumentation:
+    """ Tests for timing tournament operations. """
+
+    def test_operations(self, metrics, tour):
+        """ public methods should be timed, labeled with the size """
+        tour.get_next_matchups(2)
+        tour.set_times({x: 3.0 for x in tour.get_next_matchups(1)[0]})
+        tour.get_ratings()
+        latency = metrics.snapshot()["pynewood_operation_seconds"]
+        labels = (("operation", "get_next_matchups"), ("size", "100"))
+        assert latency[labels]["count"] == 2
+        assert (("operation", "set_times"), ("size", "100")) in latency
+        assert (("operation", "get_ratings"), ("size", "100")) in latency
+
+    def test_not_recorded_when_disabled(self, tour):
+        METRICS.reset()
+        tour.get_ratings()
+        assert METRICS.snapshot() == {}
+
+    def test_endpoint(self, metrics, client, tournament):
+        """ /metrics should serve request, render and operation metrics """
+        client.get(f"/tournament_{tournament.name}")
+        rv = client.get("/metrics")
+        assert rv.status_code == 200
+        text = rv.get_data(as_text=True)
+        assert 'endpoint="run_tournament",method="GET",status="200"' in text
+        assert 'pynewood_render_seconds_count{template="run_tournament.html"}' in text
+        assert "pynewood_operation_seconds_bucket" in text
+        assert "pynewood_store_size" in text
+
+    def test_endpoint_disabled(self, client):
+        """ /metrics should not exist unless metrics are enabled """
+        METRICS.disable()
+        assert client.get("/metrics").status_code == 404
@@ -0,0 +1,143 @@
+"""
+Tests for simulating the rest of a tournament.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from pynewood import LimitedRound
+from pynewood.simulate import Simulator, estimate_finish, simulate
+
+random_state = np.random.RandomState(42)
+
+
+@pytest.fixture
+def tour(make_tournament):
+    """ return a tournament with half of its heats entered """
+    tour = make_tournament(12, "simulated", number_of_plays=4, seed=1)
+    # lower numbered racers are faster
+    speed = {x: 4.0 + 0.1 * num for num, x in enumerate(tour.players)}
+    for matchup in tour.get_next_matchups(tour.total_heats // 2):
+        tour.set_times({x: speed[x] + random_state.rand() * 0.05 for x in matchup})
+    return tour
+
+
+def fill(tour, times):
+    """ enter times for every un-entered entry """
+    for matchup in tour.get_next_matchups(tour.total_heats):
+        tour.set_times({x: times(x) for x in matchup})
+
+
+class TestSimulate:
+    """ Tests for projecting standings. """
+
+    def test_probabilities(self, tour):
+        """ rank probabilities should be a valid table """
+        result = simulate(tour, trials=500, seed=0)
+        table = result.rank_probabilities()
+        assert table.shape == (12, 12)
+        assert np.allclose(table.sum(axis=0), 1)
+        assert np.allclose(table.sum(axis=1), 1)
+        # the fastest racer should usually win
+        assert table.loc["racer_0", 1] > 0.5
+        top = result.top_probability(3)
+        assert top["racer_0"] > top["racer_11"]
+        expected = result.expected_rank()
+        assert expected["racer_0"] < expected["racer_11"]
+
+    def test_seed(self, tour):
+        """ the same seed should give the same results """
+        first = simulate(tour, trials=100, seed=3).rank_counts
+        second = simulate(tour, trials=100, seed=3).rank_counts
+        np.testing.assert_array_equal(first, second)
+
+    def test_complete_tournament(self, tour):
+        """ a finished tournament should always finish at its current ranks """
+        fill(tour, lambda x: 5.0 + random_state.rand())
+        result = simulate(tour, trials=20, max_rank=5)
+        assert result.rank_counts.shape == (12, 5)
+        ratings = tour.get_ratings()
+        top = ratings.index[:5]
+        table = result.rank_probabilities()
+        for rank, player in enumerate(top, 1):
+            assert table.loc[player, rank] == 1
+
+    def test_chunks(self, tour, monkeypatch):
+        """ simulating in many chunks should count every trial """
+        monkeypatch.setattr("pynewood.simulate.CHUNK_SIZE", 100)
+        result = simulate(tour, trials=50, seed=0)
+        assert result.rank_counts.sum() == 50 * 12
+
+    def test_no_times(self):
+        """ a tournament without times can't be simulated """
+        tour = LimitedRound(["a", "b", "c", "d", "e"], name="empty")
+        with pytest.raises(ValueError):
+            simulate(tour)
+
+
+class TestRequiredTime:
+    """ Tests for finding the time a player needs. """
+
+    def test_last_run(self, tour):
+        """ with one run left the required time is the cutoff to beat """
+        df = tour.df
+        last = df[df["player"] == "racer_11"].index[-1]
+        slow = df["player"] == "racer_11"
+        times = np.where(slow, 10.0, 4.0 + np.arange(len(df)) * 0.01)
+        times[last] = np.nan
+        tour.df.loc[:, "time"] = times
+        simulator = Simulator(tour, seed=0)
+        required = simulator.required_time("racer_11", top=3, trials=50)
+        # the third best min of the other players
+        others = tour.get_ratings().drop("racer_11")
+        assert required == pytest.approx(others["min"].iloc[2], rel=1e-4)
+
+    def test_out_of_reach_and_secure(self, tour):
+        """ impossible places give NaN and certain ones inf """
+        simulator = Simulator(tour, seed=0)
+        assert simulator.required_time("racer_0", top=11, trials=50) == np.inf
+        # racer_11 can't beat a max time of 100
+        tour.rank_stat = "max"
+        df = tour.df
+        slow = (df["player"] == "racer_11").values
+        times = np.where(slow, 100.0, 4.0)
+        times[np.flatnonzero(slow)[-1]] = np.nan
+        tour.df.loc[:, "time"] = times
+        simulator = Simulator(tour, seed=0)
+        assert np.isnan(simulator.required_time("racer_11", top=3, trials=50))
+
+    def test_unsupported_stat(self, tour):
+        """ statistics which don't increase with times are rejected """
+        tour.rank_stat = "std"
+        with pytest.raises(ValueError):
+            Simulator(tour).required_time("racer_0")
+
+
+class TestEstimateFinish:
+    """ Tests for projecting the finish time. """
+
+    def test_pace(self, tour):
+        """ the finish should follow the pace times were entered at """
+        for num, operation in enumerate(tour._log.history):
+            operation.timestamp = 1000.0 + 60 * num
+        estimate = estimate_finish(tour, now=5000.0)
+        assert estimate["remaining_heats"] == tour.total_heats - tour.completed_heats
+        assert estimate["seconds_per_heat"] == pytest.approx(60)
+        seconds = estimate["remaining_entries"] * 15
+        assert estimate["seconds_remaining"] == pytest.approx(seconds)
+        assert estimate["finish"] == pd.Timestamp.fromtimestamp(5000 + seconds)
+
+    def test_read_only(self, tour):
+        """ simulating should not mark the tournament as edited """
+        version = tour.version
+        Simulator(tour)
+        estimate_finish(tour)
+        assert not tour._stale
+        assert tour.version == version
+
+    def test_unknown_pace(self):
+        """ without a history the pace is unknown """
+        tour = LimitedRound(["a", "b", "c", "d", "e"], name="no_pace")
+        estimate = estimate_finish(tour)
+        assert estimate["finish"] is None
+        assert estimate["remaining_heats"] == tour.total_heats
@@ -0,0 +1,63 @@
+"""
+Tests for the running standings.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from pynewood.constants import AGGS
+from pynewood.standings import Standings
+
+random_state = np.random.RandomState(42)
+
+
+def expected_ratings(tournament):
+    """ return the ratings by aggregating every entered time """
+    df = tournament.df
+    valid = df[~df["time"].isnull()]
+    out = valid.groupby("player")["time"].agg(AGGS)
+    out = out.sort_values(tournament.rank_stat, kind="stable")
+    return out.rename(columns={"size": "races"})
+
+
+@pytest.fixture
+def tournament(make_tournament):
+    """ return a tournament with some heats entered, undone and changed """
+    tour = make_tournament(20, "standings_test", number_of_plays=5, seed=3)
+    for heat in range(12):
+        tour.set_times(random_state.rand(4) + 3, heat=heat)
+    tour.undo(2)
+    tour.set_time("racer_3", 2.5, round=4)
+    tour.set_time("racer_3", 2.75, round=4)
+    return tour
+
+
+class TestStandings:
+    """ Tests for incrementally maintained standings. """
+
+    @pytest.mark.parametrize("rank_stat", AGGS)
+    def test_matches_aggregation(self, tournament, rank_stat):
+        """ the standings should match aggregating all the times """
+        tournament.rank_stat = rank_stat
+        ratings = tournament.get_ratings()
+        expected = expected_ratings(tournament)
+        assert list(ratings["rank"]) == list(range(1, len(ratings) + 1))
+        assert set(ratings.index) == set(expected.index)
+        column = "races" if rank_stat == "size" else rank_stat
+        stat = ratings[column].to_numpy().astype(float)
+        assert (np.diff(stat[~np.isnan(stat)]) >= 0).all()
+        got = ratings.loc[expected.index, expected.columns]
+        pd.testing.assert_frame_equal(
+            got, expected, check_dtype=False, check_index_type=False
+        )
+
+    def test_remove_all(self):
+        """ players without times should drop out of the standings """
+        standings = Standings(["a", "b"])
+        standings.add(0, 3.0)
+        standings.add(1, 2.0)
+        assert list(standings.table().index) == ["b", "a"]
+        standings.remove(1, 2.0)
+        table = standings.table()
+        assert list(table.index) == ["a"]
+        assert table.loc["a", "races"] == 1
@@ -0,0 +1,209 @@
+"""
+Tests for the stores of running tournaments.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.state import MemoryStore, SharedStore, UnknownTournament
+from pynewood.utils import delete_tournament
+
+
+@pytest.fixture
+def stored(make_tournament, tmp_path):
+    """ return a function creating a saved, and possibly journaled, tournament """
+
+    def _stored(journal=True, snapshot_every=0, name="stored"):
+        tour = make_tournament(9, name, number_of_plays=4, seed=1)
+        if journal:
+            tour.use_journal(tmp_path, snapshot_every=snapshot_every)
+        else:
+            tour.save(tmp_path)
+        return tour
+
+    return _stored
+
+
+def enter_heat(store, name="stored"):
+    """ enter times for the next heat through the store """
+    with store.write(name) as tour:
+        tour.set_times({x: np.random.rand() + 3 for x in tour.get_next_matchups(1)[0]})
+
+
+class TestMemoryStore:
+    """ Tests for keeping tournaments in one process. """
+
+    def test_add_and_read(self, stored, tmp_path):
+        """ added tournaments should be returned """
+        store = MemoryStore(tmp_path)
+        tour = stored()
+        store.add(tour)
+        assert "stored" in store
+        with store.read("stored") as read:
+            assert read is tour
+
+    def test_load_saved(self, stored, tmp_path):
+        """ saved tournaments should be loaded when first used """
+        stored(journal=False)
+        store = MemoryStore(tmp_path)
+        assert "stored" in store
+        enter_heat(store)
+        # tournaments which aren't journaled are saved after changes
+        other = MemoryStore(tmp_path)
+        with store.read("stored") as tour, other.read("stored") as loaded:
+            pd.testing.assert_frame_equal(loaded.df, tour.df)
+
+    def test_unknown(self, tmp_path):
+        """ unknown tournaments should raise """
+        store = MemoryStore(tmp_path)
+        assert "bob" not in store
+        with pytest.raises(UnknownTournament):
+            with store.read("bob"):
+                pass
+
+
+    def test_discard(self, stored, tmp_path):
+        """ a discarded tournament should not be saved again """
+        store = MemoryStore(tmp_path)
+        store.add(stored(snapshot_every=0))
+        enter_heat(store)
+        store.discard("stored")
+        delete_tournament("stored", tmp_path)
+        assert len(store) == 0 and "stored" not in store
+        assert not list(tmp_path.glob("stored.*"))
+
+
+class TestEviction:
+    """ Tests for bounding the number of tournaments kept in memory. """
+
+    names = ["first", "second", "third"]
+
+    @pytest.fixture(params=[MemoryStore, SharedStore])
+    def store(self, stored, tmp_path, request):
+        """ return a store which holds two tournaments of three saved """
+        for name in self.names:
+            stored(name=name)
+        return request.param(tmp_path, max_tournaments=2)
+
+    def test_evict_least_recently_used(self, store):
+        """ the least recently used tournament should be evicted """
+        for name in self.names:
+            enter_heat(store, name)
+        assert len(store) == 2
+        assert store.stats()["evictions"] == 1
+        assert "first" not in store._tournaments
+        # using a tournament should make it recently used
+        enter_heat(store, "second")
+        enter_heat(store, "first")
+        assert set(store._tournaments) == {"first", "second"}
+
+    def test_reload_after_evict(self, store):
+        """ evicted tournaments should be flushed and reloaded unchanged """
+        enter_heat(store, "first")
+        with store.read("first") as tour:
+            expected = tour.df.copy()
+        enter_heat(store, "second")
+        enter_heat(store, "third")
+        with store.read("first") as tour:
+            pd.testing.assert_frame_equal(tour.df, expected)
+        stats = store.stats()
+        assert (stats["hits"], stats["misses"]) == (1, 4)
+
+    def test_locked_not_evicted(self, store):
+        """ a tournament in use should not be evicted """
+        with store.write("first") as tour:
+            thread = threading.Thread(target=enter_heat, args=(store, "second"))
+            thread.start()
+            thread.join()
+            enter_heat(store, "third")
+            tour.set_times([1.0] * 4, heat=0)
+        assert "first" in store._tournaments
+        assert len(store) == 2
+
+
+class TestSharedStore:
+    """ Tests for sharing tournaments between processes. """
+
+    @pytest.fixture(params=[True, False], ids=["journaled", "saved"])
+    def stores(self, stored, tmp_path, request):
+        """ return two stores, as two processes would have, of a tournament """
+        stored(journal=request.param)
+        return SharedStore(tmp_path), SharedStore(tmp_path)
+
+    def test_changes_shared(self, stores):
+        """ changes made through one store should be seen by the other """
+        first, second = stores
+        enter_heat(first)
+        enter_heat(second)
+        enter_heat(first)
+        with first.read("stored") as tour1, second.read("stored") as tour2:
+            assert tour1.heat == tour2.heat == 3
+            pd.testing.assert_frame_equal(tour1.df, tour2.df)
+
+    def test_snapshot_reloads(self, stored, tmp_path):
+        """ a snapshot saved by another process should be reloaded """
+        stored(snapshot_every=2)
+        first, second = SharedStore(tmp_path), SharedStore(tmp_path)
+        with second.read("stored"):
+            pass
+        for _ in range(3):
+            enter_heat(first)
+        with first.read("stored") as tour1, second.read("stored") as tour2:
+            pd.testing.assert_frame_equal(tour1.df, tour2.df)
+
+    def test_concurrent_writes(self, stores):
+        """ concurrent writes from many stores should not lose times """
+        threads = [
+            threading.Thread(target=enter_heat, args=(stores[num % 2],))
+            for num in range(6)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with stores[0].read("stored") as tour1, stores[1].read("stored") as tour2:
+            assert tour1.completed_heats == tour2.completed_heats == 6
+            pd.testing.assert_frame_equal(tour1.df, tour2.df)
+
+    def test_deleted(self, stores, tmp_path):
+        """ a deleted tournament should no longer be available """
+        first, _ = stores
+        enter_heat(first)
+        for path in tmp_path.glob("stored.*"):
+            if path.suffix != ".lock":
+                path.unlink()
+        with pytest.raises(UnknownTournament):
+            with first.read("stored"):
+                pass
+
+    def test_reload_closes_journal(self, stored, tmp_path):
+        """ the journal of a tournament replaced by a reload should be closed """
+        stored(snapshot_every=2)
+        first, second = SharedStore(tmp_path), SharedStore(tmp_path)
+        enter_heat(second)
+        with second.read("stored") as old:
+            assert old.journal._file is not None
+        for _ in range(2):
+            enter_heat(first)
+        with second.read("stored") as tour:
+            assert tour is not old
+        assert old.journal._file is None
+
+    def test_read_leaves_journal(self, stored, tmp_path):
+        """ reads should not cut a torn record off the journal, writes should """
+        stored()
+        first, second = SharedStore(tmp_path), SharedStore(tmp_path)
+        enter_heat(first)
+        journal_path = tmp_path / "stored.journal"
+        with journal_path.open("a") as fi:
+            fi.write('{"op":"set","rows":[0],"ti')
+        text = journal_path.read_text()
+        with second.read("stored") as tour:
+            assert tour.heat == 1
+        assert journal_path.read_text() == text
+        enter_heat(second)
+        with first.read("stored") as tour:
+            assert tour.heat == 2
+        assert "ti\n" not in journal_path.read_text()